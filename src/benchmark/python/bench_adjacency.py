@@ -0,0 +1,89 @@
+# Resumo:
+# Benchmark do motor de adjacência (STRtree) contra o ciclo duplo original.
+# Uso: python bench_adjacency.py [--sizes 1000 10000 100000] [--legacy-max 1000]
+# O ciclo original é O(n²); acima de --legacy-max o seu tempo é extrapolado
+# a partir da maior medição real (marcado como "estimado").
+
+import argparse  # Argumentos da linha de comandos
+import json  # Saída em formato legível por máquina
+import os
+import sys
+import time  # Medição de tempos
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../main/python")))
+
+from adjacency import build_adjacency_edges
+from server import check_adjacency
+from synthetic import grid_geometries
+
+
+def legacy_adjacency(geoms):
+    """
+    Reproduz o ciclo duplo original de /process_properties_graph (todos os pares).
+    Retorna o número de arestas encontradas.
+    """
+    count = 0
+    for i in range(len(geoms)):
+        for j in range(i + 1, len(geoms)):
+            if check_adjacency(geoms[i], geoms[j]):
+                count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--legacy-max", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="Imprime resultados em JSON")
+    args = parser.parse_args()
+
+    results = []
+    legacy_ref = None  # (n, segundos) da maior medição real do ciclo original
+    for n in args.sizes:
+        geoms = grid_geometries(n)
+
+        start = time.perf_counter()
+        left, _ = build_adjacency_edges(geoms)
+        strtree_s = time.perf_counter() - start
+
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            legacy_edges = legacy_adjacency(geoms)
+            legacy_s = time.perf_counter() - start
+            assert legacy_edges == len(left), "Resultados diferentes entre motores"
+            legacy_ref = (n, legacy_s)
+            estimated = False
+        elif legacy_ref is not None:
+            ref_n, ref_s = legacy_ref
+            legacy_s = ref_s * (n * (n - 1)) / (ref_n * (ref_n - 1))
+            estimated = True
+        else:
+            legacy_s, estimated = None, True
+
+        results.append(
+            {
+                "parcels": n,
+                "edges": int(len(left)),
+                "strtree_s": strtree_s,
+                "legacy_s": legacy_s,
+                "legacy_estimated": estimated,
+                "speedup": legacy_s / strtree_s if legacy_s else None,
+            }
+        )
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'parcelas':>10} {'arestas':>10} {'STRtree (s)':>12} {'original (s)':>14} {'speedup':>10}")
+    for r in results:
+        legacy = "-" if r["legacy_s"] is None else f"{r['legacy_s']:.3f}"
+        if r["legacy_estimated"] and r["legacy_s"] is not None:
+            legacy += "*"
+        speedup = "-" if r["speedup"] is None else f"{r['speedup']:.0f}x"
+        print(f"{r['parcels']:>10} {r['edges']:>10} {r['strtree_s']:>12.3f} {legacy:>14} {speedup:>10}")
+    print("* estimado por extrapolação quadrática")
+
+
+if __name__ == "__main__":
+    main()
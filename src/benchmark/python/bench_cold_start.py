@@ -0,0 +1,214 @@
+# Resumo:
+# Benchmark do arranque a frio: tempo até à primeira resposta de um processo novo.
+# Uso: python bench_cold_start.py [--size 20000] [--repeat 3] [--output resultados.json]
+# Prepara um snapshot sintético (synthetic.cadastre_frame, com o grafo de adjacência)
+# e, para cada modo, arranca o servidor num processo novo que o restaura e mede:
+#  - import: `import server` (num processo à parte, sem servir pedidos);
+#  - first_response: do início do processo até à primeira resposta (GET /startup);
+#  - first_similar: o primeiro GET /similar/{id} (importa scipy e constrói o índice
+#    de similaridade se o processo não tiver sido pré-aquecido);
+#  - recycle (gunicorn): depois de o worker ser reciclado por max_requests, o tempo
+#    desde a última resposta do worker antigo até ao primeiro GET /similar do novo.
+# Modos: uvicorn com importação imediata (LAZY_IMPORTS=0) e preguiçosa; gunicorn com
+# um worker e preload_app, sem e com pré-aquecimento (PREWARM, ver gunicorn.conf.py).
+# Os tempos de importação/arranque reportados pelo servidor (GET /startup) são
+# incluídos no JSON de --output.
+
+import argparse  # Argumentos da linha de comandos
+import json  # Respostas do servidor e saída em formato legível por máquina
+import os
+import socket  # Porta livre para cada servidor
+import statistics  # Mediana das repetições
+import subprocess  # Servidores em processos novos
+import sys
+import tempfile  # Snapshot sintético e registo dos servidores
+import time  # Medição de tempos
+import urllib.error
+import urllib.request  # Pedidos HTTP sem dependências
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+MAIN_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../../main/python"))
+sys.path.insert(0, MAIN_DIR)
+
+from adjacency import build_adjacency_edges
+from bench_endpoints import environment
+from graph import AdjacencyGraph
+from snapshot import save_snapshot
+from store import PropertyStore
+from synthetic import cadastre_frame
+
+STARTUP_TIMEOUT = 120  # Segundos até desistir de um servidor que não responde
+RECYCLE_REQUESTS = 20  # max_requests do worker nos modos gunicorn
+
+# {modo: (comando, variáveis de ambiente)}; o comando recebe a porta
+MODES = {
+    "uvicorn_eager": ("uvicorn", {"LAZY_IMPORTS": "0"}),
+    "uvicorn_lazy": ("uvicorn", {"LAZY_IMPORTS": "1"}),
+    "gunicorn_preload": ("gunicorn", {"LAZY_IMPORTS": "1", "PREWARM": "0"}),
+    "gunicorn_prewarm": ("gunicorn", {"LAZY_IMPORTS": "1", "PREWARM": "1"}),
+}
+
+
+def prepare_snapshot(directory: str, n: int):
+    """
+    Guarda em `directory` o snapshot de um cadastro sintético de n parcelas.
+    Retorna o OBJECTID de uma parcela (para GET /similar).
+    """
+    store = PropertyStore(cadastre_frame(n))
+    store.project()
+    left, right = build_adjacency_edges(store.geometries)
+    save_snapshot(directory, store, AdjacencyGraph.from_edges(len(store), left, right))
+    return store.ids[0]
+
+
+def free_port() -> int:
+    """
+    Porta TCP livre em 127.0.0.1.
+    """
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def server_command(server: str, port: int):
+    """
+    Linha de comandos do servidor (executada em src/main/python).
+    """
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "server:app", "--port", str(port), "--log-level", "warning"]
+    return [
+        sys.executable, "-m", "gunicorn", "server:app",
+        "--bind", f"127.0.0.1:{port}", "--workers", "1",
+        "--max-requests", str(RECYCLE_REQUESTS), "--max-requests-jitter", "0",
+        "--log-level", "warning",
+    ]
+
+
+def get(url: str):
+    """
+    GET que retorna o JSON da resposta (lança URLError se o servidor não responder).
+    """
+    with urllib.request.urlopen(url, timeout=STARTUP_TIMEOUT) as response:
+        return json.loads(response.read())
+
+
+def measure_import(env):
+    """
+    Tempo de `import server` num processo novo (medido dentro do processo).
+    """
+    code = (
+        "import time; start = time.perf_counter(); import server, json; "
+        "print(json.dumps(time.perf_counter() - start))"
+    )
+    out = subprocess.run(
+        [sys.executable, "-c", code], cwd=MAIN_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.splitlines()[-1])
+
+
+def measure_server(server: str, env, objectid):
+    """
+    Arranca o servidor e mede o tempo até à primeira resposta, o primeiro e o segundo
+    GET /similar e (gunicorn) a reciclagem do worker. Retorna (tempos, GET /startup).
+    """
+    port = free_port()
+    base = f"http://127.0.0.1:{port}"
+    similar = f"{base}/similar/{objectid}?k=5"
+    log = tempfile.TemporaryFile()
+    start = time.perf_counter()
+    proc = subprocess.Popen(server_command(server, port), cwd=MAIN_DIR, env=env, stdout=log, stderr=log)
+    try:
+        while True:
+            try:
+                startup = get(f"{base}/startup")
+                break
+            except (urllib.error.URLError, ConnectionError):
+                if proc.poll() is not None or time.perf_counter() - start > STARTUP_TIMEOUT:
+                    log.seek(0)
+                    raise RuntimeError(f"{server} não arrancou:\n{log.read().decode()[-2000:]}")
+                time.sleep(0.01)
+        times = {"first_response": time.perf_counter() - start}
+        for name in ("first_similar", "second_similar"):
+            step = time.perf_counter()
+            get(similar)
+            times[name] = time.perf_counter() - step
+        if server == "gunicorn":
+            times["recycle"] = measure_recycle(base, similar, startup["pid"])
+        return times, startup
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+        log.close()
+
+
+def measure_recycle(base: str, similar: str, pid: int):
+    """
+    Faz pedidos até o worker `pid` ser reciclado (max_requests) e retorna o tempo
+    desde a última resposta do worker antigo até à primeira resposta do novo a um
+    GET /similar (arranque do worker, restauro dos dados e índices se necessário).
+    """
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    last = time.perf_counter()
+    while time.perf_counter() < deadline:
+        startup = get(f"{base}/startup")
+        if startup["pid"] != pid:
+            break
+        last = time.perf_counter()
+    else:
+        raise RuntimeError("o worker não foi reciclado")
+    get(similar)
+    return time.perf_counter() - last
+
+
+def run_mode(mode: str, base_env, objectid, repeat: int):
+    """
+    Mede um modo `repeat` vezes. Retorna o resultado (medianas e último GET /startup).
+    """
+    server, extra = MODES[mode]
+    env = {**base_env, **extra}
+    samples, startup = {}, None
+    for _ in range(repeat):
+        samples.setdefault("import", []).append(measure_import(env))
+        times, startup = measure_server(server, env, objectid)
+        for name, value in times.items():
+            samples.setdefault(name, []).append(value)
+    result = {name: statistics.median(values) for name, values in samples.items()}
+    return {"mode": mode, **result, "startup": startup}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--size", type=int, default=20000, help="Parcelas do snapshot sintético")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--modes", nargs="+", choices=list(MODES), default=list(MODES))
+    parser.add_argument("--output", help="Guarda os resultados neste ficheiro JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot = os.path.join(tmp, "snapshot")
+        objectid = prepare_snapshot(snapshot, args.size)
+        base_env = {
+            **os.environ,
+            "SNAPSHOT_DIR": snapshot,
+            "DATASET_SPILL_DIR": os.path.join(tmp, "spill"),
+            "WEB_CONCURRENCY": "1",
+        }
+        results = [run_mode(mode, base_env, objectid, args.repeat) for mode in args.modes]
+
+    columns = ["import", "first_response", "first_similar", "second_similar", "recycle"]
+    print(f"{'modo':>18}" + "".join(f"{c + ' (s)':>20}" for c in columns))
+    for r in results:
+        values = "".join(f"{r[c]:>20.3f}" if c in r else f"{'-':>20}" for c in columns)
+        print(f"{r['mode']:>18}{values}")
+
+    if args.output:
+        report = {"environment": environment(), "parcels": args.size, "results": results}
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+# Resumo:
+# Benchmark dos endpoints sobre cadastros sintéticos de várias dimensões.
+# Uso: python bench_endpoints.py [--sizes 1000 10000] [--repeat 3]
+#                                [--output resultados.json] [--compare base.json]
+# Para cada dimensão mede o parsing do CSV, /process_properties_graph,
+# /process_owners_graph, /average_area, /average_area_grouped, /average_area/all
+# /suggest_trades, /similar e /consolidation (mediana de --repeat execuções), com o
+# tempo por etapa registado pelo módulo metrics. O pico de memória (tracemalloc) é
+# medido numa execução separada, porque o tracemalloc atrasa o código medido.
+# Com --output os resultados são guardados em JSON (com commit e plataforma);
+# com --compare são comparados com um ficheiro anterior, e o processo termina
+# com código 1 se algum caso ficar mais lento do que --threshold (e mais do
+# que --min-seconds).
+
+import argparse  # Argumentos da linha de comandos
+import json  # Saída em formato legível por máquina
+import os
+import platform  # Identificação da máquina
+import statistics  # Mediana das repetições
+import subprocess  # Commit atual (git)
+import sys
+import time  # Medição de tempos
+import tracemalloc  # Pico de memória
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../main/python")))
+
+from fastapi.testclient import TestClient
+import metrics
+from server import app, parse_csv_data
+from synthetic import cadastre_csv
+
+
+def endpoint_cases(csv_data: str, freguesia: str):
+    """
+    Casos medidos para um CSV: [(nome, função sem argumentos)].
+    Os pedidos que dependem do dataset carregado vêm depois de /process_properties_graph.
+    """
+    client = TestClient(app)
+
+    def request(method, url, **kwargs):
+        def call():
+            response = client.request(method, url, **kwargs)
+            assert response.status_code == 200, f"{url}: {response.status_code} {response.text[:200]}"
+        return call
+
+    def properties_graph(format):
+        def call():
+            client.delete("/cache/geometries")  # Mede sempre a projeção completa
+            request("POST", f"/process_properties_graph?format={format}", json={"data": csv_data})()
+        return call
+
+    area = {"level": "Freguesia", "name": freguesia}
+    return [
+        ("parse_csv", lambda: parse_csv_data(csv_data)),
+        ("properties_graph", properties_graph("objects")),
+        ("properties_graph_columnar", properties_graph("columnar")),
+        ("owners_graph_star", request("POST", "/process_owners_graph", json={"data": csv_data})),
+        ("average_area", request("GET", "/average_area", params=area)),
+        ("average_area_grouped", request("GET", "/average_area_grouped", params=area)),
+        ("average_area_all", request("GET", "/average_area/all", params={"level": "Freguesia"})),
+        ("suggest_trades", request("GET", "/suggest_trades", params=area)),
+        (
+            "suggest_trades_neighbourhood",
+            request("GET", "/suggest_trades", params={**area, "mode": "neighbourhood"}),
+        ),
+        (
+            "suggest_trades_similar",
+            request("GET", "/suggest_trades", params={**area, "mode": "similar"}),
+        ),
+        ("similar", request("GET", "/similar/1", params={"k": 10})),
+        (
+            "consolidation",
+            request("POST", "/consolidation", params={**area, "time_budget": 0.5}),
+        ),
+    ]
+
+
+def stage_delta(before, after):
+    """
+    Segundos gastos em cada etapa entre dois metrics.snapshot().
+    """
+    return {
+        name: round(s["seconds"] - before["stages"].get(name, {"seconds": 0.0})["seconds"], 6)
+        for name, s in after["stages"].items()
+        if s["calls"] != before["stages"].get(name, {"calls": 0})["calls"]
+    }
+
+
+def run_size(n: int, repeat: int, memory: bool):
+    """
+    Mede todos os casos para um cadastro de n parcelas. Retorna a lista de resultados.
+    """
+    csv_data = cadastre_csv(n)
+    results = []
+    for name, call in endpoint_cases(csv_data, "Freguesia 0"):
+        times, stages = [], {}
+        for _ in range(repeat):
+            before = metrics.snapshot()
+            start = time.perf_counter()
+            call()
+            times.append(time.perf_counter() - start)
+            stages = stage_delta(before, metrics.snapshot())
+        result = {"parcels": n, "case": name, "seconds": statistics.median(times), "stages": stages}
+        if memory:
+            tracemalloc.start()
+            call()
+            result["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+            tracemalloc.stop()
+        results.append(result)
+    return results
+
+
+def environment():
+    """
+    Commit atual e descrição da máquina, para identificar os resultados.
+    """
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold: float, min_seconds: float):
+    """
+    Compara os tempos com os de um ficheiro anterior. Retorna [(caso, parcelas, razão)]
+    dos casos mais lentos do que `threshold` (ex: 1.2 = 20% mais lento) e em pelo
+    menos `min_seconds` (diferenças menores são ruído de medição).
+    """
+    base = {(r["case"], r["parcels"]): r["seconds"] for r in baseline["results"]}
+    print(f"\nComparação com {baseline['environment'].get('commit')}:")
+    regressions = []
+    for r in results:
+        old = base.get((r["case"], r["parcels"]))
+        if not old:
+            continue
+        ratio = r["seconds"] / old
+        slower = ratio > threshold and r["seconds"] - old >= min_seconds
+        flag = " <- regressão" if slower else ""
+        print(f"{r['case']:>30} {r['parcels']:>8} {old:>10.3f} {r['seconds']:>10.3f} {ratio:>7.2f}x{flag}")
+        if slower:
+            regressions.append((r["case"], r["parcels"], ratio))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--no-memory", action="store_true", help="Não mede o pico de memória")
+    parser.add_argument("--output", help="Guarda os resultados neste ficheiro JSON")
+    parser.add_argument("--compare", help="Ficheiro JSON de resultados anterior")
+    parser.add_argument("--threshold", type=float, default=1.2)
+    parser.add_argument("--min-seconds", type=float, default=0.01)
+    args = parser.parse_args()
+
+    results = []
+    for n in args.sizes:
+        results += run_size(n, args.repeat, not args.no_memory)
+
+    print(f"{'caso':>30} {'parcelas':>8} {'tempo (s)':>10} {'pico (MB)':>10}")
+    for r in results:
+        peak = f"{r['peak_mb']:.1f}" if "peak_mb" in r else "-"
+        print(f"{r['case']:>30} {r['parcels']:>8} {r['seconds']:>10.3f} {peak:>10}")
+
+    report = {"environment": environment(), "results": results}
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            regressions = compare(
+                results, json.load(f), args.threshold, args.min_seconds
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Resumo:
+# Gerador de cadastros sintéticos para benchmarks.
+# Produz parcelas quadradas numa grelha regular (coordenadas WGS84 na Madeira),
+# de forma reprodutível, para medir o desempenho dos endpoints sem dados reais.
+
+import math  # Cálculo das dimensões da grelha
+from shapely.geometry import box  # Criação de polígonos retangulares
+
+# Origem da grelha (lon, lat) e lado de cada parcela em graus
+ORIGEM = (-17.0, 32.7)
+LADO = 0.0005
+
+
+def grid_geometries(n: int, lado: float = LADO, origem=ORIGEM):
+    """
+    Gera n parcelas quadradas contíguas numa grelha aproximadamente quadrada.
+    Retorna uma lista de polígonos Shapely em coordenadas (lon, lat).
+    """
+    cols = math.ceil(math.sqrt(n))
+    x0, y0 = origem
+    geoms = []
+    for k in range(n):
+        i, j = divmod(k, cols)
+        geoms.append(box(x0 + j * lado, y0 + i * lado, x0 + (j + 1) * lado, y0 + (i + 1) * lado))
+    return geoms
+
+
+def grid_wkt(n: int, lado: float = LADO, origem=ORIGEM):
+    """
+    Igual a grid_geometries, mas devolve as geometrias em WKT (formato do CSV).
+    """
+    return [g.wkt for g in grid_geometries(n, lado, origem)]
+
+
+def cadastre_frame(n: int, owners=None, freguesias=None, seed: int = 0, lado: float = LADO):
+    """
+    Gera um cadastro sintético de n parcelas em grelha, com as colunas do CSV real:
+    OBJECTID, OWNER, Freguesia, Concelho, Distrito, geometry (WKT), Shape_Area e as
+    características de similaridade (Valor_Estimado, Distancia_Vias, Distancia_Urbana).
+    Os proprietários são atribuídos a blocos de parcelas vizinhas (há parcelas contíguas
+    do mesmo dono) e as freguesias a faixas de linhas da grelha. Reprodutível por `seed`.
+    """
+    import numpy as np  # Valores aleatórios reprodutíveis
+    import pandas as pd  # DataFrame no formato do CSV
+
+    rng = np.random.default_rng(seed)
+    owners = owners or max(2, n // 8)
+    freguesias = freguesias or max(1, n // 2000)
+    cols = math.ceil(math.sqrt(n))
+    rows = np.arange(n) // cols
+    # Blocos de parcelas consecutivas (em média 3) pertencem ao mesmo dono
+    block = np.cumsum(rng.random(n) < 0.3)
+    owner = rng.integers(0, owners, block[-1] + 1)[block] if n else block
+    freguesia = np.minimum(rows * freguesias // max(rows.max() + 1, 1), freguesias - 1)
+    # Área de uma célula da grelha (~55 m x 47 m na latitude da origem) com ruído
+    area = np.round(2600 * rng.lognormal(0.0, 0.35, n), 1)
+    return pd.DataFrame(
+        {
+            "OBJECTID": np.arange(1, n + 1),
+            "OWNER": [f"Proprietario {k}" for k in owner],
+            "Freguesia": [f"Freguesia {k}" for k in freguesia],
+            "Concelho": [f"Concelho {k // 5}" for k in freguesia],
+            "Distrito": "Madeira",
+            "geometry": grid_wkt(n, lado),
+            "Shape_Area": area,
+            "Valor_Estimado": np.round(area * rng.uniform(20, 80, n), 0),
+            "Distancia_Vias": np.round(rng.exponential(150, n), 1),
+            "Distancia_Urbana": np.round(rng.exponential(800, n), 1),
+        }
+    )
+
+
+def cadastre_csv(n: int, sep: str = ";", **kwargs):
+    """
+    Igual a cadastre_frame, mas devolve o texto CSV (separador `sep`).
+    """
+    return cadastre_frame(n, **kwargs).to_csv(index=False, sep=sep)
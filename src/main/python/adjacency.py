@@ -0,0 +1,157 @@
+# Resumo:
+# Motor de adjacência espacial entre parcelas.
+# Em vez de comparar todos os pares de geometrias (O(n²)), indexa as geometrias
+# numa STRtree (Shapely 2) e testa o predicado (com geometrias preparadas) apenas
+# nos candidatos i < j cujas bounding boxes se sobrepõem, em blocos vetorizados.
+# Para datasets grandes, as geometrias podem ser divididas em ladrilhos espaciais
+# processados em paralelo (ProcessPoolExecutor), juntando as arestas no fim.
+
+import math  # Dimensões da grelha de ladrilhos
+from concurrent.futures import as_completed  # Resultados dos ladrilhos à medida que terminam
+import numpy as np  # Arrays de índices e geometrias
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+from metrics import count  # Contadores de testes de predicado e arestas
+
+shapely = lazy_import("shapely")  # Bounding boxes vetorizadas e STRtree (Sort-Tile-Recursive tree)
+
+TILE_EPSILON = 1e-6  # Folga (unidades do CRS) na sobreposição entre ladrilhos
+QUERY_BLOCK = 10_000  # Geometrias consultadas por bloco
+
+
+def build_adjacency_edges(geoms, radius: float = 0.0, progress=None):
+    """
+    Calcula os pares (i, j), com i < j, de geometrias adjacentes (tocam ou intersectam),
+    ou, com radius > 0, a uma distância máxima de `radius` (unidades do CRS).
+    Recebe uma sequência de geometrias Shapely (None e geometrias vazias são ignoradas).
+    Retorna dois arrays de índices ordenados por (i, j), a mesma ordem do ciclo duplo original.
+    Se `progress` for dado, é chamado após cada bloco de QUERY_BLOCK geometrias com
+    progress(candidate_pairs=..., edges=...): os pares testados e as arestas encontradas.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    if len(geoms) == 0:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    tree = shapely.STRtree(geoms)
+    left, right = _query_blocks(tree, geoms, radius, progress)
+    order = np.lexsort((right, left))
+    return left[order], right[order]
+
+
+def _query_blocks(tree, geoms, radius: float, progress):
+    """
+    Consulta a STRtree em blocos de QUERY_BLOCK geometrias: primeiro os candidatos
+    por bounding box, depois o predicado vetorizado sobre esses pares.
+    Cada par é testado uma única vez (i < j, sem a geometria consigo própria).
+    """
+    shapely.prepare(geoms)
+    lefts, rights = [], []
+    for b0 in range(0, len(geoms), QUERY_BLOCK):
+        block = geoms[b0 : b0 + QUERY_BLOCK]
+        if radius > 0:
+            # Candidatos: bounding boxes alargadas pelo raio
+            bounds = shapely.bounds(block)
+            block = shapely.box(
+                bounds[:, 0] - radius, bounds[:, 1] - radius,
+                bounds[:, 2] + radius, bounds[:, 3] + radius,
+            )
+        left, right = tree.query(block)
+        left = left + b0
+        mask = left < right
+        left, right = left[mask], right[mask]
+        if radius > 0:
+            hit = shapely.dwithin(geoms[left], geoms[right], radius)
+        else:
+            # "touches" implica "intersects", por isso basta um único predicado
+            hit = shapely.intersects(geoms[left], geoms[right])
+        lefts.append(left[hit])
+        rights.append(right[hit])
+        count("predicate_calls", int(len(left)))
+        count("edges_emitted", int(hit.sum()))
+        if progress is not None:
+            progress(candidate_pairs=int(len(left)), edges=int(hit.sum()))
+    return np.concatenate(lefts), np.concatenate(rights)
+
+
+def _tile_edges(geoms, index, radius: float):
+    """
+    Calcula as arestas de um ladrilho (executado num processo do pool).
+    Retorna os pares em índices globais e o número de pares testados.
+    """
+    counters = {"candidate_pairs": 0}
+
+    def tally(candidate_pairs, edges):
+        counters["candidate_pairs"] += candidate_pairs
+
+    left, right = build_adjacency_edges(geoms, radius, tally)
+    return index[left], index[right], counters["candidate_pairs"]
+
+
+def spatial_tiles(geoms, tiles: int, margin: float = 0.0):
+    """
+    Divide as geometrias numa grelha de aproximadamente `tiles` ladrilhos.
+    Cada geometria é atribuída a todos os ladrilhos que a sua bounding box
+    (alargada por `margin`) interseta, pelo que dois vizinhos partilham sempre
+    pelo menos um ladrilho. Retorna a lista de arrays de índices de cada ladrilho.
+    """
+    bounds = shapely.bounds(geoms)
+    valid = ~np.isnan(bounds).any(axis=1)
+    if not valid.any():
+        return []
+    minx, miny, maxx, maxy = (bounds[:, k] for k in range(4))
+    minx, miny = minx - margin, miny - margin
+    maxx, maxy = maxx + margin, maxy + margin
+    x0, y0 = np.nanmin(minx), np.nanmin(miny)
+    x1, y1 = np.nanmax(maxx), np.nanmax(maxy)
+    side = max(1, int(math.ceil(math.sqrt(tiles))))
+    width = (x1 - x0) / side or 1.0
+    height = (y1 - y0) / side or 1.0
+    result = []
+    for tx in range(side):
+        tile_x0, tile_x1 = x0 + tx * width, x0 + (tx + 1) * width
+        in_x = valid & (maxx >= tile_x0) & (minx <= tile_x1)
+        for ty in range(side):
+            tile_y0, tile_y1 = y0 + ty * height, y0 + (ty + 1) * height
+            members = np.flatnonzero(in_x & (maxy >= tile_y0) & (miny <= tile_y1))
+            if len(members) > 1:
+                result.append(members)
+    return result
+
+
+def build_adjacency_edges_parallel(
+    geoms, executor, tiles: int, radius: float = 0.0, progress=None
+):
+    """
+    Igual a build_adjacency_edges, mas divide as geometrias em ladrilhos espaciais
+    com uma pequena margem de sobreposição e calcula as arestas de cada ladrilho
+    em paralelo no `executor` (ex: ProcessPoolExecutor). As arestas das fronteiras,
+    calculadas em mais do que um ladrilho, são juntas e deduplicadas.
+    `progress`, se dado, é chamado à medida que cada ladrilho termina.
+    """
+    geoms = np.asarray(geoms, dtype=object)
+    n = len(geoms)
+    # Margem: metade do raio de cada lado, mais uma folga para arredondamentos
+    margin = radius / 2 + TILE_EPSILON
+    futures = [
+        executor.submit(_tile_edges, geoms[members], members, radius)
+        for members in spatial_tiles(geoms, tiles, margin)
+    ]
+    parts = []
+    for future in as_completed(futures):
+        left, right, candidates = future.result()
+        parts.append((left, right))
+        # Os contadores dos processos do pool não chegam a este processo
+        count("predicate_calls", candidates)
+        if progress is not None:
+            # As arestas só são contadas no fim: as das fronteiras repetem-se entre ladrilhos
+            progress(candidate_pairs=candidates, edges=0)
+    if not parts:
+        empty = np.empty(0, dtype=np.intp)
+        return empty, empty
+    left = np.concatenate([p[0] for p in parts]).astype(np.int64)
+    right = np.concatenate([p[1] for p in parts]).astype(np.int64)
+    # Remove duplicados e ordena por (i, j)
+    keys = np.unique(left * n + right)
+    count("edges_emitted", int(len(keys)))
+    if progress is not None:
+        progress(candidate_pairs=0, edges=int(len(keys)))
+    return keys // n, keys % n
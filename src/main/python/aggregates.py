@@ -0,0 +1,170 @@
+# Resumo:
+# Cache de agregados de área por (nível, nome) para /average_area e /average_area_grouped.
+# Os agregados simples de cada nível (Freguesia/Concelho/Distrito) são calculados
+# de uma só vez com um groupby; os agregados por componentes (parcelas contíguas
+# do mesmo dono) são calculados por nível, também de uma só vez, no primeiro pedido.
+# Cada instância pertence a uma versão do dataset: ao carregar um novo CSV cria-se
+# uma nova cache, e ao reconstruir o grafo limpam-se os agregados por componentes.
+# Numa atualização incremental (updated) só são recalculados os nomes tocados.
+
+import numpy as np  # Operações vetorizadas sobre arrays
+import pandas as pd  # Agregação com groupby
+from metrics import stage  # Temporizadores por etapa
+from components import (
+    component_areas,
+    owner_component_labels,
+)  # Componentes conexas por proprietário
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+shapely = lazy_import("shapely")  # Áreas das geometrias projetadas
+
+LEVELS = ["Freguesia", "Concelho", "Distrito"]
+
+
+def _stats_frame(values, codes, names):
+    """
+    Agrega os valores por código de grupo (códigos -1 ignorados; NaN não contam).
+    Retorna {nome: {"count", "sum", "mean"}}.
+    """
+    keep = codes >= 0
+    table = pd.Series(values[keep]).groupby(codes[keep]).agg(["count", "sum", "mean"])
+    return {
+        names[code]: {"count": int(row["count"]), "sum": float(row["sum"]), "mean": float(row["mean"])}
+        for code, row in table.iterrows()
+    }
+
+
+class AreaAggregates:
+    """
+    Agregados de área (contagem, soma e média) por (nível, nome), calculados
+    uma vez por versão do dataset e servidos a partir de memória.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self.simple = {}  # {nível: {nome: estatísticas}}
+        self.grouped = {}  # {nível: {nome: estatísticas das componentes}}
+        self._areas = None
+
+    def parcel_areas(self):
+        """
+        Área de cada parcela: Shape_Area quando a coluna existe, caso contrário a
+        área da geometria projetada (NaN quando em falta, para não contar).
+        """
+        if self._areas is None:
+            df = self.store.df
+            if "Shape_Area" in df.columns:
+                areas = pd.to_numeric(df["Shape_Area"], errors="coerce").to_numpy(dtype=float)
+            else:
+                geoms = self.store.geometries
+                areas = np.where(shapely.is_missing(geoms), np.nan, shapely.area(geoms))
+            self._areas = areas
+        return self._areas
+
+    def precompute(self, levels=LEVELS):
+        """
+        Calcula os agregados simples dos níveis dados (um groupby por nível).
+        """
+        for level in levels:
+            if level in self.simple or level not in self.store.df.columns:
+                continue
+            with stage("area_aggregates"):
+                self.simple[level] = self._simple_table(level)
+
+    def _simple_table(self, level: str, rows=None):
+        """
+        Estatísticas simples de cada nome do nível nas linhas dadas (todas se None).
+        """
+        codes, names = self.store.group_codes(level)
+        areas = self.parcel_areas()
+        if rows is not None:
+            codes, areas = codes[rows], areas[rows]
+        return _stats_frame(areas, codes, names)
+
+    def simple_stats(self, level: str, name: str):
+        """
+        Estatísticas simples de área para df[level] == name, ou None se não houver propriedades.
+        """
+        self.precompute([level])
+        return self.simple.get(level, {}).get(name)
+
+    def precompute_grouped(self, level: str, contacts):
+        """
+        Calcula os agregados por componentes de todos os nomes do nível de uma só vez:
+        as componentes juntam parcelas adjacentes com o mesmo dono e o mesmo valor do nível.
+        `contacts(rows)` devolve as arestas de adjacência entre as linhas dadas.
+        """
+        if level in self.grouped or level not in self.store.df.columns:
+            return
+        level_codes, _ = self.store.group_codes(level)
+        with stage("area_aggregates_grouped"):
+            self.grouped[level] = self._grouped_table(
+                level, np.flatnonzero(level_codes >= 0), contacts
+            )
+
+    def _grouped_table(self, level: str, rows, contacts):
+        """
+        Estatísticas das componentes de cada nome do nível, formadas nas linhas dadas
+        (que devem incluir todas as linhas de cada nome presente).
+        """
+        level_codes, names = self.store.group_codes(level)
+        owner_codes, _ = self.store.group_codes("OWNER")
+        left, right = contacts(rows)
+        # Código combinado (dono, valor do nível): -1 se faltar o dono
+        owners = owner_codes[rows].astype(np.int64)
+        combined = np.where(owners >= 0, owners * len(names) + level_codes[rows], -1)
+        labels, count = owner_component_labels(combined, left, right)
+        areas = np.nan_to_num(self.parcel_areas()[rows])
+        component_area = component_areas(labels, count, areas)
+        keep = labels >= 0
+        # Valor do nível de cada componente (todas as parcelas da componente partilham-no)
+        component_level = np.zeros(count, dtype=np.int64)
+        component_level[labels[keep]] = level_codes[rows][keep]
+        return _stats_frame(component_area, component_level, names)
+
+    def grouped_stats(self, level: str, name: str, contacts):
+        """
+        Estatísticas das componentes para df[level] == name, ou None se não houver propriedades.
+        """
+        self.precompute_grouped(level, contacts)
+        return self.grouped.get(level, {}).get(name)
+
+    def invalidate_grouped(self):
+        """
+        Descarta os agregados por componentes (o grafo de adjacência mudou).
+        """
+        self.grouped.clear()
+
+    def updated(self, store, touched, contacts):
+        """
+        Cache para uma nova versão do dataset após uma atualização incremental.
+        `touched` = {nível: nomes afetados}; os agregados dos restantes nomes são
+        reaproveitados e só os dos nomes afetados são recalculados (incluindo os
+        agregados por componentes já calculados, com `contacts` do novo dataset).
+        """
+        fresh = AreaAggregates(store)
+        for level, table in self.simple.items():
+            fresh.simple[level] = fresh._refresh(level, table, touched.get(level, ()))
+        for level, table in self.grouped.items():
+            fresh.grouped[level] = fresh._refresh(
+                level, table, touched.get(level, ()), contacts
+            )
+        return fresh
+
+    def _refresh(self, level: str, table, names, contacts=None):
+        """
+        Copia a tabela de um nível, recalculando apenas as entradas dos nomes dados.
+        """
+        table = {name: stats for name, stats in table.items() if name not in names}
+        if level not in self.store.df.columns:
+            return table
+        rows = np.concatenate(
+            [self.store.rows(level, name) for name in names] + [np.empty(0, dtype=np.intp)]
+        )
+        rows = np.sort(rows).astype(np.intp)
+        if len(rows):
+            if contacts is None:
+                table.update(self._simple_table(level, rows))
+            else:
+                table.update(self._grouped_table(level, rows, contacts))
+        return table
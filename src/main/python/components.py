@@ -0,0 +1,45 @@
+# Resumo:
+# Componentes conexas de parcelas contíguas do mesmo proprietário.
+# A partir das arestas de adjacência, mantém apenas as que ligam parcelas do
+# mesmo dono, etiqueta as componentes com scipy.sparse.csgraph e agrega a área
+# de cada componente com np.bincount (sem uniões geométricas).
+
+import numpy as np  # Operações vetorizadas sobre arrays
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+sparse = lazy_import("scipy.sparse")  # Matriz de adjacência esparsa
+csgraph = lazy_import("scipy.sparse.csgraph")  # Etiquetagem de componentes
+
+
+def owner_component_labels(owners, left, right):
+    """
+    Etiqueta as componentes conexas do subgrafo de arestas entre parcelas do mesmo dono.
+    `owners` são os códigos de proprietário de cada parcela (-1 = sem dono) e
+    (left, right) as arestas de adjacência entre parcelas.
+    Retorna (etiqueta por parcela, -1 para parcelas sem dono; número de componentes).
+    """
+    owners = np.asarray(owners)
+    left = np.asarray(left, dtype=np.int64)
+    right = np.asarray(right, dtype=np.int64)
+    valid = np.flatnonzero(owners >= 0)
+    labels = np.full(len(owners), -1, dtype=np.int64)
+    if len(valid) == 0:
+        return labels, 0
+    # Reindexa as parcelas com dono para 0..m-1
+    local = np.full(len(owners), -1, dtype=np.int64)
+    local[valid] = np.arange(len(valid))
+    same = (owners[left] == owners[right]) & (owners[left] >= 0)
+    u, v = local[left[same]], local[right[same]]
+    m = len(valid)
+    matrix = sparse.coo_matrix((np.ones(len(u), dtype=np.int8), (u, v)), shape=(m, m)).tocsr()
+    count, component = csgraph.connected_components(matrix, directed=False)
+    labels[valid] = component
+    return labels, count
+
+
+def component_areas(labels, count: int, areas):
+    """
+    Soma as áreas das parcelas de cada componente (parcelas com etiqueta -1 são ignoradas).
+    """
+    keep = labels >= 0
+    return np.bincount(labels[keep], weights=np.asarray(areas)[keep], minlength=count)
@@ -0,0 +1,323 @@
+# Resumo:
+# Sessões de dados com nome ("datasets"), para vários utilizadores trabalharem em
+# cadastros diferentes no mesmo servidor sem se sobreporem.
+# 1. Cada sessão (Dataset) tem o seu armazenamento, grafo de adjacência, cache de
+#    agregados, índice de similaridade e versão; os pedidos escolhem-na com ?dataset=.
+# 2. O registo (DatasetRegistry) mantém as sessões por ordem de uso (LRU) com um
+#    orçamento de memória (estimada) e de número de sessões em memória. Acima do
+#    orçamento, as sessões menos usadas que não estão a ser usadas por nenhum pedido
+#    são guardadas num snapshot colunar (ver snapshot.py) e libertadas da memória.
+# 3. Uma sessão libertada é recarregada do snapshot (por memory-mapping) no próximo
+#    pedido que a use; se não mudou desde a última vez, não volta a ser escrita.
+
+import itertools  # Versões únicas entre sessões
+import logging  # Registo das falhas ao libertar sessões
+import os  # Caminhos das sessões guardadas em disco
+import shutil  # Remoção das sessões guardadas
+import threading  # Acesso concorrente ao registo e às sessões
+import time  # Instante do último uso
+from collections import OrderedDict  # Ordem de uso (LRU)
+from contextlib import contextmanager  # Uso de uma sessão fora de um pedido (tarefas)
+import numpy as np  # Tamanho dos arrays
+from aggregates import AreaAggregates  # Cache de agregados de área
+from geocache import COORD_BYTES, GEOMETRY_OVERHEAD_BYTES  # Memória estimada das geometrias
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+from metrics import count, stage  # Temporizadores e contadores
+from snapshot import load_snapshot, save_snapshot  # Formato em disco das sessões libertadas
+
+shapely = lazy_import("shapely")  # Número de coordenadas das geometrias
+logger = logging.getLogger(__name__)
+
+DEFAULT_DATASET = "default"  # Sessão usada quando o pedido não indica nenhuma
+DATASET_PATTERN = "^[A-Za-z0-9_-]{1,64}$"  # Nomes válidos (são também nomes de diretorias)
+
+# Versão dos dados de cada sessão: única entre sessões, para que uma sessão removida
+# e criada de novo com o mesmo nome nunca repita uma versão anterior
+_versions = itertools.count(1)
+
+
+class Dataset:
+    """
+    Uma sessão de dados: armazenamento, grafo, cache de agregados e índice de
+    similaridade de um cadastro. `store` é None se nada foi carregado ou se a sessão
+    foi libertada da memória (spilled).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.store = None  # PropertyStore (propriedades indexadas)
+        self.graph = None  # AdjacencyGraph (CSR indexado pelas linhas do store)
+        self.area_cache = None  # AreaAggregates da versão carregada
+        self.similarity_index = None  # SimilarityIndex (criado no primeiro uso)
+        self.version = next(_versions)  # Única; muda sempre que os dados mudam
+        self.lock = threading.Lock()  # Uma atualização (ou carregamento) de cada vez
+        self.users = 0  # Pedidos/tarefas em curso (a sessão não é libertada)
+        self.bytes = 0  # Memória estimada enquanto carregada
+        self.spilled_version = None  # Versão guardada em disco (None se nenhuma)
+        self.spill_path = None  # Diretoria do snapshot guardado em disco
+        self.last_used = time.time()
+
+    @property
+    def spilled(self) -> bool:
+        """
+        Indica se a sessão está guardada em disco e não em memória.
+        """
+        return self.store is None and self.spilled_version is not None
+
+    def replace(self, store, graph=None):
+        """
+        Substitui os dados da sessão (nova versão) e recria a cache de agregados,
+        pré-calculando os agregados simples de cada nível.
+        """
+        self._set(store, graph)
+        self.version = next(_versions)
+
+    def apply(self, store, graph, area_cache):
+        """
+        Aplica uma atualização incremental (nova versão), com a cache de agregados
+        já atualizada para os novos dados.
+        """
+        self.store, self.graph, self.area_cache = store, graph, area_cache
+        self.similarity_index = None
+        self.version = next(_versions)
+
+    def set_graph(self, graph):
+        """
+        Substitui o grafo (nova versão); os agregados por componentes dependem dele.
+        """
+        self.graph = graph
+        if self.area_cache is not None:
+            self.area_cache.invalidate_grouped()
+        self.version = next(_versions)
+
+    def restore(self, store, graph):
+        """
+        Repõe os dados lidos do disco, sem mudar de versão.
+        """
+        self._set(store, graph)
+
+    def _set(self, store, graph):
+        area_cache = AreaAggregates(store)
+        area_cache.precompute()
+        self.store, self.graph, self.area_cache = store, graph, area_cache
+        self.similarity_index = None
+        self.bytes = estimate_bytes(store, graph)
+
+    def unload(self):
+        """
+        Liberta os dados da memória (depois de guardados em disco).
+        """
+        self.store = self.graph = self.area_cache = self.similarity_index = None
+        self.bytes = 0
+
+    def info(self):
+        """
+        Resumo da sessão para GET /datasets.
+        """
+        store, graph = self.store, self.graph
+        return {
+            "name": self.name,
+            "in_memory": store is not None,
+            "spilled": self.spilled,
+            "rows": len(store) if store is not None else None,
+            "edges": graph.num_edges if graph is not None else None,
+            "bytes": self.bytes,
+            "version": self.version,
+            "users": self.users,
+            "last_used": self.last_used,
+        }
+
+
+def estimate_bytes(store, graph=None) -> int:
+    """
+    Memória estimada de um armazenamento (DataFrame, geometrias projetadas) e do grafo.
+    """
+    if store is None:
+        return 0
+    total = int(store.df.memory_usage(index=True, deep=True).sum())
+    geoms = store._geometries
+    if geoms is not None:
+        coords = shapely.get_num_coordinates(geoms)
+        total += int(len(geoms) * GEOMETRY_OVERHEAD_BYTES + COORD_BYTES * np.sum(coords))
+    if graph is not None:
+        total += int(graph.indptr.nbytes + graph.indices.nbytes)
+    return total
+
+
+class DatasetRegistry:
+    """
+    Registo das sessões {nome: Dataset}, por ordem de uso, com no máximo
+    `max_datasets` sessões e `max_bytes` de memória estimada carregados.
+    As sessões libertadas são guardadas em `spill_dir`/<nome>.
+    """
+
+    def __init__(self, spill_dir: str, max_bytes: int, max_datasets: int):
+        self.spill_dir = spill_dir
+        self.max_bytes = max_bytes
+        self.max_datasets = max_datasets
+        self.sessions = OrderedDict()  # {nome: Dataset}, da menos para a mais usada
+        self.spills = 0
+        self.reloads = 0
+        self.lock = threading.Lock()
+
+    def get(self, name: str):
+        """
+        Retorna a sessão com o nome dado (carregada ou não), ou None se não existir.
+        """
+        with self.lock:
+            return self.sessions.get(name)
+
+    def acquire(self, name: str):
+        """
+        Marca a sessão (criada se não existir) como em uso e como a mais recente.
+        Enquanto estiver em uso não é libertada; chamar release() no fim.
+        Não carrega a sessão: se estiver em disco, usar load().
+        """
+        with self.lock:
+            session = self.sessions.get(name)
+            if session is None:
+                session = self.sessions[name] = Dataset(name)
+            self.sessions.move_to_end(name)
+            session.users += 1
+            session.last_used = time.time()
+            return session
+
+    def release(self, session):
+        """
+        Fim de um uso da sessão. Uma sessão que ficou vazia (nada carregado) é esquecida.
+        """
+        with self.lock:
+            session.users -= 1
+            empty = session.store is None and session.spilled_version is None
+            if empty and session.users == 0 and self.sessions.get(session.name) is session:
+                del self.sessions[session.name]
+
+    @contextmanager
+    def use(self, name: str, load: bool = True):
+        """
+        Usa a sessão `name` durante o bloco (ex: numa tarefa em segundo plano),
+        recarregando-a do disco se necessário (load=True). Bloqueante.
+        """
+        session = self.acquire(name)
+        try:
+            if load:
+                self.load(session)
+            yield session
+        finally:
+            self.release(session)
+
+    def load(self, session):
+        """
+        Recarrega do disco uma sessão libertada (nada a fazer se estiver em memória)
+        e liberta outras sessões se o orçamento for ultrapassado. Bloqueante.
+        """
+        with session.lock:
+            if not session.spilled:
+                return session
+            with stage("dataset_reload"):
+                store, graph = load_snapshot(session.spill_path)
+                session.restore(store, graph)
+            self.reloads += 1
+            count("datasets_reloaded")
+        self.enforce(keep=session)
+        return session
+
+    def touch(self, session):
+        """
+        Chamado depois de os dados de uma sessão mudarem: atualiza a memória estimada
+        e liberta outras sessões se o orçamento for ultrapassado. Bloqueante.
+        """
+        session.bytes = estimate_bytes(session.store, session.graph)
+        self.enforce(keep=session)
+
+    def enforce(self, keep=None):
+        """
+        Liberta as sessões menos usadas (exceto `keep` e as que estão em uso) até a
+        memória estimada e o número de sessões carregadas caberem no orçamento.
+        Uma sessão que não pode ser guardada fica em memória e passa-se à seguinte.
+        Bloqueante (escreve os snapshots).
+        """
+        with self.lock:
+            candidates = [
+                s
+                for s in self.sessions.values()
+                if s.store is not None and s is not keep and s.users == 0
+            ]
+        for session in candidates:
+            if not self.over_budget():
+                break
+            self.spill(session)
+
+    def over_budget(self) -> bool:
+        """
+        Indica se as sessões carregadas ultrapassam a memória ou o número máximo.
+        """
+        with self.lock:
+            loaded = [s for s in self.sessions.values() if s.store is not None]
+            total = sum(s.bytes for s in loaded)
+        return total > self.max_bytes or len(loaded) > self.max_datasets
+
+    def spill(self, session) -> bool:
+        """
+        Guarda a sessão em disco (se a versão guardada estiver desatualizada) e
+        liberta-a da memória, a não ser que entretanto tenha voltado a ser usada.
+        Se a escrita falhar, o erro é registado e a sessão fica em memória: a falha
+        nunca chega ao pedido que provocou a libertação. Retorna True se foi libertada.
+        """
+        with session.lock:
+            store, graph, version = session.store, session.graph, session.version
+            if store is None:
+                return False
+            if session.spilled_version != version:
+                path = os.path.join(self.spill_dir, session.name)
+                try:
+                    with stage("dataset_spill"):
+                        save_snapshot(path, store, graph)
+                except Exception as e:
+                    logger.error("Erro ao guardar a sessão '%s' em disco: %s", session.name, e)
+                    count("datasets_spill_failed")
+                    return False
+                session.spilled_version, session.spill_path = version, path
+            with self.lock:
+                # Um pedido pode ter começado a usar a sessão durante a escrita
+                if session.users > 0 or session.version != version:
+                    return False
+                session.unload()
+                self.spills += 1
+        count("datasets_spilled")
+        return True
+
+    def drop(self, name: str) -> bool:
+        """
+        Remove a sessão (da memória e do disco). Os pedidos em curso terminam com os
+        dados que já tinham. Retorna False se a sessão não existir.
+        """
+        with self.lock:
+            session = self.sessions.pop(name, None)
+        if session is None:
+            return False
+        with session.lock:
+            session.unload()
+            if session.spill_path is not None:
+                shutil.rmtree(session.spill_path, ignore_errors=True)
+            session.spilled_version = session.spill_path = None
+        return True
+
+    def stats(self):
+        """
+        Orçamento, memória estimada das sessões carregadas e resumo de cada sessão.
+        """
+        with self.lock:
+            sessions = list(self.sessions.values())
+            spills, reloads = self.spills, self.reloads
+        infos = [s.info() for s in sessions]
+        return {
+            "max_bytes": self.max_bytes,
+            "max_datasets": self.max_datasets,
+            "bytes": sum(i["bytes"] for i in infos),
+            "loaded": sum(i["in_memory"] for i in infos),
+            "spilled": sum(i["spilled"] for i in infos),
+            "spills": spills,
+            "reloads": reloads,
+            "datasets": infos,
+        }
@@ -0,0 +1,109 @@
+# Resumo:
+# Cache LRU de geometrias projetadas, com orçamento de memória.
+# A chave é (OBJECTID, hash do WKT, CRS de origem, CRS de destino): voltar a enviar
+# o mesmo CSV (ou uma atualização com as mesmas parcelas) reutiliza as geometrias já
+# interpretadas e reprojetadas, e uma parcela cujo WKT mudou é sempre recalculada.
+# Os contadores de acertos/falhas/remoções servem para dimensionar a cache.
+
+import hashlib  # Hash do conteúdo do WKT
+import threading  # Acesso concorrente a partir de várias threads
+from collections import OrderedDict  # Ordem de uso (LRU)
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+shapely = lazy_import("shapely")  # Número de coordenadas, para estimar a memória
+
+GEOMETRY_OVERHEAD_BYTES = 200  # Custo fixo estimado por entrada (objeto + chave)
+COORD_BYTES = 16  # Bytes por coordenada (x, y em float64)
+
+
+def wkt_digest(wkt: str) -> bytes:
+    """
+    Hash curto (BLAKE2b de 16 bytes) do texto WKT.
+    """
+    return hashlib.blake2b(wkt.encode("utf-8"), digest_size=16).digest()
+
+
+def geometry_bytes(geom) -> int:
+    """
+    Memória estimada de uma geometria em cache.
+    """
+    if geom is None:
+        return GEOMETRY_OVERHEAD_BYTES
+    return GEOMETRY_OVERHEAD_BYTES + COORD_BYTES * int(shapely.get_num_coordinates(geom))
+
+
+class GeometryCache:
+    """
+    Cache LRU {chave: geometria projetada} limitada a `max_bytes` (memória estimada).
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # {chave: (geometria, bytes)}
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get_many(self, keys):
+        """
+        Procura as chaves dadas. Retorna (geometrias encontradas, posições em falta),
+        com None nas posições em falta.
+        """
+        found, missing = [], []
+        with self.lock:
+            for k, key in enumerate(keys):
+                entry = self.entries.get(key)
+                if entry is None:
+                    found.append(None)
+                    missing.append(k)
+                else:
+                    self.entries.move_to_end(key)
+                    found.append(entry[0])
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        return found, missing
+
+    def put_many(self, keys, geoms):
+        """
+        Guarda as geometrias dadas e remove as menos usadas acima do orçamento.
+        """
+        if self.max_bytes <= 0:
+            return
+        with self.lock:
+            for key, geom in zip(keys, geoms):
+                size = geometry_bytes(geom)
+                old = self.entries.pop(key, None)
+                if old is not None:
+                    self.bytes -= old[1]
+                self.entries[key] = (geom, size)
+                self.bytes += size
+            while self.bytes > self.max_bytes and self.entries:
+                _, (_, size) = self.entries.popitem(last=False)
+                self.bytes -= size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Esvazia a cache e repõe os contadores.
+        """
+        with self.lock:
+            self.entries.clear()
+            self.bytes = self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        """
+        Contadores da cache: entradas, memória estimada, acertos, falhas e remoções.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "bytes": self.bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,164 @@
+# Resumo:
+# Grafo de adjacência compacto em formato CSR (Compressed Sparse Row).
+# Os nós são as posições das linhas do PropertyStore (o mapeamento
+# OBJECTID <-> posição é feito por store.ids / store.id_index), e os vizinhos
+# de cada nó ficam em indices[indptr[k]:indptr[k + 1]], por ordem crescente.
+# Os arrays podem ser lidos de ficheiros .npy por memory-mapping, permitindo
+# que vários workers (uvicorn/gunicorn) partilhem uma única cópia só de leitura.
+
+import os  # Caminhos de ficheiros
+import numpy as np  # Arrays CSR
+
+INDPTR_FILE = "graph_indptr.npy"
+INDICES_FILE = "graph_indices.npy"
+
+
+class AdjacencyGraph:
+    """
+    Grafo não dirigido com n nós, guardado como arrays CSR (indptr, indices).
+    Cada aresta {i, j} aparece duas vezes: j nos vizinhos de i e i nos vizinhos de j.
+    """
+
+    def __init__(self, indptr, indices):
+        self.indptr = indptr
+        self.indices = indices
+
+    @classmethod
+    def from_edges(cls, n: int, left, right):
+        """
+        Constrói o grafo com n nós a partir das arestas (left[k], right[k]).
+        """
+        left = np.asarray(left, dtype=np.int64)
+        right = np.asarray(right, dtype=np.int64)
+        src = np.concatenate([left, right])
+        dst = np.concatenate([right, left])
+        order = np.lexsort((dst, src))
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        np.cumsum(np.bincount(src, minlength=n), out=indptr[1:])
+        return cls(indptr, dst[order])
+
+    @classmethod
+    def empty(cls, n: int):
+        """
+        Grafo com n nós e sem arestas.
+        """
+        return cls(np.zeros(n + 1, dtype=np.int64), np.empty(0, dtype=np.int64))
+
+    def __len__(self):
+        return len(self.indptr) - 1
+
+    @property
+    def num_edges(self) -> int:
+        """
+        Número de arestas não dirigidas.
+        """
+        return int(len(self.indices) // 2)
+
+    def neighbours(self, pos: int):
+        """
+        Retorna as posições dos vizinhos do nó dado (array vazio se não houver).
+        """
+        return self.indices[self.indptr[pos] : self.indptr[pos + 1]]
+
+    def degrees(self):
+        """
+        Retorna o número de vizinhos de cada nó.
+        """
+        return np.diff(self.indptr)
+
+    def edges(self):
+        """
+        Retorna as arestas (i, j), com i < j, ordenadas por (i, j).
+        """
+        src = np.repeat(np.arange(len(self), dtype=np.int64), self.degrees())
+        mask = src < self.indices
+        return src[mask], np.asarray(self.indices[mask])
+
+    def subgraph_edges(self, nodes):
+        """
+        Retorna as arestas (i, j), com i < j, entre os nós dados, ordenadas por (i, j).
+        Só percorre os vizinhos desses nós (não o grafo inteiro).
+        """
+        nodes = np.unique(np.asarray(nodes, dtype=np.int64))
+        src, dst = self._expand(nodes)
+        # Mantém os destinos que também estão no conjunto, uma vez por aresta
+        pos = np.minimum(np.searchsorted(nodes, dst), max(len(nodes) - 1, 0))
+        keep = (src < dst) & (nodes[pos] == dst) if len(nodes) else src < dst
+        return src[keep], np.asarray(dst[keep])
+
+    def neighbourhood(self, pos: int, hops: int, limit=None):
+        """
+        Pesquisa em largura a partir do nó dado, até `hops` saltos.
+        Retorna (nós por ordem de descoberta, distância em saltos de cada nó);
+        com `limit`, pára ao atingir esse número de nós.
+        """
+        visited = np.zeros(len(self), dtype=bool)
+        visited[pos] = True
+        nodes, dist = [np.array([pos], dtype=np.int64)], [np.zeros(1, dtype=np.int64)]
+        frontier, total = nodes[0], 1
+        for hop in range(1, hops + 1):
+            if len(frontier) == 0 or (limit and total >= limit):
+                break
+            _, dst = self._expand(frontier)
+            # Vizinhos novos, pela ordem em que aparecem
+            dst, first = np.unique(np.asarray(dst), return_index=True)
+            dst = dst[np.argsort(first, kind="stable")]
+            frontier = dst[~visited[dst]]
+            if limit:
+                frontier = frontier[: limit - total]
+            visited[frontier] = True
+            nodes.append(frontier)
+            dist.append(np.full(len(frontier), hop, dtype=np.int64))
+            total += len(frontier)
+        return np.concatenate(nodes), np.concatenate(dist)
+
+    def edges_page(self, cursor: int, limit: int):
+        """
+        Página de até `limit` arestas (i, j), com i < j, pela ordem de edges(),
+        a começar na posição `cursor` de indices. Retorna (left, right, próximo cursor),
+        sendo o próximo cursor None no fim de indices (a última página pode vir vazia).
+        """
+        lefts, rights = [], []
+        found, start = 0, cursor
+        while found < limit and start < len(self.indices):
+            # Lê uma janela de indices; cerca de metade das entradas tem i < j
+            stop = min(len(self.indices), start + 2 * (limit - found) + 1)
+            offsets = np.arange(start, stop)
+            src = np.searchsorted(self.indptr, offsets, side="right") - 1
+            dst = np.asarray(self.indices[start:stop])
+            hit = np.flatnonzero(src < dst)[: limit - found]
+            lefts.append(src[hit])
+            rights.append(dst[hit])
+            found += len(hit)
+            start = stop if found < limit else start + int(hit[-1]) + 1
+        left = np.concatenate(lefts) if lefts else np.empty(0, dtype=np.int64)
+        right = np.concatenate(rights) if rights else np.empty(0, dtype=np.int64)
+        return left, right, (start if start < len(self.indices) else None)
+
+    def _expand(self, nodes):
+        """
+        Retorna (origem, destino) de todas as entradas CSR dos nós dados.
+        """
+        starts, ends = self.indptr[nodes], self.indptr[np.asarray(nodes) + 1]
+        sizes = ends - starts
+        src = np.repeat(nodes, sizes)
+        offsets = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        return src, self.indices[np.repeat(starts, sizes) + offsets]
+
+    def save(self, directory: str):
+        """
+        Guarda os arrays CSR em ficheiros .npy na diretoria dada.
+        """
+        np.save(os.path.join(directory, INDPTR_FILE), self.indptr)
+        np.save(os.path.join(directory, INDICES_FILE), self.indices)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True):
+        """
+        Lê os arrays CSR da diretoria dada; com mmap=True ficam mapeados em memória
+        (só de leitura) em vez de copiados, e são partilhados entre processos.
+        """
+        mmap_mode = "r" if mmap else None
+        indptr = np.load(os.path.join(directory, INDPTR_FILE), mmap_mode=mmap_mode)
+        indices = np.load(os.path.join(directory, INDICES_FILE), mmap_mode=mmap_mode)
+        return cls(indptr, indices)
@@ -0,0 +1,41 @@
+# Resumo:
+# Configuração do gunicorn (produção): workers uvicorn sobre a aplicação pré-carregada.
+# Uso (em src/main/python, onde este ficheiro é lido automaticamente): gunicorn server:app
+# 1. preload_app importa o servidor uma única vez, no processo principal.
+# 2. when_ready corre server.prewarm() antes do fork dos workers: bibliotecas
+#    preguiçosas, Transformers do pyproj, snapshot da sessão por omissão, STRtree e
+#    índice de similaridade. Os workers (incluindo os reciclados por max_requests)
+#    herdam tudo copy-on-write e servem o primeiro pedido sem importar nem construir nada.
+# 3. gc.freeze() move os objetos pré-aquecidos para fora do alcance do coletor de lixo,
+#    para que as recolhas nos workers não escrevam nessas páginas (e as copiem).
+
+import gc  # Objetos pré-aquecidos fora das recolhas (copy-on-write)
+import os  # Configuração por variáveis de ambiente
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1))
+worker_class = "uvicorn.workers.UvicornWorker"
+preload_app = True
+# Reciclagem dos workers (limita o crescimento da memória); barata com o pré-aquecimento
+max_requests = int(os.environ.get("MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.environ.get("MAX_REQUESTS_JITTER", 100))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 120))
+# PREWARM=0 desativa o pré-aquecimento (cada worker restaura o snapshot no arranque)
+PREWARM = os.environ.get("PREWARM", "1") != "0"
+
+
+def when_ready(arbiter):
+    """
+    Pré-aquece o servidor no processo principal, antes do fork dos workers.
+    """
+    if not PREWARM:
+        return
+    from server import prewarm
+
+    timings = prewarm()
+    gc.freeze()
+    arbiter.log.info(
+        "Pré-aquecimento em %.3f s: %s",
+        timings["total_s"],
+        ", ".join(f"{k}={v:.3f}" for k, v in timings.items() if k != "total_s"),
+    )
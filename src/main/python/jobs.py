@@ -0,0 +1,161 @@
+# Resumo:
+# Tarefas em segundo plano para a construção dos grafos.
+# Um POST cria a tarefa e retorna logo o seu id; a construção corre num
+# executor e vai atualizando contadores de progresso (parcelas projetadas,
+# pares candidatos testados, arestas encontradas), consultados por GET /jobs/{id}.
+# Pedidos com conteúdo idêntico (mesmo tipo, CSV e parâmetros) reutilizam a
+# tarefa existente em vez de voltar a construir o grafo.
+
+import hashlib  # Chave de conteúdo (SHA-256) para deduplicar pedidos
+import threading  # Proteção do registo de tarefas entre threads
+import time  # Instantes de criação e fim
+import uuid  # Identificadores das tarefas
+from collections import OrderedDict  # Registo ordenado (remoção das mais antigas)
+from concurrent.futures import ThreadPoolExecutor  # Execução em segundo plano
+
+MAX_JOBS = 100  # Número máximo de tarefas guardadas
+
+
+def content_key(kind: str, data: str, **params) -> str:
+    """
+    Chave SHA-256 do tipo de tarefa, do conteúdo e dos parâmetros (ordenados).
+    """
+    digest = hashlib.sha256()
+    digest.update(kind.encode("utf-8"))
+    for name in sorted(params):
+        digest.update(f"\0{name}={params[name]}".encode("utf-8"))
+    digest.update(b"\0")
+    digest.update((data or "").encode("utf-8", errors="surrogatepass"))
+    return digest.hexdigest()
+
+
+class Job:
+    """
+    Estado de uma tarefa: "queued", "running", "done" ou "error",
+    com contadores de progresso e, no fim, o resultado ou a mensagem de erro.
+    """
+
+    def __init__(self, kind: str, key: str):
+        self.id = uuid.uuid4().hex
+        self.kind = kind
+        self.key = key
+        self.status = "queued"
+        self.stage = None
+        self.progress = {}
+        self.result = None
+        self.version = None  # Versão dos dados da sessão produzida pela tarefa (se a substitui)
+        self.error = None
+        self.created = time.time()
+        self.finished = None
+
+    def advance(self, **counters):
+        """
+        Soma os incrementos dados aos contadores de progresso.
+        """
+        for name, value in counters.items():
+            self.progress[name] = self.progress.get(name, 0) + value
+
+    def set_stage(self, stage: str, **totals):
+        """
+        Regista a etapa em curso e, opcionalmente, totais conhecidos (ex: total_parcels).
+        """
+        self.stage = stage
+        self.progress.update(totals)
+
+    def to_dict(self, include_result: bool = True):
+        """
+        Representação JSON da tarefa (o resultado só é incluído quando terminada).
+        """
+        end = self.finished or time.time()
+        info = {
+            "id": self.id,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "progress": dict(self.progress),
+            "elapsed_s": round(end - self.created, 3),
+        }
+        if self.status == "error":
+            info["error"] = self.error
+        if include_result and self.status == "done":
+            info["result"] = self.result
+        return info
+
+
+class JobManager:
+    """
+    Registo das tarefas e executor onde correm. Por omissão executa uma tarefa
+    de cada vez, porque as construções substituem os dados globais do servidor.
+    """
+
+    def __init__(self, max_workers: int = 1, max_jobs: int = MAX_JOBS):
+        self.max_workers = max_workers
+        self.executor = None  # ThreadPoolExecutor criado na primeira tarefa
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()  # {id: Job}
+        self.by_key = {}  # {chave de conteúdo: id}
+        self.lock = threading.Lock()
+
+    def submit(self, kind: str, key: str, fn, *args, reuse=None, **kwargs):
+        """
+        Cria e agenda a tarefa fn(*args, **kwargs, job=tarefa), exceto se já existir uma tarefa com a
+        mesma chave que não tenha falhado (e, se dado, para a qual reuse(tarefa) seja verdadeiro).
+        Retorna (tarefa, True se foi reutilizada).
+        """
+        with self.lock:
+            existing = self.jobs.get(self.by_key.get(key))
+            if existing is not None and existing.status != "error":
+                if reuse is None or reuse(existing):
+                    return existing, True
+            job = Job(kind, key)
+            self.jobs[job.id] = job
+            self.by_key[key] = job.id
+            self._evict()
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.max_workers)
+            self.executor.submit(self._run, job, fn, args, kwargs)
+        return job, False
+
+    def get(self, job_id: str):
+        """
+        Retorna a tarefa com o id dado, ou None se não existir.
+        """
+        return self.jobs.get(job_id)
+
+    def _run(self, job: Job, fn, args, kwargs):
+        """
+        Executa a tarefa e regista o resultado ou o erro (ValueError: mensagem para o cliente).
+        """
+        job.status = "running"
+        try:
+            job.result = fn(*args, **kwargs, job=job)
+            job.status = "done"
+        except ValueError as e:
+            job.error, job.status = str(e), "error"
+        except Exception as e:
+            job.error, job.status = f"Erro interno: {e}", "error"
+        finally:
+            job.stage = None
+            job.finished = time.time()
+
+    def _evict(self):
+        """
+        Remove as tarefas terminadas mais antigas acima de max_jobs.
+        """
+        for job_id in list(self.jobs):
+            if len(self.jobs) <= self.max_jobs:
+                break
+            job = self.jobs[job_id]
+            if job.status in ("done", "error"):
+                del self.jobs[job_id]
+                if self.by_key.get(job.key) == job_id:
+                    del self.by_key[job.key]
+
+    def shutdown(self):
+        """
+        Termina o executor sem esperar pelas tarefas pendentes.
+        """
+        with self.lock:
+            if self.executor is not None:
+                self.executor.shutdown(wait=False, cancel_futures=True)
+                self.executor = None
@@ -0,0 +1,84 @@
+# Resumo:
+# Importação preguiçosa das bibliotecas de geometria, projeção e índices espaciais
+# (shapely, pyproj, scipy), para que `import server` seja rápido (arranque a frio).
+# 1. lazy_import("x") devolve um módulo substituto que só importa "x" no primeiro
+#    acesso a um atributo; os atributos lidos ficam guardados no substituto, pelo que
+#    os acessos seguintes são diretos. Com LAZY_IMPORTS=0 a importação é imediata.
+# 2. load_all() importa de uma vez todos os módulos registados (pré-aquecimento,
+#    ex: no processo principal do gunicorn antes do fork dos workers).
+# 3. O tempo de cada importação fica em import_timings() e na etapa "import:<módulo>"
+#    das métricas (no perfil de um pedido aparece o custo da primeira utilização).
+
+import importlib  # Importação pelo nome
+import os  # Modo de arranque (variável de ambiente)
+import sys  # Módulos já importados
+import threading  # Uma importação de cada vez
+import time  # Tempo de cada importação
+import types  # Tipo base dos módulos
+from metrics import stage  # Temporizadores por etapa
+
+# Importa as bibliotecas pesadas só no primeiro uso (LAZY_IMPORTS=0 desativa)
+LAZY_IMPORTS = os.environ.get("LAZY_IMPORTS", "1") != "0"
+
+_lock = threading.RLock()
+_modules = {}  # {nome: LazyModule} dos módulos pedidos com lazy_import
+_timings = {}  # {nome: segundos da importação}
+
+
+class LazyModule(types.ModuleType):
+    """
+    Substituto de um módulo, importado no primeiro acesso a um atributo.
+    """
+
+    def __getattr__(self, attr):
+        value = getattr(load(self.__name__), attr)
+        self.__dict__[attr] = value
+        return value
+
+    def __repr__(self):
+        state = "importado" if self.__name__ in _timings else "por importar"
+        return f"<módulo preguiçoso '{self.__name__}' ({state})>"
+
+
+def load(name: str):
+    """
+    Importa o módulo `name` (uma única vez), registando o tempo. Retorna o módulo real.
+    """
+    with _lock:
+        if name not in _timings:
+            start = time.perf_counter()
+            with stage(f"import:{name}"):
+                importlib.import_module(name)
+            _timings[name] = time.perf_counter() - start
+    return sys.modules[name]
+
+
+def lazy_import(name: str):
+    """
+    Retorna o módulo `name`: um substituto preguiçoso (LAZY_IMPORTS) ou o módulo real.
+    """
+    if not LAZY_IMPORTS:
+        return load(name)
+    with _lock:
+        if name not in _modules:
+            _modules[name] = LazyModule(name)
+        return _modules[name]
+
+
+def load_all():
+    """
+    Importa todos os módulos pedidos com lazy_import. Retorna import_timings().
+    """
+    with _lock:
+        names = list(_modules)
+    for name in names:
+        load(name)
+    return import_timings()
+
+
+def import_timings():
+    """
+    Segundos gastos a importar cada módulo preguiçoso já importado.
+    """
+    with _lock:
+        return dict(_timings)
@@ -0,0 +1,167 @@
+# Resumo:
+# Instrumentação das etapas mais pesadas do servidor.
+# 1. Temporizadores por etapa (stage) e contadores (linhas lidas, geometrias
+#    projetadas/falhadas, testes de predicado, arestas, sugestões pontuadas),
+#    acumulados globalmente e expostos em formato Prometheus (render_prometheus).
+# 2. Profiling opcional por pedido: com um RequestProfile ativo (ContextVar), as
+#    etapas e contadores desse pedido são também registados à parte e, no modo
+#    "cprofile", o trabalho executado no threadpool é medido com cProfile.
+
+import cProfile  # Profiling determinístico (modo "cprofile")
+import io  # Texto do relatório do pstats
+import pstats  # Agregação e formatação dos perfis
+import threading  # Proteção do registo global
+import time  # Medição de tempos
+from contextlib import contextmanager  # Temporizador como bloco "with"
+from contextvars import ContextVar  # Perfil do pedido em curso (propaga-se às threads)
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+METRIC_PREFIX = "cadastre"
+CPROFILE_LINES = 40  # Funções mostradas no relatório do cProfile
+
+_lock = threading.Lock()
+_stage_seconds = {}  # {etapa: segundos acumulados}
+_stage_calls = {}  # {etapa: número de execuções}
+_counters = {}  # {contador: total}
+_current = ContextVar("request_profile", default=None)
+
+
+class RequestProfile:
+    """
+    Etapas, contadores e (no modo "cprofile") perfis cProfile de um único pedido.
+    """
+
+    def __init__(self, mode: str = "stages"):
+        self.mode = mode
+        self.start = time.perf_counter()
+        self.stages = []  # [(etapa, segundos)] pela ordem em que terminam
+        self.counters = {}
+        self.profiles = []  # cProfile.Profile de cada chamada no threadpool
+        self.lock = threading.Lock()
+
+    def report(self):
+        """
+        Resumo do pedido: tempo total, etapas, contadores e, se pedido, o relatório cProfile.
+        """
+        result = {
+            "total_s": time.perf_counter() - self.start,
+            "stages": [{"stage": name, "seconds": s} for name, s in self.stages],
+            "counters": dict(self.counters),
+        }
+        if self.mode == "cprofile" and self.profiles:
+            out = io.StringIO()
+            stats = pstats.Stats(*self.profiles, stream=out)
+            stats.sort_stats("cumulative").print_stats(CPROFILE_LINES)
+            result["cprofile"] = out.getvalue()
+        return result
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Mede a duração do bloco e acumula-a na etapa `name` (e no perfil do pedido, se ativo).
+    """
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        with _lock:
+            _stage_seconds[name] = _stage_seconds.get(name, 0.0) + elapsed
+            _stage_calls[name] = _stage_calls.get(name, 0) + 1
+        profile = _current.get()
+        if profile is not None:
+            with profile.lock:
+                profile.stages.append((name, elapsed))
+
+
+def count(name: str, value: int = 1):
+    """
+    Soma `value` ao contador `name` (e ao do perfil do pedido, se ativo).
+    """
+    if not value:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+    profile = _current.get()
+    if profile is not None:
+        with profile.lock:
+            profile.counters[name] = profile.counters.get(name, 0) + value
+
+
+def start_profile(mode: str = "stages"):
+    """
+    Ativa um perfil para o pedido em curso. Retorna (perfil, token para stop_profile).
+    """
+    profile = RequestProfile(mode)
+    return profile, _current.set(profile)
+
+
+def stop_profile(token):
+    """
+    Desativa o perfil ativado por start_profile.
+    """
+    _current.reset(token)
+
+
+async def run_in_threadpool(func, *args, **kwargs):
+    """
+    Igual ao run_in_threadpool do Starlette; no modo "cprofile" mede a chamada
+    com cProfile dentro da thread onde é executada.
+    """
+    profile = _current.get()
+    if profile is None or profile.mode != "cprofile":
+        return await _run_in_threadpool(func, *args, **kwargs)
+
+    def profiled():
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            profiler.disable()
+            with profile.lock:
+                profile.profiles.append(profiler)
+
+    return await _run_in_threadpool(profiled)
+
+
+def snapshot():
+    """
+    Cópia dos valores globais: {"stages": {etapa: {seconds, calls}}, "counters": {...}}.
+    """
+    with _lock:
+        return {
+            "stages": {
+                name: {"seconds": _stage_seconds[name], "calls": _stage_calls[name]}
+                for name in _stage_seconds
+            },
+            "counters": dict(_counters),
+        }
+
+
+def render_prometheus(extra=None):
+    """
+    Texto no formato de exposição do Prometheus com as etapas, os contadores e
+    os valores adicionais `extra` ({nome: valor}, expostos como gauges).
+    """
+    values = snapshot()
+    lines = [
+        f"# HELP {METRIC_PREFIX}_stage_seconds_total Tempo acumulado por etapa.",
+        f"# TYPE {METRIC_PREFIX}_stage_seconds_total counter",
+    ]
+    for name, s in sorted(values["stages"].items()):
+        lines.append(f'{METRIC_PREFIX}_stage_seconds_total{{stage="{name}"}} {s["seconds"]:.6f}')
+    lines += [
+        f"# HELP {METRIC_PREFIX}_stage_calls_total Execuções por etapa.",
+        f"# TYPE {METRIC_PREFIX}_stage_calls_total counter",
+    ]
+    for name, s in sorted(values["stages"].items()):
+        lines.append(f'{METRIC_PREFIX}_stage_calls_total{{stage="{name}"}} {s["calls"]}')
+    for name, total in sorted(values["counters"].items()):
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name}_total counter")
+        lines.append(f"{METRIC_PREFIX}_{name}_total {total}")
+    for name, value in sorted((extra or {}).items()):
+        lines.append(f"# TYPE {METRIC_PREFIX}_{name} gauge")
+        lines.append(f"{METRIC_PREFIX}_{name} {value}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,312 @@
+# Resumo:
+# Otimizador de emparcelamento: um conjunto de trocas sem conflitos (cada parcela
+# muda de dono no máximo uma vez) com o maior ganho total de área média.
+# Numa troca o número de parcelas de cada dono não muda, por isso o ganho de área
+# média de várias trocas disjuntas é a soma dos ganhos (delta_avg_total) de cada uma:
+# o problema é um emparelhamento de peso máximo no grafo de trocas candidatas.
+# 1. Candidatos: para cada parcela, as trocas de maior ganho entre as parcelas na
+#    posição espelhada de cada classe de donos, as parcelas vizinhas ou as mais parecidas.
+# 2. Emparelhamento guloso: as trocas por ganho decrescente, se as parcelas estiverem livres.
+# 3. Recozimento simulado: em lotes, cada troca candidata substitui as trocas em
+#    conflito das suas parcelas; o ganho é calculado de forma incremental a partir do
+#    peso atual de cada parcela e os lotes aceites são aplicados sem conflitos entre si.
+# O progresso (objetivo atual e melhor, temperatura) é registado ao longo do tempo.
+
+import heapq  # Melhor par de classes de donos (guloso sobre todas as trocas)
+import time  # Orçamento de tempo e registo do progresso
+import numpy as np  # Operações vetorizadas sobre arrays
+from metrics import count, stage  # Temporizadores e contadores
+
+CANDIDATES_PER_PARCEL = 20  # Trocas candidatas por parcela
+WINDOW = 20  # Parcelas de cada classe de donos consideradas por parcela
+ANNEAL_BATCH = 4096  # Trocas candidatas avaliadas por iteração
+TRACE_INTERVAL = 0.05  # Segundos entre registos do progresso
+START_TEMPERATURE = 0.05  # Temperatura inicial (fração do ganho mediano das candidatas)
+END_TEMPERATURE = 1e-5  # Temperatura final (fração do ganho mediano)
+
+
+def best_gain_pairs(scorer, k: int = CANDIDATES_PER_PARCEL, window: int = WINDOW):
+    """
+    Para cada parcela, `k` trocas candidatas de maior ganho de área média.
+    O ganho de trocar i (dono com n1 parcelas) por j (n2 parcelas) é
+    (a_j - a_i) * (1/n1 - 1/n2). Entre duas classes de donos (pelo número de parcelas),
+    o emparelhamento ótimo dá as maiores parcelas de uma às menores da outra; por isso
+    cada parcela tem como candidatas, em cada classe, as k parcelas na posição espelhada
+    da sua (ordem crescente de área numa, decrescente na outra), e ficam as k de maior
+    ganho. Retorna os pares (i, j) em posições do scorer, orientados e sem duplicados.
+    """
+    n = len(scorer)
+    area = scorer.area
+    size = scorer.owner_count
+    levels, level_of = np.unique(size, return_inverse=True)
+    # Parcelas de cada classe por área crescente e quantil de cada parcela na sua classe
+    by_area = [np.flatnonzero(level_of == c) for c in range(len(levels))]
+    by_area = [m[np.argsort(area[m], kind="stable")] for m in by_area]
+    quantile = np.zeros(n)
+    for members in by_area:
+        quantile[members] = (np.arange(len(members)) + 0.5) / len(members)
+    best_j = np.full((n, k), -1, dtype=np.int64)
+    best_gain = np.zeros((n, k))
+    for level, members in zip(levels, by_area):
+        m = len(members)
+        for rows, ranked in (
+            (np.flatnonzero(size < level), members[::-1]),  # Recebem as maiores
+            (np.flatnonzero(size > level), members),  # Recebem as menores
+        ):
+            if len(rows) == 0:
+                continue
+            # Janela de `window` posições em torno da posição espelhada
+            width = min(window, m)
+            center = np.floor(quantile[rows] * m).astype(np.int64)
+            lo = np.clip(center - width // 2, 0, m - width)
+            pos = lo[:, None] + np.arange(width)[None, :]
+            cand = ranked[pos]
+            gain = (area[cand] - area[rows][:, None]) * (1 / size[rows][:, None] - 1 / level)
+            # Junta aos k melhores até agora e mantém os k primeiros
+            joined_j = np.concatenate([best_j[rows], cand], axis=1)
+            joined = np.concatenate([best_gain[rows], gain], axis=1)
+            keep = np.argpartition(-joined, k - 1, axis=1)[:, :k]
+            best_j[rows] = np.take_along_axis(joined_j, keep, axis=1)
+            best_gain[rows] = np.take_along_axis(joined, keep, axis=1)
+    valid = (best_j >= 0) & (best_gain > 0)
+    left = np.repeat(np.arange(n), k)[valid.ravel()]
+    return scorer._oriented(left, best_j[valid])
+
+
+def class_greedy_pairs(scorer):
+    """
+    Emparelhamento guloso sobre todas as trocas possíveis, sem as enumerar: entre uma
+    classe de donos com n1 parcelas e outra com n2 > n1, a troca de maior ganho entre
+    parcelas livres é sempre a da menor parcela da primeira com a maior da segunda.
+    Um heap com o ganho atual de cada par de classes (atualizado de forma preguiçosa,
+    porque o ganho de um par só pode diminuir) dá a melhor troca livre em cada passo.
+    Retorna os pares (i, j) escolhidos, em posições do scorer.
+    """
+    area = scorer.area
+    size = scorer.owner_count
+    levels, level_of = np.unique(size, return_inverse=True)
+    members = [np.flatnonzero(level_of == c) for c in range(len(levels))]
+    ranked = [m[np.argsort(area[m], kind="stable")].tolist() for m in members]
+    lo = [0] * len(levels)  # Menor parcela livre de cada classe (posição em ranked)
+    hi = [len(r) - 1 for r in ranked]  # Maior parcela livre de cada classe
+    taken = np.zeros(len(scorer), dtype=bool).tolist()
+    area = area.tolist()
+
+    def gain(s, b):
+        # s recebe a maior parcela de b e cede a sua menor (s tem menos parcelas por dono)
+        while lo[s] <= hi[s] and taken[ranked[s][lo[s]]]:
+            lo[s] += 1
+        while lo[b] <= hi[b] and taken[ranked[b][hi[b]]]:
+            hi[b] -= 1
+        if lo[s] > hi[s] or lo[b] > hi[b]:
+            return 0.0
+        a_s, a_b = area[ranked[s][lo[s]]], area[ranked[b][hi[b]]]
+        return (a_b - a_s) * (1 / levels[s] - 1 / levels[b])
+
+    heap = []
+    for s in range(len(levels)):
+        for b in range(s + 1, len(levels)):
+            g = gain(s, b)
+            if g > 0:
+                heap.append((-g, s, b))
+    heapq.heapify(heap)
+    left, right = [], []
+    while heap:
+        neg, s, b = heapq.heappop(heap)
+        g = gain(s, b)
+        if g <= 0:
+            continue
+        if g < -neg:
+            # Entrada desatualizada: volta ao heap com o ganho atual
+            heapq.heappush(heap, (-g, s, b))
+            continue
+        i, j = ranked[s][lo[s]], ranked[b][hi[b]]
+        taken[i] = taken[j] = True
+        left.append(i)
+        right.append(j)
+        g = gain(s, b)
+        if g > 0:
+            heapq.heappush(heap, (-g, s, b))
+    return np.array(left, dtype=np.int64), np.array(right, dtype=np.int64)
+
+
+def greedy_matching(n: int, u, v, w, free=None):
+    """
+    Emparelhamento guloso: percorre as arestas por peso decrescente (empates pela
+    ordem das arestas) e aceita cada uma cujas extremidades ainda estejam livres.
+    `free` (máscara dos nós disponíveis) limita os nós usados.
+    Retorna a máscara das arestas escolhidas.
+    """
+    free = np.ones(n, dtype=bool) if free is None else free.copy()
+    chosen = np.zeros(len(w), dtype=bool)
+    order = np.lexsort((np.arange(len(w)), -w))
+    # Só interessam as arestas com as duas extremidades livres à partida
+    order = order[free[u[order]] & free[v[order]]]
+    # Percurso sequencial: cada decisão depende das anteriores (O(arestas))
+    free = free.tolist()
+    for e, a, b in zip(order.tolist(), u[order].tolist(), v[order].tolist()):
+        if free[a] and free[b]:
+            free[a] = free[b] = False
+            chosen[e] = True
+    return chosen
+
+
+def anneal(
+    n: int,
+    u,
+    v,
+    w,
+    chosen,
+    time_budget: float,
+    max_iterations=None,
+    seed: int = 0,
+    batch: int = ANNEAL_BATCH,
+    progress=None,
+):
+    """
+    Recozimento simulado sobre o emparelhamento `chosen` (máscara das arestas).
+    Cada movimento acrescenta uma aresta e retira as arestas das suas extremidades;
+    o ganho é w[e] menos os pesos atuais das duas extremidades. Movimentos com
+    ganho positivo são sempre aceites e os outros com probabilidade exp(ganho / T),
+    com T a descer geometricamente até ao fim do orçamento de tempo (ou de iterações).
+    `progress`, se dado, é chamado com cada registo do progresso.
+    Retorna (melhor máscara, registo [{elapsed_s, objective, best_objective, temperature}],
+    número de iterações).
+    """
+    rng = np.random.default_rng(seed)
+    chosen = chosen.copy()
+    mate = np.full(n, -1, dtype=np.int64)  # Aresta escolhida de cada nó (-1 se livre)
+    mate[u[chosen]] = np.flatnonzero(chosen)
+    mate[v[chosen]] = np.flatnonzero(chosen)
+    weight = np.append(w, 0.0)  # weight[-1] = 0: nó livre
+    other = np.append(u + v, 0)  # u + v - nó = a outra extremidade
+    objective = float(w[chosen].sum())
+    best, best_objective = chosen.copy(), objective
+    t0 = float(np.median(w)) * START_TEMPERATURE if len(w) else 0.0
+    t1 = t0 * END_TEMPERATURE / START_TEMPERATURE
+    trace = []
+    start = last = time.perf_counter()
+    iterations = 0
+    while len(w):
+        # Fração do orçamento (de tempo e/ou de iterações) já gasta
+        spent = [(time.perf_counter() - start) / time_budget] if time_budget > 0 else []
+        if max_iterations is not None:
+            spent.append(iterations / max_iterations)
+        done = max(spent, default=1.0)
+        if done >= 1:
+            break
+        temperature = t0 * (t1 / t0) ** done
+        e = rng.integers(0, len(w), batch)
+        e = np.unique(e[~chosen[e]])
+        mu, mv = mate[u[e]], mate[v[e]]
+        delta = w[e] - weight[mu] - weight[mv]
+        accept = (delta > 0) | (rng.random(len(e)) < np.exp(np.minimum(delta, 0) / temperature))
+        e, mu, mv, delta = e[accept], mu[accept], mv[accept], delta[accept]
+        # Nós afetados: as extremidades e os seus parceiros atuais; só são aplicados
+        # os movimentos cujos nós não são afetados por outro movimento do lote
+        pu = np.where(mu >= 0, other[mu] - u[e], -1)
+        pv = np.where(mv >= 0, other[mv] - v[e], -1)
+        touched = np.concatenate([u[e], v[e], pu, pv])
+        owner = np.tile(np.arange(len(e)), 4)
+        keep = touched >= 0
+        uniq, counts = np.unique(touched[keep], return_counts=True)
+        clash = np.zeros(len(e), dtype=bool)
+        clash[owner[keep][np.isin(touched[keep], uniq[counts > 1])]] = True
+        e, mu, mv, delta = e[~clash], mu[~clash], mv[~clash], delta[~clash]
+        removed = np.concatenate([mu[mu >= 0], mv[mv >= 0]])
+        chosen[removed] = False
+        mate[u[removed]] = -1
+        mate[v[removed]] = -1
+        chosen[e] = True
+        mate[u[e]] = e
+        mate[v[e]] = e
+        objective += float(delta.sum())
+        iterations += 1
+        count("anneal_moves", int(len(e)))
+        if objective > best_objective:
+            best, best_objective = chosen.copy(), objective
+        now = time.perf_counter()
+        if now - last >= TRACE_INTERVAL:
+            last = now
+            trace.append(_trace_point(now - start, objective, best_objective, temperature))
+            if progress is not None:
+                progress(trace[-1])
+    trace.append(_trace_point(time.perf_counter() - start, objective, best_objective, 0.0))
+    if progress is not None:
+        progress(trace[-1])
+    return best, trace, iterations
+
+
+def _trace_point(elapsed, objective, best_objective, temperature):
+    """
+    Um registo do progresso do recozimento.
+    """
+    return {
+        "elapsed_s": round(elapsed, 4),
+        "objective": objective,
+        "best_objective": best_objective,
+        "temperature": temperature,
+    }
+
+
+def optimize_trades(
+    scorer,
+    i,
+    j,
+    initial=None,
+    time_budget: float = 1.0,
+    min_similarity: float = 0.0,
+    max_iterations=None,
+    seed: int = 0,
+    progress=None,
+):
+    """
+    Escolhe, entre as trocas candidatas (i[k], j[k]) em posições do scorer, um conjunto
+    sem parcelas repetidas com o maior ganho total de área média. Parte das trocas
+    `initial` = (i, j) (sem conflitos, ex: class_greedy_pairs), se dadas, completadas
+    com o emparelhamento guloso; segue-se o recozimento simulado durante `time_budget`
+    segundos e um último passo guloso sobre as parcelas que ficaram livres.
+    Só são consideradas trocas com ganho positivo e similaridade >= min_similarity.
+    Retorna (i, j, ganho, pontuação, similaridade) das trocas escolhidas, por ganho
+    decrescente, e um resumo com os objetivos e o registo do progresso.
+    """
+    with stage("optimize_trades"):
+        n = len(scorer)
+        if initial is not None:
+            i, j = scorer._oriented(np.concatenate([i, initial[0]]), np.concatenate([j, initial[1]]))
+        delta, score = scorer.score(i, j)
+        sim = scorer.similarity(i, j)
+        keep = (delta > 0) & (sim >= min_similarity)
+        i, j, delta, score, sim = i[keep], j[keep], delta[keep], score[keep], sim[keep]
+        chosen = np.zeros(len(delta), dtype=bool)
+        if initial is not None:
+            # Posições das trocas iniciais entre as candidatas (ordenadas por i * n + j)
+            key = i * max(n, 1) + j
+            a, b = scorer._oriented(*initial)
+            start = np.searchsorted(key, a * max(n, 1) + b)
+            found = start < len(key)
+            found[found] = key[start[found]] == (a * max(n, 1) + b)[found]
+            chosen[start[found]] = True
+        free = np.ones(n, dtype=bool)
+        free[i[chosen]] = False
+        free[j[chosen]] = False
+        chosen |= greedy_matching(n, i, j, delta, free)
+        initial_objective = float(delta[chosen].sum())
+        chosen, trace, iterations = anneal(
+            n, i, j, delta, chosen, time_budget, max_iterations, seed, progress=progress
+        )
+        # As parcelas que ficaram livres ainda podem ser emparelhadas entre si
+        free = np.ones(n, dtype=bool)
+        free[i[chosen]] = False
+        free[j[chosen]] = False
+        chosen |= greedy_matching(n, i, j, delta, free)
+    picked = np.flatnonzero(chosen)
+    picked = picked[np.lexsort((picked, -delta[picked]))]
+    summary = {
+        "candidate_swaps": int(len(delta)),
+        "initial_objective": initial_objective,
+        "objective": float(delta[picked].sum()),
+        "iterations": iterations,
+        "trace": trace,
+    }
+    return (i[picked], j[picked], delta[picked], score[picked], sim[picked]), summary
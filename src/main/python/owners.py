@@ -0,0 +1,118 @@
+# Resumo:
+# Grafo de proprietários sem arestas quadráticas.
+# O agrupamento das parcelas por OWNER é vetorizado (factorize + ordenação estável)
+# e o grafo pode ser devolvido em três representações:
+# 1. "star": cada proprietário é um nó central ligado às suas parcelas (n arestas).
+# 2. "groups": as parcelas levam o proprietário como grupo, sem arestas,
+#    e a lista proprietário -> parcelas é devolvida à parte.
+# 3. "clique": todas as parcelas do mesmo dono ligadas entre si (O(k²) por dono),
+#    tal como o endpoint original; só deve ser pedido para dados pequenos.
+# Cada representação pode ser devolvida como objetos do Vis-Network ou em formato colunar.
+
+from itertools import chain, combinations, islice  # Pares de parcelas (modo clique)
+import numpy as np  # Operações vetorizadas sobre arrays
+import pandas as pd  # Codificação dos proprietários
+from payloads import columnar_payload  # Formato colunar dos grafos
+from metrics import stage  # Temporizadores por etapa
+
+OWNER_MODES = ["star", "groups", "clique"]
+OWNER_NODE_PREFIX = "owner:"  # Prefixo dos ids dos nós de proprietário (modo star)
+
+
+def owner_groups(owners, ids):
+    """
+    Agrupa os ids das parcelas por proprietário (parcelas sem dono são ignoradas).
+    Retorna [(dono, array de ids)], com os donos pela ordem da primeira ocorrência
+    e os ids pela ordem das linhas.
+    """
+    codes, uniques = pd.factorize(pd.Series(owners), sort=False)
+    ids = np.asarray(ids)
+    valid = np.flatnonzero(codes >= 0)
+    order = valid[np.argsort(codes[valid], kind="stable")]
+    bounds = np.searchsorted(codes[order], np.arange(1, len(uniques)))
+    return list(zip(uniques.tolist(), np.split(ids[order], bounds)))
+
+
+def owners_graph(df: pd.DataFrame, mode: str = "star", limit=None, columnar: bool = False):
+    """
+    Constrói o grafo de proprietários das primeiras `limit` parcelas (todas se None).
+    Retorna {nodes, edges} no formato do Vis-Network (e {groups} no modo "groups"),
+    ou, com columnar=True, {format, nodes: {id, group}, edges: {from, to}}, em que
+    from/to são posições em nodes.id (ver columnar_payload).
+    """
+    with stage("owners_graph"):
+        return _owners_graph(df, mode, limit, columnar)
+
+
+def _owners_graph(df: pd.DataFrame, mode: str, limit, columnar: bool):
+    ids = df["OBJECTID"].astype(str).to_numpy()
+    shown = ids[:limit] if limit else ids
+    if mode == "clique":
+        rows = limit + 1 if limit else len(ids)
+        left, right = _clique_edges(df["OWNER"].to_numpy()[:rows], limit)
+        if columnar:
+            # Arestas para parcelas fora dos nós mostrados são omitidas
+            keep = (left < len(shown)) & (right < len(shown))
+            return columnar_payload(shown.tolist(), left[keep], right[keep])
+        pairs = zip(ids[left].tolist(), ids[right].tolist())
+        return {
+            "nodes": _parcel_nodes(shown),
+            "edges": [{"from": min(a, b), "to": max(a, b)} for a, b in pairs],
+        }
+    groups = owner_groups(df["OWNER"].to_numpy()[: len(shown)], np.arange(len(shown)))
+    owners = [str(owner) for owner, _ in groups]
+    if mode == "groups":
+        group = np.full(len(shown), None, dtype=object)
+        for owner, (_, members) in zip(owners, groups):
+            group[members] = owner
+        if columnar:
+            empty = np.empty(0, dtype=np.int64)
+            return columnar_payload(shown.tolist(), empty, empty, group.tolist())
+        nodes = _parcel_nodes(shown)
+        for node, owner in zip(nodes, group.tolist()):
+            node["group"] = owner
+        return {
+            "nodes": nodes,
+            "edges": [],
+            "groups": [
+                {"owner": owner, "properties": shown[members].tolist()}
+                for owner, (_, members) in zip(owners, groups)
+            ],
+        }
+    # Modo star: um nó por proprietário, ligado a cada uma das suas parcelas
+    hubs = [f"{OWNER_NODE_PREFIX}{owner}" for owner in owners]
+    sizes = [len(members) for _, members in groups]
+    members = [m for _, m in groups]
+    to = np.concatenate(members) if members else np.empty(0, dtype=np.int64)
+    if columnar:
+        frm = np.repeat(np.arange(len(shown), len(shown) + len(hubs)), sizes)
+        group = [None] * len(shown) + ["owner"] * len(hubs)
+        return columnar_payload(shown.tolist() + hubs, frm, to, group)
+    nodes = _parcel_nodes(shown)
+    nodes.extend(
+        {"id": hub, "label": owner, "title": f"{size} propriedades", "group": "owner"}
+        for hub, owner, size in zip(hubs, owners, sizes)
+    )
+    frm = np.repeat(np.array(hubs, dtype=object), sizes)
+    edges = [{"from": a, "to": b} for a, b in zip(frm.tolist(), shown[to].tolist())]
+    return {"nodes": nodes, "edges": edges}
+
+
+def _parcel_nodes(ids):
+    """
+    Nós das parcelas no formato de objetos do Vis-Network.
+    """
+    return [{"id": pid, "label": f"Propriedade {pid}"} for pid in ids.tolist()]
+
+
+def _clique_edges(owners, limit=None):
+    """
+    Pares (posições) de parcelas do mesmo dono, pela ordem do endpoint original:
+    considera as linhas dadas (0..limit) e para ao fim de limit * 5 arestas.
+    """
+    groups = owner_groups(owners, np.arange(len(owners)))
+    pairs = chain.from_iterable(combinations(members.tolist(), 2) for _, members in groups)
+    if limit:
+        pairs = islice(pairs, limit * 5)
+    flat = np.fromiter(chain.from_iterable(pairs), dtype=np.int64)
+    return flat[0::2], flat[1::2]
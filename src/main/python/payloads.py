@@ -0,0 +1,46 @@
+# Resumo:
+# Serialização rápida e compacta das respostas dos grafos.
+# 1. FastJSONResponse usa o orjson quando está instalado (muito mais rápido que o
+#    codificador json da biblioteca padrão); caso contrário recorre ao JSONResponse.
+#    O tempo de codificação é medido na etapa "json_encode".
+# 2. columnar_payload representa um grafo com arrays paralelos (ids dos nós e
+#    posições de origem/destino das arestas), sem um dicionário por nó/aresta.
+#    As legendas ("Propriedade <id>") são derivadas no cliente.
+
+import numpy as np  # Conversão de arrays de índices
+from fastapi.responses import JSONResponse  # Resposta JSON da biblioteca padrão
+from metrics import stage  # Temporizador da codificação JSON
+
+try:
+    import orjson  # noqa: F401  (dependência opcional, usada pelo ORJSONResponse)
+    from fastapi.responses import ORJSONResponse as _BaseJSONResponse
+except ImportError:
+    _BaseJSONResponse = JSONResponse
+
+
+class FastJSONResponse(_BaseJSONResponse):
+    """
+    Resposta JSON com orjson (se instalado), com a codificação medida por etapa.
+    """
+
+    def render(self, content) -> bytes:
+        with stage("json_encode"):
+            return super().render(content)
+
+
+PAYLOAD_FORMATS = ["objects", "columnar"]  # Formatos de resposta dos grafos
+
+
+def columnar_payload(node_ids, left, right, group=None):
+    """
+    Formato colunar de um grafo: a lista de ids dos nós (e, opcionalmente, o grupo
+    de cada nó) e as arestas como dois arrays paralelos de posições nessa lista.
+    """
+    nodes = {"id": node_ids}
+    if group is not None:
+        nodes["group"] = group
+    return {
+        "format": "columnar",
+        "nodes": nodes,
+        "edges": {"from": np.asarray(left).tolist(), "to": np.asarray(right).tolist()},
+    }
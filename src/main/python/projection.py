@@ -0,0 +1,111 @@
+# Resumo:
+# Re-projeção vetorizada de geometrias WKT.
+# Reutiliza um pyproj.Transformer por par de CRS (em cache), faz o parsing do WKT
+# em bloco com shapely.from_wkt e transforma todas as coordenadas de uma só vez
+# como arrays NumPy com shapely.transform.
+# project_geometries_cached consulta primeiro a cache LRU de geometrias projetadas
+# (geocache.py), indexada por OBJECTID, hash do WKT e par de CRS.
+
+import logging  # Registo de WKT inválidos
+import os  # Orçamento da cache de geometrias (variável de ambiente)
+from functools import lru_cache  # Cache dos Transformers por par de CRS
+import numpy as np  # Arrays de geometrias
+from geocache import GeometryCache, wkt_digest  # Cache LRU de geometrias projetadas
+from metrics import count, stage  # Temporizadores e contadores
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+shapely = lazy_import("shapely")  # Operações vetorizadas sobre geometrias
+pyproj = lazy_import("pyproj")  # Re-projeção de coordenadas
+
+SRC_CRS = "EPSG:4326"  # WGS84 (CRS das geometrias do CSV)
+TARGET_CRS = "EPSG:32628"  # UTM zona 28N (metros)
+BBOX_SEGMENTS = 16  # Subdivisões de cada lado de uma caixa antes de a projetar
+# Orçamento de memória (MB) da cache de geometrias projetadas; 0 desativa a cache
+GEOMETRY_CACHE_MB = int(os.environ.get("GEOMETRY_CACHE_MB", 256))
+
+geometry_cache = GeometryCache(GEOMETRY_CACHE_MB * 1024 * 1024)
+logger = logging.getLogger(__name__)
+
+
+@lru_cache(maxsize=None)
+def get_transformer(src_crs: str = SRC_CRS, target_crs: str = TARGET_CRS):
+    """
+    Retorna o Transformer para o par (src_crs, target_crs), criado uma única vez.
+    Mantém a ordem de eixos da autoridade do CRS, tal como o antigo pyproj.transform.
+    """
+    return pyproj.Transformer.from_crs(src_crs, target_crs)
+
+
+def project_geometries(geom_wkts, src_crs: str = SRC_CRS, target_crs: str = TARGET_CRS):
+    """
+    Projeta uma sequência de geometrias WKT de src_crs para target_crs.
+    Retorna um array de objetos Shapely com o mesmo comprimento da entrada;
+    posições com WKT inválido, em falta ou vazio ficam a None.
+    """
+    with stage("project_geometries"):
+        wkts = np.asarray(geom_wkts, dtype=object)
+        result = np.full(len(wkts), None, dtype=object)
+        # Apenas strings são WKT (NaN do pandas ou None ficam a None)
+        is_text = np.fromiter((isinstance(w, str) for w in wkts), dtype=bool, count=len(wkts))
+        geoms = shapely.from_wkt(wkts[is_text], on_invalid="ignore")
+        failed = int(shapely.is_missing(geoms).sum())
+        if failed:
+            logger.warning("Erro ao projetar geometria: %d WKT inválido(s)", failed)
+        # Descarta geometrias em falta ou vazias antes de transformar
+        keep = ~(shapely.is_missing(geoms) | shapely.is_empty(geoms))
+        transformer = get_transformer(src_crs, target_crs)
+        projected = shapely.transform(
+            geoms[keep], transformer.transform, include_z=None, interleaved=False
+        )
+        result[np.flatnonzero(is_text)[keep]] = projected
+        count("geometries_projected", int(keep.sum()))
+        count("geometries_failed", failed)
+        return result
+
+
+def project_geometries_cached(
+    ids, geom_wkts, src_crs: str = SRC_CRS, target_crs: str = TARGET_CRS, cache=None
+):
+    """
+    Igual a project_geometries, mas reutiliza as geometrias da cache (por omissão,
+    geometry_cache) com a mesma chave (OBJECTID, hash do WKT, src_crs, target_crs)
+    e projeta em bloco apenas as restantes, que são depois guardadas na cache.
+    """
+    cache = geometry_cache if cache is None else cache
+    wkts = np.asarray(geom_wkts, dtype=object)
+    text = np.flatnonzero(
+        np.fromiter((isinstance(w, str) for w in wkts), dtype=bool, count=len(wkts))
+    )
+    if cache.max_bytes <= 0 or len(text) == 0:
+        return project_geometries(wkts, src_crs, target_crs)
+    result = np.full(len(wkts), None, dtype=object)
+    keys = [
+        (str(pid), wkt_digest(wkt), src_crs, target_crs)
+        for pid, wkt in zip(np.asarray(ids, dtype=object)[text].tolist(), wkts[text].tolist())
+    ]
+    found, missing = cache.get_many(keys)
+    result[text] = np.array(found, dtype=object)
+    if missing:
+        rows = text[missing]
+        projected = project_geometries(wkts[rows], src_crs, target_crs)
+        result[rows] = projected
+        cache.put_many([keys[k] for k in missing], projected)
+    return result
+
+
+def project_bbox(bounds, src_crs: str = SRC_CRS, target_crs: str = TARGET_CRS):
+    """
+    Projeta a caixa (minx, miny, maxx, maxy), nas mesmas coordenadas dos WKT do CSV,
+    para target_crs. Os lados são subdivididos antes de transformar, porque numa
+    projeção a imagem de um retângulo não é um retângulo.
+    Retorna um polígono Shapely no CRS alvo.
+    """
+    minx, miny, maxx, maxy = bounds
+    box = shapely.box(minx, miny, maxx, maxy)
+    if src_crs == target_crs:
+        return box
+    step = max(maxx - minx, maxy - miny) / BBOX_SEGMENTS
+    if step > 0:
+        box = shapely.segmentize(box, step)
+    transformer = get_transformer(src_crs, target_crs)
+    return shapely.transform(box, transformer.transform, interleaved=False)
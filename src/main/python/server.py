@@ -1,22 +1,160 @@
-from functools import partial  # Para criar funções parciais na projeção de coordenadas
+import time  # Tempos de importação e de arranque (GET /startup)
+
+IMPORT_STARTED = time.perf_counter()  # Antes das restantes importações
+
 from fastapi import (
+    Depends,
     FastAPI,
     Query,
     HTTPException,
-)  # Framework para API e validação de parâmetros
-from fastapi.responses import JSONResponse  # Para retornos JSON customizados
+    Request,
+)  # Framework para API, validação de parâmetros e dependências
+from fastapi.responses import (
+    JSONResponse,
+    PlainTextResponse,
+    Response,
+)  # Retornos JSON, texto (métricas) e corpo em bruto
 from fastapi.middleware.cors import CORSMiddleware  # Middleware para CORS
+from fastapi.middleware.gzip import GZipMiddleware  # Compressão negociada por Accept-Encoding
 import pandas as pd  # Manipulação de dados em DataFrame
-from io import StringIO  # Leitura de strings como arquivos
-from collections import defaultdict  # Dicionário com lista padrão
+from io import StringIO, TextIOWrapper  # Leitura de strings e bytes como arquivos
+import tempfile  # Ficheiros temporários para uploads em streaming
+import os  # Variáveis de ambiente (diretoria de snapshot)
+import json  # Resposta envolvida com o perfil do pedido
+import re  # Validação dos OBJECTIDs das atualizações
+import logging  # Registo de erros no arranque
+from contextlib import asynccontextmanager  # Ciclo de vida da aplicação
+import multiprocessing  # Contexto "spawn" para o pool de processos
+from concurrent.futures import ProcessPoolExecutor  # Construção do grafo em paralelo
+import numpy as np  # Operações vetorizadas sobre arrays
 from typing import Optional  # Anotações de tipo opcionais
-from shapely.wkt import loads  # Converte WKT em objeto Shapely
-from shapely.ops import transform  # Transforma geometrias
-import pyproj  # Para re-projeção de coordenadas
-from itertools import combinations  # Para pares de itens em iteráveis
+from itertools import chain  # Junta o primeiro bloco do CSV aos restantes
+from adjacency import (
+    build_adjacency_edges,
+    build_adjacency_edges_parallel,
+)  # Motor de adjacência com STRtree (sequencial ou por ladrilhos em paralelo)
+from store import PropertyStore  # Armazenamento indexado das propriedades
+from graph import AdjacencyGraph  # Grafo de adjacência em CSR
+from trades import (
+    TradeScorer,
+    suggest_trades_vectorized,
+    trade_records,
+)  # Motor vetorizado de sugestões de trocas
+from optimizer import (
+    best_gain_pairs,
+    class_greedy_pairs,
+    optimize_trades,
+)  # Otimizador de emparcelamento (guloso + recozimento simulado)
+from datasets import (
+    DATASET_PATTERN,
+    DEFAULT_DATASET,
+    Dataset,
+    DatasetRegistry,
+)  # Sessões de dados com nome e libertação das menos usadas para disco
+from jobs import JobManager, content_key  # Tarefas de construção em segundo plano
+from updates import apply_changes  # Atualizações incrementais de parcelas
+from owners import owners_graph  # Grafo de proprietários (star, groups ou clique)
+from similarity import SimilarityIndex  # Índice (cKDTree) de parcelas similares
+from payloads import (
+    PAYLOAD_FORMATS,
+    FastJSONResponse,
+    columnar_payload,
+)  # Serialização rápida (orjson) e formato colunar dos grafos
+from snapshot import (
+    load_snapshot,
+    save_snapshot,
+    snapshot_exists,
+)  # Snapshot colunar em disco para arranques rápidos
+from projection import (
+    SRC_CRS,
+    TARGET_CRS,
+    geometry_cache,
+    get_transformer,
+    project_bbox,
+    project_geometries,
+)  # Re-projeção vetorizada de geometrias
+from lazy import (
+    LAZY_IMPORTS,
+    import_timings,
+    lazy_import,
+    load_all,
+)  # Importação no primeiro uso das bibliotecas pesadas (arranque rápido)
+from metrics import (
+    count,
+    render_prometheus,
+    run_in_threadpool,
+    stage,
+    start_profile,
+    stop_profile,
+)  # Temporizadores, contadores e profiling por pedido (executa no threadpool)
+
+logger = logging.getLogger(__name__)
+
+pyproj = lazy_import("pyproj")  # Erros de CRS inválido
+
+# Diretoria onde é guardado/restaurado o snapshot dos dados carregados
+SNAPSHOT_DIR = os.environ.get("SNAPSHOT_DIR", "snapshot")
+# Sessões de dados: diretoria das sessões libertadas, memória estimada e número
+# máximo de sessões carregadas em simultâneo
+DATASET_SPILL_DIR = os.environ.get("DATASET_SPILL_DIR", "spill")
+DATASET_MEMORY_MB = int(os.environ.get("DATASET_MEMORY_MB", 2048))
+MAX_DATASETS = int(os.environ.get("MAX_DATASETS", 8))
+GZIP_MIN_BYTES = 1024  # Tamanho mínimo de resposta a comprimir
+# Valores de ?profile= / X-Profile e o modo de profiling correspondente
+PROFILE_MODES = {"1": "stages", "true": "stages", "stages": "stages", "cprofile": "cprofile"}
+# Processos usados na construção do grafo e dimensão mínima para os usar
+GRAPH_WORKERS = int(os.environ.get("GRAPH_WORKERS", os.cpu_count() or 1))
+PARALLEL_MIN_PARCELS = int(os.environ.get("PARALLEL_MIN_PARCELS", 20_000))
+TILES_PER_WORKER = 4  # Ladrilhos espaciais por processo (equilíbrio de carga)
+# Tempos do arranque: importação deste módulo, pré-aquecimento e ciclo de vida
+startup_timings = {}
+
+process_pool = None  # ProcessPoolExecutor criado no primeiro uso
+
+
+def get_process_pool():
+    """
+    Retorna o pool de processos da construção do grafo, criando-o no primeiro uso.
+    Usa "spawn" para não fazer fork de um processo com threads do servidor.
+    """
+    global process_pool
+    if process_pool is None:
+        process_pool = ProcessPoolExecutor(
+            max_workers=GRAPH_WORKERS, mp_context=multiprocessing.get_context("spawn")
+        )
+    return process_pool
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    No arranque, restaura o último snapshot (se existir) para servir pedidos
+    sem ter de voltar a carregar o CSV e reconstruir o grafo. Se o processo já foi
+    pré-aquecido (prewarm, ex: herdado do processo principal do gunicorn), não repete.
+    """
+    start = time.perf_counter()
+    session = datasets.get(DEFAULT_DATASET)
+    if (session is None or session.store is None) and snapshot_exists(SNAPSHOT_DIR):
+        try:
+            with datasets.use(DEFAULT_DATASET, load=False) as session:
+                restore_state(SNAPSHOT_DIR, session)
+        except (OSError, ValueError) as e:
+            logger.error("Erro ao restaurar snapshot: %s", e)
+    startup_timings["lifespan_s"] = time.perf_counter() - start
+    startup_timings["ready_pid"] = os.getpid()
+    logger.info(
+        "Arranque: importação %.3f s, ciclo de vida %.3f s",
+        startup_timings["import_s"],
+        startup_timings["lifespan_s"],
+    )
+    yield
+    job_manager.shutdown()
+    if process_pool is not None:
+        process_pool.shutdown(cancel_futures=True)
+
 
-# Criação da aplicação FastAPI
-app = FastAPI()
+# Criação da aplicação FastAPI (respostas serializadas com orjson, se disponível)
+app = FastAPI(lifespan=lifespan, default_response_class=FastJSONResponse)
 
 # Middleware para permitir chamadas de qualquer origem (CORS)
 app.add_middleware(
@@ -27,51 +165,444 @@ app.add_middleware(
     allow_headers=["*"],  # Permite todos os headers
 )
 
-# Variáveis globais para guardar os dados carregados
-df_properties = None  # DataFrame global para propriedades
-property_adjacency_list = defaultdict(
-    list
-)  # Grafo de adjacência: {OBJECTID: [vizinhos]}
+
+@app.middleware("http")
+async def profile_request(request: Request, call_next):
+    """
+    Profiling opcional por pedido, ativado com ?profile=1 (etapas e contadores) ou
+    ?profile=cprofile (também o relatório do cProfile), ou com o header X-Profile.
+    A resposta JSON passa a {"result": resposta original, "profile": relatório};
+    as restantes mantêm o corpo e os headers. Em ambos os casos as etapas são
+    também enviadas no header Server-Timing.
+    """
+    flag = request.query_params.get("profile") or request.headers.get("x-profile")
+    if flag not in PROFILE_MODES:
+        return await call_next(request)
+    profile, token = start_profile(PROFILE_MODES[flag])
+    try:
+        response = await call_next(request)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+    finally:
+        stop_profile(token)
+    report = profile.report()
+    timings = [(s["stage"], s["seconds"]) for s in report["stages"]]
+    timings.append(("total", report["total_s"]))
+    server_timing = ", ".join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+    if not response.headers.get("content-type", "").startswith("application/json"):
+        # Corpo inalterado: mantém os headers originais (incluindo o Content-Type)
+        headers = dict(response.headers)
+        headers["Server-Timing"] = server_timing
+        return Response(body, response.status_code, headers)
+    # O corpo muda de tamanho: o Content-Length é recalculado
+    headers = {
+        k: v
+        for k, v in response.headers.items()
+        if k.lower() not in ("content-length", "content-type")
+    }
+    headers["Server-Timing"] = server_timing
+    content = {"result": json.loads(body) if body else None, "profile": report}
+    return FastJSONResponse(content, response.status_code, headers)
+
+
+# Comprime com gzip as respostas acima de GZIP_MIN_BYTES se o cliente o aceitar
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_BYTES)
+
+# Sessões de dados carregados (armazenamento, grafo e caches de cada uma)
+datasets = DatasetRegistry(DATASET_SPILL_DIR, DATASET_MEMORY_MB * 1024 * 1024, MAX_DATASETS)
+job_manager = JobManager()  # Tarefas de construção dos grafos em segundo plano
+
+
+def dataset_name(
+    dataset: str = Query(
+        DEFAULT_DATASET,
+        pattern=DATASET_PATTERN,
+        description="Sessão de dados (por omissão, \"default\")",
+    ),
+):
+    """
+    Dependência: o nome da sessão de dados indicada no pedido (?dataset=).
+    """
+    return dataset
+
+
+async def dataset_session(dataset: str = Depends(dataset_name)):
+    """
+    Dependência dos endpoints: a sessão ?dataset=, recarregada do disco (fora do event
+    loop) se tinha sido libertada. Não é libertada enquanto o pedido estiver em curso.
+    """
+    session = datasets.acquire(dataset)
+    try:
+        if session.spilled:
+            await run_in_threadpool(datasets.load, session)
+        yield session
+    finally:
+        datasets.release(session)
+
+# Separadores de CSV suportados, por ordem de preferência
+SEPARADORES = [";", ",", "\t"]
+SNIFF_BYTES = 64 * 1024  # Bytes iniciais usados para detetar o separador
+CHUNK_ROWS = 50_000  # Linhas por bloco no parsing em streaming
+SPOOL_MAX_BYTES = 16 * 1024 * 1024  # Acima disto o upload é guardado em disco
+REQUIRED_COLS = ["OBJECTID", "geometry", "OWNER", "Freguesia"]  # Colunas essenciais
 
 # --- Funções auxiliares ---
 
 
+def sniff_separator(sample: str):
+    """
+    Deteta o separador do CSV a partir do cabeçalho (primeira linha da amostra).
+    Retorna o primeiro separador suportado presente no cabeçalho, ou None.
+    """
+    header = sample.splitlines()[0] if sample else ""
+    for sep in SEPARADORES:
+        if sep in header:
+            return sep
+    return None
+
+
 def parse_csv_data(csv_data: str):
     """
     Tenta ler um CSV com diferentes separadores (";", ",", "\t").
+    O separador detetado no cabeçalho é tentado primeiro, evitando re-leituras.
     Retorna DataFrame se sucesso ou None caso falhe.
     """
-    separadores_possiveis = [";", ",", "\t"]
-    for sep in separadores_possiveis:
-        try:
-            df = pd.read_csv(StringIO(csv_data), sep=sep, skipinitialspace=True)
-            # Se leu mais de uma coluna, considera válido
-            if df.shape[1] > 1:
-                return df
-        except pd.errors.ParserError:
-            continue
+    if not isinstance(csv_data, str):
+        return None
+    sniffed = sniff_separator(csv_data[:SNIFF_BYTES])
+    separadores_possiveis = ([sniffed] if sniffed else []) + [
+        sep for sep in SEPARADORES if sep != sniffed
+    ]
+    with stage("parse_csv"):
+        for sep in separadores_possiveis:
+            try:
+                df = pd.read_csv(StringIO(csv_data), sep=sep, skipinitialspace=True)
+                # Se leu mais de uma coluna, considera válido
+                if df.shape[1] > 1:
+                    count("rows_parsed", len(df))
+                    return df
+            except pd.errors.ParserError:
+                continue
     return None
 
 
+def load_csv_store(binary_file, chunksize: int = CHUNK_ROWS):
+    """
+    Lê um CSV (ficheiro binário UTF-8) em blocos de `chunksize` linhas e constrói
+    o PropertyStore incrementalmente. O separador é detetado uma única vez a partir
+    dos primeiros SNIFF_BYTES e as colunas essenciais são validadas no primeiro bloco.
+    Retorna (separador, PropertyStore); lança ValueError com a mensagem de erro.
+    """
+    sample = binary_file.read(SNIFF_BYTES).decode("utf-8", errors="ignore")
+    binary_file.seek(0)
+    sep = sniff_separator(sample)
+    if sep is None:
+        raise ValueError("Não foi possível determinar o formato do CSV.")
+    text = TextIOWrapper(binary_file, encoding="utf-8", newline="")
+    try:
+        chunks = pd.read_csv(text, sep=sep, skipinitialspace=True, chunksize=chunksize)
+        first = next(chunks)
+        if not all(col in first.columns for col in REQUIRED_COLS):
+            raise ValueError(
+                f"O CSV deve conter colunas: {', '.join(REQUIRED_COLS)}."
+            )
+        with stage("parse_csv"):
+            store = PropertyStore.from_chunks(chain([first], chunks))
+        count("rows_parsed", len(store))
+        return sep, store
+    except (pd.errors.ParserError, pd.errors.EmptyDataError, StopIteration, UnicodeDecodeError):
+        raise ValueError("Não foi possível determinar o formato do CSV.")
+    finally:
+        text.detach()  # Devolve o ficheiro binário sem o fechar
+
 
-def project_geometry(geom_wkt: str, src_crs="EPSG:4326", target_crs="EPSG:32628"):
+
+def project_geometry(geom_wkt: str, src_crs=SRC_CRS, target_crs=TARGET_CRS):
     """
     Projeta geometria WKT de um CRS fonte para um CRS alvo (ex: WGS84 -> UTM).
     Retorna objeto Shapely transformado ou None em caso de erro.
+    Para várias geometrias, usar project_geometries (projeção em bloco).
     """
-    try:
-        geom = loads(geom_wkt)  # Carrega WKT
-        if geom.is_empty:
-            return None
-        # Cria função de projeção parcial
-        project = partial(
-            pyproj.transform, pyproj.Proj(src_crs), pyproj.Proj(target_crs)
+    return project_geometries([geom_wkt], src_crs, target_crs)[0]
+
+
+def build_property_graph(session, limit: Optional[int] = None, progress=None):
+    """
+    Calcula o grafo de adjacência espacial das primeiras `limit` propriedades do
+    armazenamento da sessão (todas se limit for None) e substitui o grafo da sessão.
+    `progress`, se dado, recebe os pares candidatos testados e as arestas encontradas.
+    Retorna (OBJECTIDs dos nós, índices de origem, índices de destino das arestas).
+    Bloqueante: nos endpoints deve correr fora do event loop (run_in_threadpool).
+    """
+    store = session.store
+    pids = store.ids[:limit] if limit else store.ids
+    pids = pids.tolist()
+    # Geometrias projetadas uma única vez pelo armazenamento
+    proj_geoms = store.geometries[: len(pids)]
+    # Gera arestas apenas entre candidatos com bounding boxes sobrepostas (STRtree);
+    # em datasets grandes, por ladrilhos espaciais distribuídos pelo pool de processos
+    with stage("adjacency"):
+        if GRAPH_WORKERS > 1 and len(pids) >= PARALLEL_MIN_PARCELS:
+            left, right = build_adjacency_edges_parallel(
+                proj_geoms,
+                get_process_pool(),
+                GRAPH_WORKERS * TILES_PER_WORKER,
+                progress=progress,
+            )
+        else:
+            left, right = build_adjacency_edges(proj_geoms, progress=progress)
+    if limit:
+        left, right = left[: limit * 5], right[: limit * 5]
+    graph = AdjacencyGraph.from_edges(len(store), left, right)
+    with session.lock:
+        session.set_graph(graph)
+    datasets.touch(session)
+    return pids, left, right
+
+
+def properties_graph_payload(
+    csv_data: str,
+    limit: Optional[int] = None,
+    format: str = "objects",
+    job=None,
+    dataset: str = DEFAULT_DATASET,
+):
+    """
+    Lê o CSV, substitui os dados da sessão `dataset` e constrói o grafo de adjacência.
+    Retorna {nodes, edges} para o Vis-Network (ou o formato colunar, ver payloads.py);
+    lança ValueError se o CSV for inválido.
+    Se `job` for dado, regista a etapa e o progresso na tarefa. Bloqueante.
+    """
+    progress = job.advance if job else None
+    if job:
+        job.set_stage("parsing")
+    df = parse_csv_data(csv_data)
+    if df is None:
+        raise ValueError("Não foi possível determinar o formato do CSV.")
+    # Verifica colunas essenciais
+    if not all(col in df.columns for col in REQUIRED_COLS):
+        raise ValueError(f"O CSV deve conter colunas: {', '.join(REQUIRED_COLS)}.")
+    store = PropertyStore(df)
+    if job:
+        job.set_stage("projecting", total_parcels=len(store))
+    store.project(progress)
+    # Substitui os dados da sessão e reconstrói o grafo
+    with datasets.use(dataset, load=False) as session:
+        set_dataset(session, store)
+        if job:
+            job.set_stage("adjacency")
+        pids, left, right = build_property_graph(session, limit, progress)
+        if job:
+            job.version = session.version  # Permite reutilizar a tarefa enquanto não mudar
+    if format == "columnar":
+        return columnar_payload(pids, left, right)
+    # Prepara nós e arestas
+    nodes = [
+        {"id": pid, "label": f"Propriedade {pid}", "title": f"ID: {pid}"}
+        for pid in pids
+    ]
+    edges = [
+        {"from": pids[i], "to": pids[j]} for i, j in zip(left.tolist(), right.tolist())
+    ]
+    return {"nodes": nodes, "edges": edges}
+
+
+def owners_graph_payload(
+    csv_data: str,
+    limit: Optional[int] = None,
+    mode: str = "star",
+    format: str = "objects",
+    job=None,
+):
+    """
+    Lê o CSV e constrói o grafo de proprietários na representação `mode` (ver owners.py).
+    Retorna {nodes, edges}; lança ValueError se o CSV for inválido. Bloqueante.
+    """
+    if job:
+        job.set_stage("parsing")
+    df = parse_csv_data(csv_data)
+    if df is None:
+        raise ValueError("Formato do CSV indefinido.")
+    # Verifica colunas
+    if not all(col in df.columns for col in ["OWNER", "OBJECTID"]):
+        raise ValueError("CSV deve conter OWNER e OBJECTID.")
+    if job:
+        job.set_stage("grouping", total_parcels=len(df))
+    # Agrupamento vetorizado por OWNER
+    payload = owners_graph(df, mode, limit, columnar=format == "columnar")
+    if job:
+        edges = payload["edges"]
+        job.advance(edges=len(edges["from"] if format == "columnar" else edges))
+    return payload
+
+
+def set_dataset(session, store, graph=None):
+    """
+    Substitui o armazenamento e o grafo da sessão e recria a cache de agregados,
+    pré-calculando os agregados simples de cada nível.
+    """
+    with session.lock:
+        session.replace(store, graph)
+    datasets.touch(session)
+
+
+def area_contacts(store, graph, rows, radius: float = 0.0):
+    """
+    Retorna os pares (left, right) de parcelas que confinam entre as linhas dadas,
+    em posições locais (0..len(rows)-1). Usa o grafo de adjacência se existir e
+    radius == 0; caso contrário consulta a STRtree com a distância `radius` (m).
+    """
+    if graph is not None and radius == 0:
+        local = np.full(len(store), -1, dtype=np.int64)
+        local[rows] = np.arange(len(rows))
+        left, right = graph.edges()
+        left, right = local[left], local[right]
+        keep = (left >= 0) & (right >= 0)
+        return left[keep], right[keep]
+    return build_adjacency_edges(store.geometries[rows], radius)
+
+
+def dataset_contacts(session):
+    """
+    Função rows -> arestas de adjacência entre as linhas dadas dos dados da sessão
+    (ver area_contacts).
+    """
+    store, graph = session.store, session.graph
+    return lambda rows: area_contacts(store, graph, rows)
+
+
+def update_dataset(session, upserts: pd.DataFrame, deletes=()):
+    """
+    Aplica uma atualização incremental (ver updates.apply_changes) aos dados da sessão:
+    só as arestas das parcelas alteradas são recalculadas e só os agregados dos nomes
+    afetados são invalidados. Retorna o resumo da atualização. Bloqueante.
+    """
+    with session.lock:
+        store, graph, summary = apply_changes(
+            session.store, session.graph, upserts, deletes
         )
-        # Aplica transformação
-        return transform(project, geom)
-    except Exception as e:
-        print(f"Erro ao projetar geometria: {e}")
-        return None
+        cache = session.area_cache.updated(
+            store, summary["touched"], lambda rows: area_contacts(store, graph, rows)
+        )
+        session.apply(store, graph, cache)
+    datasets.touch(session)
+    return summary
+
+
+def get_similarity_index(session):
+    """
+    Retorna o índice de similaridade dos dados da sessão, construindo-o (uma vez
+    por versão dos dados) no primeiro uso. Bloqueante.
+    """
+    store, index = session.store, session.similarity_index
+    if index is None:
+        index = SimilarityIndex(store.df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+        # Não guarda o índice se os dados tiverem mudado entretanto
+        if store is session.store:
+            session.similarity_index = index
+    return index
+
+
+def parcel_frame(records):
+    """
+    Converte uma lista de registos (dicionários) de parcelas num DataFrame,
+    validando as colunas essenciais. Lança ValueError se faltarem colunas, se
+    alguma estiver vazia ou se o OBJECTID não for um inteiro.
+    """
+    if not isinstance(records, list) or not all(isinstance(r, dict) for r in records):
+        raise ValueError("'upsert' deve ser uma lista de parcelas.")
+    for record in records:
+        missing = [
+            col
+            for col in REQUIRED_COLS
+            if record.get(col) is None or str(record[col]).strip() == ""
+        ]
+        if missing:
+            raise ValueError(f"Parcela sem colunas: {', '.join(missing)}.")
+        objectid = record["OBJECTID"]
+        if isinstance(objectid, bool) or not re.fullmatch(r"-?\d+", str(objectid).strip()):
+            raise ValueError(f"OBJECTID inválido: {objectid!r}.")
+    return pd.DataFrame.from_records(records)
+
+
+def restore_state(directory: str, session):
+    """
+    Substitui o armazenamento e o grafo da sessão pelos de um snapshot em disco.
+    """
+    store, graph = load_snapshot(directory)
+    set_dataset(session, store, graph)
+    return store
+
+
+def prewarm(restore: bool = True):
+    """
+    Pré-aquecimento antes de servir pedidos (ex: no processo principal do gunicorn
+    com preload_app, antes do fork): importa as bibliotecas preguiçosas, cria o
+    Transformer da projeção e restaura o snapshot da sessão por omissão com a STRtree
+    e o índice de similaridade já construídos. Os workers herdam tudo (copy-on-write).
+    Retorna os tempos de cada etapa.
+    """
+    timings = {}
+    start = time.perf_counter()
+    load_all()
+    timings["imports_s"] = time.perf_counter() - start
+    step = time.perf_counter()
+    get_transformer(SRC_CRS, TARGET_CRS)
+    timings["transformers_s"] = time.perf_counter() - step
+    if restore and snapshot_exists(SNAPSHOT_DIR):
+        step = time.perf_counter()
+        with datasets.use(DEFAULT_DATASET, load=False) as session:
+            restore_state(SNAPSHOT_DIR, session)
+            timings["restore_s"] = time.perf_counter() - step
+            step = time.perf_counter()
+            session.store.tree
+            get_similarity_index(session)
+            timings["indexes_s"] = time.perf_counter() - step
+    timings["total_s"] = time.perf_counter() - start
+    startup_timings["prewarm"] = timings
+    startup_timings["prewarm_pid"] = os.getpid()
+    return timings
+
+
+def snapshot_dir(dataset: str):
+    """
+    Diretoria do snapshot de uma sessão: SNAPSHOT_DIR para a sessão por omissão,
+    SNAPSHOT_DIR-<nome> para as restantes.
+    """
+    return SNAPSHOT_DIR if dataset == DEFAULT_DATASET else f"{SNAPSHOT_DIR}-{dataset}"
+
+
+def require_graph(session):
+    """
+    Garante que há propriedades carregadas e um grafo de adjacência construído.
+    """
+    if session.store is None or session.graph is None:
+        raise HTTPException(400, "Grafo de propriedades não construído.")
+
+
+def subgraph_payload(store, nodes, left, right, format: str, node_columns=None):
+    """
+    Resposta de um subgrafo dado por posições de nós e de arestas (left[k], right[k]),
+    no formato de objetos do Vis-Network ou colunar. `node_columns` ({nome: valores})
+    acrescenta atributos a cada nó (ex: distância em saltos).
+    """
+    ids = store.ids[nodes].tolist()
+    node_columns = {name: np.asarray(v).tolist() for name, v in (node_columns or {}).items()}
+    if format == "columnar":
+        # Posições das extremidades das arestas na lista de nós
+        order = np.argsort(nodes, kind="stable")
+        local_left = order[np.searchsorted(nodes[order], left)]
+        local_right = order[np.searchsorted(nodes[order], right)]
+        payload = columnar_payload(ids, local_left, local_right)
+        payload["nodes"].update(node_columns)
+        return payload
+    node_list = [
+        {"id": pid, "label": f"Propriedade {pid}", "title": f"ID: {pid}"} for pid in ids
+    ]
+    for name, values in node_columns.items():
+        for node, value in zip(node_list, values):
+            node[name] = value
+    edges = zip(store.ids[left].tolist(), store.ids[right].tolist())
+    return {"nodes": node_list, "edges": [{"from": a, "to": b} for a, b in edges]}
 
 
 def check_adjacency(geom1, geom2):
@@ -88,148 +619,464 @@ def check_adjacency(geom1, geom2):
 
 
 @app.get("/properties/{objectid}")
-async def get_property_details(objectid: str):
+async def get_property_details(objectid: str, session: Dataset = Depends(dataset_session)):
     """
     Retorna detalhes de uma propriedade pelo OBJECTID,
     incluindo proprietário, freguesia e IDs de propriedades adjacentes.
     """
-    global df_properties, property_adjacency_list
-    if df_properties is None:
+    store, graph = session.store, session.graph
+    if store is None:
         return JSONResponse(
             content={"error": "Os dados das propriedades não foram carregados."},
             status_code=400,
         )
-    try:
-        # Filtra DataFrame pelo ID
-        prop_row = df_properties[
-            df_properties["OBJECTID"].astype(str) == objectid
-        ].iloc[0]
-        owner = prop_row.get("OWNER")
-        freguesia = prop_row.get("Freguesia")
-        # Recupera vizinhos do grafo
-        adj = property_adjacency_list.get(objectid, [])
-        return JSONResponse(
-            content={
-                "id": objectid,
-                "owner": str(owner) if pd.notna(owner) else None,
-                "freguesia": str(freguesia) if pd.notna(freguesia) else None,
-                "adjacent_properties": [str(pid) for pid in adj],
-            }
-        )
-    except Exception:
+    # Consulta O(1) no índice de OBJECTID
+    pos = store.position(objectid)
+    if pos is None:
         return JSONResponse(
             content={"error": f"Propriedade com ID {objectid} não encontrada."},
             status_code=404,
         )
+    owner = store.value(pos, "OWNER")
+    freguesia = store.value(pos, "Freguesia")
+    # Recupera vizinhos do grafo CSR
+    adj = store.ids[graph.neighbours(pos)] if graph else []
+    return JSONResponse(
+        content={
+            "id": objectid,
+            "owner": str(owner) if pd.notna(owner) else None,
+            "freguesia": str(freguesia) if pd.notna(freguesia) else None,
+            "adjacent_properties": [str(pid) for pid in adj],
+        }
+    )
+
+
+# Formatos de resposta dos grafos
+FORMAT_PATTERN = f"^({'|'.join(PAYLOAD_FORMATS)})$"
+FORMAT_DESCRIPTION = "objects: nós/arestas do Vis-Network; columnar: arrays paralelos"
+
+
+@app.post("/properties/batch")
+async def update_properties(data: dict, session: Dataset = Depends(dataset_session)):
+    """
+    Atualização incremental de parcelas: {"upsert": [parcelas], "delete": [OBJECTIDs]}.
+    Cada parcela em "upsert" substitui a que tem o mesmo OBJECTID ou é acrescentada.
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    deletes = data.get("delete") or []
+    if not isinstance(deletes, list):
+        raise HTTPException(400, "'delete' deve ser uma lista de OBJECTIDs.")
+    try:
+        upserts = parcel_frame(data.get("upsert") or [])
+        return await run_in_threadpool(update_dataset, session, upserts, deletes)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.put("/properties/{objectid}")
+async def upsert_property(
+    objectid: str, data: dict, session: Dataset = Depends(dataset_session)
+):
+    """
+    Insere ou substitui a parcela com o OBJECTID dado.
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    try:
+        upserts = parcel_frame([{**data, "OBJECTID": objectid}])
+        return await run_in_threadpool(update_dataset, session, upserts)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+
+
+@app.delete("/properties/{objectid}")
+async def delete_property(objectid: str, session: Dataset = Depends(dataset_session)):
+    """
+    Remove a parcela com o OBJECTID dado (e as suas arestas).
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    if session.store.position(objectid) is None:
+        raise HTTPException(404, f"Propriedade com ID {objectid} não encontrada.")
+    return await run_in_threadpool(update_dataset, session, None, [objectid])
 
 
 @app.post("/process_properties_graph")
 async def process_properties_graph(
     data: dict,
     limit: Optional[int] = Query(None, description="Limite para o número de nós"),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
+    dataset: str = Depends(dataset_name),
 ):
     """
     Constrói grafo de adjacência espacial entre propriedades.
     Recebe CSV, parseia, projeta geometrias e gera nós e arestas.
+    Os dados passam a ser os da sessão `dataset` (substituindo os anteriores).
     """
-    global df_properties, property_adjacency_list
     csv_data = data.get("data")
-    df = parse_csv_data(csv_data)
-    if df is None:
-        return JSONResponse(
-            content={"error": "Não foi possível determinar o formato do CSV."},
-            status_code=400,
-        )
-    # Atualiza DataFrame global e limpa grafo
-    df_properties = df
-    property_adjacency_list.clear()
-    # Verifica colunas essenciais
-    required_cols = ["OBJECTID", "geometry", "OWNER", "Freguesia"]
-    if not all(col in df.columns for col in required_cols):
-        return JSONResponse(
-            content={
-                "error": f"O CSV deve conter colunas: {', '.join(required_cols)}."
-            },
-            status_code=400,
+    # Parsing, projeção e predicados geométricos correm fora do event loop
+    try:
+        payload = await run_in_threadpool(
+            properties_graph_payload, csv_data, limit, format, dataset=dataset
         )
-    # Prepara nós
-    nodes = []
-    geom_map = {}
-    for idx, row in df.iterrows():
-        pid = str(row["OBJECTID"])
-        nodes.append({"id": pid, "label": f"Propriedade {pid}", "title": f"ID: {pid}"})
-        geom_map[pid] = row["geometry"]
-        if limit and len(nodes) >= limit:
-            break
-    # Projeta geometrias uma vez
-    proj_geoms = {pid: project_geometry(wkt) for pid, wkt in geom_map.items()}
-    # Gera arestas
-    edges = []
-    seen = set()
-    pids = list(proj_geoms.keys())
-    for i in range(len(pids)):
-        for j in range(i + 1, len(pids)):
-            pair = tuple(sorted((pids[i], pids[j])))
-            if pair in seen:
-                continue
-            seen.add(pair)
-            if check_adjacency(proj_geoms[pids[i]], proj_geoms[pids[j]]):
-                edges.append({"from": pids[i], "to": pids[j]})
-                property_adjacency_list[pids[i]].append(pids[j])
-                property_adjacency_list[pids[j]].append(pids[i])
-            if limit and len(edges) >= limit * 5:
-                break
-        if limit and len(edges) >= limit * 5:
-            break
-    return JSONResponse(content={"nodes": nodes, "edges": edges})
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return FastJSONResponse(content=payload)
+
+
+@app.post("/upload_csv")
+async def upload_csv(
+    request: Request,
+    graph: bool = Query(False, description="Constrói também o grafo de adjacência"),
+    chunksize: int = Query(CHUNK_ROWS, ge=1, description="Linhas por bloco"),
+    dataset: str = Depends(dataset_name),
+):
+    """
+    Carrega um CSV enviado em streaming (corpo em bruto ou multipart com campo "file").
+    O corpo é copiado para um ficheiro temporário à medida que chega e depois
+    lido em blocos fora do event loop, alimentando o armazenamento incrementalmente.
+    Os dados passam a ser os da sessão `dataset` (substituindo os anteriores).
+    """
+    content_type = request.headers.get("content-type", "")
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "file"):
+            return JSONResponse(
+                content={"error": "O multipart deve conter o campo 'file'."},
+                status_code=400,
+            )
+        source = upload.file
+    else:
+        source = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_BYTES)
+        async for chunk in request.stream():
+            source.write(chunk)
+    try:
+        source.seek(0)
+        sep, store = await run_in_threadpool(load_csv_store, source, chunksize)
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    finally:
+        source.close()
+    # Substitui os dados da sessão e invalida o grafo anterior
+    session = datasets.acquire(dataset)
+    try:
+        await run_in_threadpool(set_dataset, session, store)
+        result = {"rows": len(store), "columns": list(store.df.columns), "separator": sep}
+        if graph:
+            _, left, _ = await run_in_threadpool(build_property_graph, session)
+            result["edges"] = int(len(left))
+    finally:
+        datasets.release(session)
+    return result
+
+
+@app.post("/snapshot")
+async def create_snapshot(session: Dataset = Depends(dataset_session)):
+    """
+    Guarda as propriedades carregadas, as geometrias (WKB) e o grafo (CSR)
+    num snapshot colunar em SNAPSHOT_DIR (SNAPSHOT_DIR-<dataset> para outras sessões).
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    directory = snapshot_dir(session.name)
+    meta = await run_in_threadpool(save_snapshot, directory, session.store, session.graph)
+    return {"directory": directory, **meta}
+
+
+@app.post("/snapshot/restore")
+async def restore_snapshot(dataset: str = Depends(dataset_name)):
+    """
+    Restaura as propriedades e o grafo da sessão a partir do seu snapshot.
+    """
+    directory = snapshot_dir(dataset)
+    if not snapshot_exists(directory):
+        raise HTTPException(404, "Nenhum snapshot encontrado.")
+    session = datasets.acquire(dataset)
+    try:
+        store = await run_in_threadpool(restore_state, directory, session)
+    except ValueError as e:
+        raise HTTPException(400, str(e))
+    finally:
+        datasets.release(session)
+    return {"directory": directory, "rows": len(store)}
+
+
+@app.get("/datasets")
+async def list_datasets():
+    """
+    Lista as sessões de dados (em memória ou guardadas em disco), com a memória
+    estimada de cada uma, e o orçamento de memória e de sessões carregadas.
+    """
+    return datasets.stats()
+
+
+@app.delete("/datasets/{name}")
+async def delete_dataset(name: str):
+    """
+    Remove uma sessão de dados, da memória e do disco.
+    """
+    if not await run_in_threadpool(datasets.drop, name):
+        raise HTTPException(404, f"Sessão '{name}' não encontrada.")
+    return {"deleted": name}
 
 
 @app.post("/process_owners_graph")
 async def process_owners_graph(
     data: dict,
     limit: Optional[int] = Query(None, description="Limite para nós e arestas"),
+    mode: str = Query(
+        "star",
+        pattern="^(star|groups|clique)$",
+        description="star: nó por dono; groups: parcelas agrupadas; clique: todos os pares",
+    ),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
 ):
     """
     Constrói grafo ligando propriedades pelo mesmo OWNER.
-    Cada nó é uma parcela, arestas ligam parcelas de mesmo dono.
+    Por omissão cada dono é um nó central ligado às suas parcelas (modo "star");
+    no modo "clique" as arestas ligam todas as parcelas do mesmo dono entre si.
     """
     csv_data = data.get("data")
-    df = parse_csv_data(csv_data)
-    if df is None:
-        return JSONResponse(
-            content={"error": "Formato do CSV indefinido."}, status_code=400
-        )
-    # Verifica colunas
-    if not all(col in df.columns for col in ["OWNER", "OBJECTID"]):
-        return JSONResponse(
-            content={"error": "CSV deve conter OWNER e OBJECTID."},
-            status_code=400,
+    try:
+        payload = await run_in_threadpool(
+            owners_graph_payload, csv_data, limit, mode, format
         )
-    # Agrupa IDs por OWNER
-    props_by_owner = defaultdict(list)
-    for idx, row in df.iterrows():
-        props_by_owner[row["OWNER"]].append(str(row["OBJECTID"]))
-        if limit and idx >= limit:
-            break
-    # Cria nós
-    nodes = [
-        {"id": str(r["OBJECTID"]), "label": f"Propriedade {r['OBJECTID']}"}
-        for _, r in df.iterrows()
-    ][:limit]
-    # Cria arestas entre IDs do mesmo dono
-    edges = []
-    used = set()
-    for owner, plist in props_by_owner.items():
-        for a, b in combinations(plist, 2):
-            pair = tuple(sorted((a, b)))
-            if pair not in used:
-                edges.append({"from": pair[0], "to": pair[1]})
-                used.add(pair)
-                if limit and len(edges) >= limit * 5:
-                    break
-        if limit and len(edges) >= limit * 5:
-            break
-    return JSONResponse(content={"nodes": nodes, "edges": edges})
+    except ValueError as e:
+        return JSONResponse(content={"error": str(e)}, status_code=400)
+    return FastJSONResponse(content=payload)
+
+
+# Construtores dos grafos disponíveis como tarefas em segundo plano
+GRAPH_JOBS = {
+    "properties_graph": properties_graph_payload,
+    "owners_graph": owners_graph_payload,
+}
+latest_properties_jobs = {}  # {sessão: id da última tarefa do grafo de propriedades}
+
+
+def properties_job_reusable(dataset: str):
+    """
+    Condição de reutilização de uma tarefa do grafo de propriedades da sessão dada,
+    que substitui os dados da sessão: terminada, só se a sessão ainda tiver a versão
+    que a tarefa produziu; pendente, só se for a última agendada para a sessão.
+    """
+
+    def reuse(job):
+        if job.status == "done":
+            session = datasets.get(dataset)
+            return session is not None and session.version == job.version
+        return latest_properties_jobs.get(dataset) == job.id
+
+    return reuse
+
+
+@app.post("/jobs/{kind}", status_code=202)
+async def submit_graph_job(
+    kind: str,
+    data: dict,
+    limit: Optional[int] = Query(None, description="Limite para o número de nós"),
+    mode: str = Query(
+        "star",
+        pattern="^(star|groups|clique)$",
+        description="Representação do grafo de proprietários",
+    ),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
+    dataset: str = Depends(dataset_name),
+):
+    """
+    Agenda a construção de um grafo ("properties_graph" ou "owners_graph") e retorna
+    logo o id da tarefa. Um pedido idêntico (mesmo CSV e parâmetros) reutiliza a tarefa;
+    o grafo de propriedades substitui os dados da sessão `dataset`, pelo que só é
+    reutilizado se os dados da sessão ainda forem os que essa tarefa carregou.
+    """
+    if kind not in GRAPH_JOBS:
+        raise HTTPException(404, f"Tipo de tarefa '{kind}' desconhecido.")
+    csv_data = data.get("data")
+    if not isinstance(csv_data, str):
+        raise HTTPException(400, "O pedido deve conter o CSV no campo 'data'.")
+    params = {"limit": limit, "format": format}
+    reuse = None
+    if kind == "owners_graph":
+        params["mode"] = mode  # O modo só se aplica ao grafo de proprietários
+    else:
+        params["dataset"] = dataset  # Só o grafo de propriedades fica numa sessão
+        # A, B e de novo A tem de voltar a carregar A
+        reuse = properties_job_reusable(dataset)
+    key = content_key(kind, csv_data, **params)
+    job, reused = job_manager.submit(
+        kind, key, GRAPH_JOBS[kind], csv_data, reuse=reuse, **params
+    )
+    if kind == "properties_graph" and not reused:
+        latest_properties_jobs[dataset] = job.id
+    return {"job_id": job.id, "status": job.status, "reused": reused}
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Retorna o estado, a etapa e o progresso da tarefa e, quando terminada, o resultado.
+    """
+    job = job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(404, f"Tarefa {job_id} não encontrada.")
+    return FastJSONResponse(content=job.to_dict())
+
+
+# Consultas ao grafo guardado: por área, por vizinhança e arestas paginadas
+MAX_QUERY_NODES = 5000  # Limite por omissão de nós devolvidos por consulta
+
+
+@app.get("/graph/bbox")
+async def graph_bbox(
+    minx: float = Query(...),
+    miny: float = Query(...),
+    maxx: float = Query(...),
+    maxy: float = Query(...),
+    crs: str = Query(SRC_CRS, description="CRS da caixa (por omissão, o dos WKT do CSV)"),
+    limit: int = Query(MAX_QUERY_NODES, ge=1),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Retorna as propriedades cuja geometria interseta a caixa dada (consulta à STRtree
+    das geometrias projetadas) e as arestas do grafo entre elas.
+    """
+    require_graph(session)
+    store, graph = session.store, session.graph
+    if minx > maxx or miny > maxy:
+        raise HTTPException(400, "Caixa inválida: é necessário min <= max.")
+    try:
+        area = project_bbox((minx, miny, maxx, maxy), crs, TARGET_CRS)
+    except pyproj.exceptions.CRSError:
+        raise HTTPException(400, f"CRS '{crs}' inválido.")
+    nodes = await run_in_threadpool(store.query_area, area)
+    truncated = len(nodes) > limit
+    nodes = nodes[:limit]
+    left, right = graph.subgraph_edges(nodes)
+    payload = subgraph_payload(store, nodes, left, right, format)
+    payload["truncated"] = truncated
+    return payload
+
+
+@app.get("/graph/neighbourhood/{objectid}")
+async def graph_neighbourhood(
+    objectid: str,
+    hops: int = Query(1, ge=1, le=10, description="Número máximo de saltos"),
+    limit: int = Query(MAX_QUERY_NODES, ge=1),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Retorna as propriedades a até `hops` saltos da propriedade dada (pesquisa em
+    largura no grafo CSR), com a distância em saltos de cada uma, e as arestas entre elas.
+    """
+    require_graph(session)
+    store, graph = session.store, session.graph
+    pos = store.position(objectid)
+    if pos is None:
+        raise HTTPException(404, f"Propriedade com ID {objectid} não encontrada.")
+    # Um nó a mais indica se a pesquisa ficou de fora de algum nó (ordem de descoberta)
+    nodes, dist = graph.neighbourhood(pos, hops, limit + 1)
+    truncated = len(nodes) > limit
+    nodes, dist = nodes[:limit], dist[:limit]
+    left, right = graph.subgraph_edges(nodes)
+    payload = subgraph_payload(store, nodes, left, right, format, {"hops": dist})
+    payload["truncated"] = truncated
+    return payload
+
+
+@app.get("/graph/edges")
+async def graph_edges(
+    cursor: int = Query(0, ge=0, description="Cursor devolvido pela página anterior"),
+    limit: int = Query(1000, ge=1, le=100_000),
+    format: str = Query("objects", pattern=FORMAT_PATTERN, description=FORMAT_DESCRIPTION),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Lista as arestas do grafo por páginas de até `limit`, pela ordem (i, j).
+    `next_cursor` é None quando não há mais arestas.
+    """
+    require_graph(session)
+    store, graph = session.store, session.graph
+    left, right, next_cursor = graph.edges_page(cursor, limit)
+    sources = store.ids[left].tolist()
+    targets = store.ids[right].tolist()
+    if format == "columnar":
+        edges = {"from": sources, "to": targets}
+    else:
+        edges = [{"from": a, "to": b} for a, b in zip(sources, targets)]
+    return {
+        "edges": edges,
+        "next_cursor": next_cursor,
+        "total": graph.num_edges,
+    }
+
+
+@app.get("/cache/geometries")
+async def geometry_cache_stats():
+    """
+    Estatísticas da cache de geometrias projetadas (entradas, memória estimada,
+    acertos, falhas e remoções), para dimensionar GEOMETRY_CACHE_MB.
+    """
+    return geometry_cache.stats()
+
+
+@app.delete("/cache/geometries")
+async def clear_geometry_cache():
+    """
+    Esvazia a cache de geometrias projetadas.
+    """
+    geometry_cache.clear()
+    return geometry_cache.stats()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """
+    Métricas no formato de exposição do Prometheus: tempo e execuções por etapa
+    (parsing, projeção, adjacência, agregados, sugestões, codificação JSON), contadores
+    e o estado atual (parcelas e arestas das sessões em memória, sessões, tarefas,
+    cache de geometrias e tempo de importação do servidor).
+    """
+    cache = geometry_cache.stats()
+    sessions = datasets.stats()
+    loaded = [d for d in sessions["datasets"] if d["in_memory"]]
+    extra = {
+        "parcels_loaded": sum(d["rows"] for d in loaded),
+        "graph_edges": sum(d["edges"] or 0 for d in loaded),
+        "datasets_loaded": sessions["loaded"],
+        "datasets_spilled": sessions["spilled"],
+        "datasets_bytes": sessions["bytes"],
+        "jobs": len(job_manager.jobs),
+        "geometry_cache_entries": cache["entries"],
+        "geometry_cache_bytes": cache["bytes"],
+        "geometry_cache_hits": cache["hits"],
+        "geometry_cache_misses": cache["misses"],
+        "startup_import_seconds": startup_timings.get("import_s", 0.0),
+    }
+    return PlainTextResponse(render_prometheus(extra), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/startup")
+async def get_startup():
+    """
+    Tempos do arranque deste processo: importação do servidor, importação de cada
+    biblioteca preguiçosa (no pré-aquecimento ou no primeiro uso), pré-aquecimento
+    e ciclo de vida. `preloaded` indica que o pré-aquecimento foi feito noutro
+    processo (o principal do gunicorn) e herdado no fork.
+    """
+    prewarm_pid = startup_timings.get("prewarm_pid")
+    return {
+        "pid": os.getpid(),
+        "lazy_imports": LAZY_IMPORTS,
+        "import_s": startup_timings.get("import_s"),
+        "lazy_import_s": import_timings(),
+        "prewarm": startup_timings.get("prewarm"),
+        "preloaded": prewarm_pid is not None and prewarm_pid != os.getpid(),
+        "lifespan_s": startup_timings.get("lifespan_s"),
+    }
 
 
 # FEATURE 4: Cálculo de área média simples
@@ -237,41 +1084,28 @@ async def process_owners_graph(
 async def get_average_area(
     level: str = Query(..., regex="^(Freguesia|Concelho|Distrito)$"),
     name: str = Query(...),
+    session: Dataset = Depends(dataset_session),
 ):
     """
     Retorna a área média (m²) das propriedades em uma área geográfica dada.
     """
-    global df_properties
-    if df_properties is None:
+    if session.store is None:
         raise HTTPException(400, "Dados de propriedades não carregados.")
     # Valida coluna de filtragem
-    if level not in df_properties.columns:
+    if level not in session.store.df.columns:
         raise HTTPException(400, f"Coluna '{level}' não existe.")
-    df_filt = df_properties[df_properties[level] == name]
-    if df_filt.empty:
+    # Agregados pré-calculados para a versão carregada dos dados
+    stats = session.area_cache.simple_stats(level, name)
+    if stats is None or stats["count"] == 0:
         raise HTTPException(
             404, f"Nenhuma propriedade encontrada para {level}='{name}'."
         )
-    # Se Shape_Area existe, usa diretamente
-    if "Shape_Area" in df_filt.columns:
-        arr = df_filt["Shape_Area"].dropna().astype(float)
-        mean_area = float(arr.mean())
-        count = int(arr.count())
-    else:
-        # Caso não, projeta e calcula área geométrica
-        areas = []
-        for _, r in df_filt.iterrows():
-            geom = project_geometry(r["geometry"])
-            if geom and not geom.is_empty:
-                areas.append(geom.area)
-        mean_area = float(sum(areas) / len(areas))
-        count = len(areas)
     return {
         "level": level,
         "name": name,
-        "mean_area_m2": mean_area,
+        "mean_area_m2": stats["mean"],
         "unit": "m²",
-        "count": count,
+        "count": stats["count"],
     }
 
 
@@ -280,38 +1114,62 @@ async def get_average_area(
 async def get_average_area_grouped(
     level: str = Query(..., regex="^(Freguesia|Concelho|Distrito)$"),
     name: str = Query(...),
+    session: Dataset = Depends(dataset_session),
 ):
     """
     Calcula a área média considerando propriedades adjacentes do mesmo proprietário como uma única unidade.
     """
-    global df_properties
-    if df_properties is None:
+    if session.store is None:
         raise HTTPException(400, "Dados não carregados.")
-    df_filt = df_properties[df_properties[level] == name]
-    # Usa Shape_Area agrupada se disponível
-    if "Shape_Area" in df_filt.columns:
-        series = df_filt.groupby("OWNER")["Shape_Area"].sum()
-        areas = series.tolist()
-    else:
-        # Fallback: projeta geometrias e une por OWNER
-        from shapely.ops import unary_union
-
-        areas = []
-        for owner, group in df_filt.groupby("OWNER"):
-            geoms = [project_geometry(w) for w in group["geometry"].dropna()]
-            merged = unary_union([g for g in geoms if g and not g.is_empty])
-            if hasattr(merged, "geoms"):
-                polys = list(merged.geoms)
-            else:
-                polys = [merged]
-            areas.extend([p.area for p in polys])
-    mean_area = float(sum(areas) / len(areas))
+    # Componentes de parcelas contíguas do mesmo dono, calculadas por nível e em cache
+    stats = await run_in_threadpool(
+        session.area_cache.grouped_stats, level, name, dataset_contacts(session)
+    )
+    if stats is None or stats["count"] == 0:
+        raise HTTPException(
+            404, f"Nenhuma propriedade encontrada para {level}='{name}'."
+        )
     return {
         "level": level,
         "name": name,
-        "mean_area_m2": mean_area,
+        "mean_area_m2": stats["mean"],
         "unit": "m²",
-        "count": len(areas),
+        "count": stats["count"],
+    }
+
+
+@app.get("/average_area/all")
+async def get_average_area_all(
+    level: str = Query(..., pattern="^(Freguesia|Concelho|Distrito)$"),
+    grouped: bool = Query(False, description="Agrupa parcelas contíguas do mesmo dono"),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Retorna, numa única resposta, a área média de todos os nomes de um nível
+    (simples ou agrupada por componentes), a partir da cache de agregados.
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    if level not in session.store.df.columns:
+        raise HTTPException(400, f"Coluna '{level}' não existe.")
+    area_cache = session.area_cache
+    if grouped:
+        await run_in_threadpool(
+            area_cache.precompute_grouped, level, dataset_contacts(session)
+        )
+        table = area_cache.grouped[level]
+    else:
+        area_cache.precompute([level])
+        table = area_cache.simple[level]
+    return {
+        "level": level,
+        "grouped": grouped,
+        "unit": "m²",
+        "areas": [
+            {"name": str(name), "mean_area_m2": stats["mean"], "count": stats["count"]}
+            for name, stats in table.items()
+            if stats["count"] > 0
+        ],
     }
 
 
@@ -328,6 +1186,7 @@ PESOS_SIMILARIDADE = {
     "Distancia_Vias": 0.15,
     "Distancia_Urbana": 0.15,
 }
+SIMILAR_CANDIDATES = 20  # Parcelas parecidas por parcela no modo "similar" das trocas
 
 
 def calcular_similaridade(prop1, prop2, caracteristicas, pesos):
@@ -353,51 +1212,253 @@ def calcular_similaridade(prop1, prop2, caracteristicas, pesos):
     return score / total_peso if total_peso > 0 else 0
 
 
+def trade_subset(session, level: str, name: str):
+    """
+    Linhas e sub-DataFrame das propriedades da área dada, validados para as trocas
+    (dados carregados, pelo menos dois proprietários e coluna Shape_Area).
+    """
+    if session.store is None:
+        raise HTTPException(400, "Dados não carregados.")
+    rows = session.store.rows(level, name)
+    df = session.store.df.iloc[rows]
+    if df["OWNER"].nunique() < 2:
+        raise HTTPException(404, "Menos de dois proprietários.")
+    if "Shape_Area" not in df.columns:
+        raise HTTPException(400, "Coluna 'Shape_Area' não existe.")
+    return rows, df
+
+
 @app.get("/suggest_trades")
 async def suggest_trades(
     level: str = Query(..., regex="^(Freguesia|Concelho|Distrito)$"),
     name: str = Query(...),
     top: int = Query(5, ge=1),
+    mode: str = Query(
+        "all",
+        pattern="^(all|neighbourhood|similar)$",
+        description="all: todos os pares; neighbourhood: só parcelas vizinhas; "
+        "similar: só as parcelas mais parecidas",
+    ),
+    radius: float = Query(
+        0.0, ge=0, description="Distância máxima (m) de vizinhança no modo neighbourhood"
+    ),
+    candidates: int = Query(
+        SIMILAR_CANDIDATES,
+        ge=1,
+        le=1000,
+        description="Parcelas mais parecidas consideradas por parcela no modo similar",
+    ),
+    session: Dataset = Depends(dataset_session),
 ):
     """
     Gera as melhores sugestões de trocas entre propriedades para maximizar área média e similaridade.
+    No modo "neighbourhood" só considera trocas em que a parcela recebida confina
+    (ou está a menos de `radius` metros) com outra parcela de quem a recebe.
+    No modo "similar" só considera, para cada parcela, as `candidates` parcelas
+    mais parecidas de outros proprietários (índice de similaridade).
     """
-    global df_properties
-    if df_properties is None:
-        raise HTTPException(400, "Dados não carregados.")
-    df = df_properties[df_properties[level] == name]
-    owners = {o: g.to_dict("records") for o, g in df.groupby("OWNER")}
-    if len(owners) < 2:
-        raise HTTPException(404, "Menos de dois proprietários.")
-    suggestions = []
-    for o1, o2 in combinations(owners, 2):
-        for p1 in owners[o1]:
-            for p2 in owners[o2]:
-                a1, a2 = p1["Shape_Area"], p2["Shape_Area"]
-                sum1, sum2 = len(owners[o1]), len(owners[o2])
-                # Cálculo de ganho de área média
-                new_avg1 = (sum(p["Shape_Area"] for p in owners[o1]) - a1 + a2) / sum1
-                new_avg2 = (sum(p["Shape_Area"] for p in owners[o2]) - a2 + a1) / sum2
-                old_avg1 = sum(p["Shape_Area"] for p in owners[o1]) / sum1
-                old_avg2 = sum(p["Shape_Area"] for p in owners[o2]) / sum2
-                delta_avg_total = (new_avg1 + new_avg2) - (old_avg1 + old_avg2)
-                area_diff = abs(a1 - a2)
-                potencia = delta_avg_total / (area_diff + 1e-6)
-                sim = calcular_similaridade(
-                    p1, p2, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE
-                )
-                score = potencia * (1 + sim)
-                suggestions.append(
-                    {
-                        "owner1": o1,
-                        "prop1": p1["OBJECTID"],
-                        "area1": a1,
-                        "owner2": o2,
-                        "prop2": p2["OBJECTID"],
-                        "area2": a2,
-                        "delta_avg_total": delta_avg_total,
-                        "potential_score": score,
-                    }
-                )
-    best = sorted(suggestions, key=lambda x: x["potential_score"], reverse=True)[:top]
+    rows, df = trade_subset(session, level, name)
+    contacts = pairs = None
+    if mode == "neighbourhood":
+        contacts = await run_in_threadpool(
+            area_contacts, session.store, session.graph, rows, radius
+        )
+    elif mode == "similar":
+        pairs = await run_in_threadpool(similar_pairs, session, rows, candidates)
+    # Pontuação vetorizada em blocos, mantendo apenas as melhores sugestões
+    best = await run_in_threadpool(
+        suggest_trades_vectorized,
+        df,
+        top,
+        CARACTERISTICAS_SIMILARIDADE,
+        PESOS_SIMILARIDADE,
+        contacts,
+        pairs,
+    )
     return {"level": level, "name": name, "suggestions": best}
+
+
+def consolidation_payload(
+    dataset: str,
+    level: str,
+    name: str,
+    mode: str = "all",
+    radius: float = 0.0,
+    candidates: int = SIMILAR_CANDIDATES,
+    time_budget: float = 1.0,
+    min_similarity: float = 0.0,
+    limit: int = 100,
+    seed: int = 0,
+    job=None,
+):
+    """
+    Plano de emparcelamento da área `level` = `name`: conjunto de trocas sem parcelas repetidas
+    com o maior ganho total de área média (ver optimizer.py). As trocas candidatas são
+    as de maior ganho de cada parcela, partindo do guloso sobre todas as trocas (modo
+    "all"), as de parcelas vizinhas ("neighbourhood") ou as de parcelas parecidas ("similar").
+    Retorna o resumo, o registo do progresso e as `limit` trocas de maior ganho.
+    Se `job` for dado, regista a etapa e o objetivo na tarefa. Bloqueante.
+    """
+    with datasets.use(dataset) as session:
+        store, graph = session.store, session.graph
+        index = get_similarity_index(session) if mode == "similar" else None
+    if store is None:
+        raise ValueError("Dados não carregados.")
+    rows = store.rows(level, name)
+    df = store.df.iloc[rows]
+    if job:
+        job.set_stage("candidates", total_parcels=len(df))
+    scorer = TradeScorer(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    initial = None
+    if mode == "neighbourhood":
+        i, j = scorer.neighbourhood_pairs(*area_contacts(store, graph, rows, radius))
+    elif mode == "similar":
+        owner_codes, _ = store.group_codes("OWNER")
+        i, j = scorer.row_pairs(*index.pairs(rows, candidates, owner_codes[rows]))
+    else:
+        initial = class_greedy_pairs(scorer)
+        i, j = best_gain_pairs(scorer)
+
+    def progress(point):
+        job.set_stage("annealing", **point)
+
+    (i, j, delta, score, sim), summary = optimize_trades(
+        scorer,
+        i,
+        j,
+        initial,
+        time_budget,
+        min_similarity,
+        seed=seed,
+        progress=progress if job else None,
+    )
+    total = int(len(i))
+    i, j, delta, score, sim = i[:limit], j[:limit], delta[:limit], score[:limit], sim[:limit]
+    trades = trade_records(df, scorer.order[i], scorer.order[j], delta, score)
+    for trade, value in zip(trades, sim.tolist()):
+        trade["similarity"] = value
+    return {
+        "level": level,
+        "name": name,
+        "mode": mode,
+        "parcels": len(df),
+        "trades_total": total,
+        "parcels_traded": 2 * total,
+        **summary,
+        "trades": trades,
+    }
+
+
+@app.post("/consolidation")
+async def consolidation(
+    level: str = Query(..., pattern="^(Freguesia|Concelho|Distrito)$"),
+    name: str = Query(...),
+    mode: str = Query(
+        "all",
+        pattern="^(all|neighbourhood|similar)$",
+        description="Trocas candidatas: all (maior ganho), neighbourhood (vizinhas) ou similar",
+    ),
+    radius: float = Query(
+        0.0, ge=0, description="Distância máxima (m) de vizinhança no modo neighbourhood"
+    ),
+    candidates: int = Query(
+        SIMILAR_CANDIDATES, ge=1, le=1000, description="Parcelas parecidas por parcela (modo similar)"
+    ),
+    time_budget: float = Query(1.0, ge=0, le=600, description="Segundos de recozimento simulado"),
+    min_similarity: float = Query(0.0, ge=0, le=1, description="Similaridade mínima das trocas"),
+    limit: int = Query(100, ge=0, description="Trocas devolvidas (as de maior ganho)"),
+    seed: int = Query(0, description="Semente do recozimento simulado"),
+    background: bool = Query(False, description="Executa como tarefa (GET /jobs/{id})"),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Otimiza um plano de emparcelamento para a área dada: um conjunto de trocas em que
+    cada parcela muda de dono no máximo uma vez, com o maior ganho total de área média,
+    dentro do orçamento de tempo. A resposta inclui o objetivo inicial (guloso), o final
+    e a evolução do objetivo ao longo do recozimento. Com background=true a otimização
+    corre como tarefa e o progresso é consultado em GET /jobs/{id}.
+    """
+    trade_subset(session, level, name)
+    params = {
+        "level": level,
+        "name": name,
+        "mode": mode,
+        "radius": radius,
+        "candidates": candidates,
+        "time_budget": time_budget,
+        "min_similarity": min_similarity,
+        "limit": limit,
+        "seed": seed,
+    }
+    args = (session.name,)
+    if background:
+        # A versão dos dados faz parte da chave: pedidos iguais sobre os mesmos dados
+        # reutilizam a tarefa
+        key = content_key("consolidation", str(session.version), **params)
+        job, reused = job_manager.submit("consolidation", key, consolidation_payload, *args, **params)
+        return JSONResponse(
+            content={"job_id": job.id, "status": job.status, "reused": reused}, status_code=202
+        )
+    return await run_in_threadpool(consolidation_payload, *args, **params)
+
+
+def similar_pairs(session, rows, k: int):
+    """
+    Pares (locais a `rows`) de cada parcela com as `k` mais parecidas de outros donos.
+    """
+    owner_codes, _ = session.store.group_codes("OWNER")
+    return get_similarity_index(session).pairs(rows, k, owner_codes[rows])
+
+
+@app.get("/similar/{objectid}")
+async def similar_properties(
+    objectid: str,
+    k: int = Query(10, ge=1, le=1000, description="Número de parcelas devolvidas"),
+    owner: Optional[str] = Query(None, description="Só parcelas deste proprietário"),
+    other_owners: bool = Query(False, description="Exclui as parcelas do mesmo dono"),
+    level: Optional[str] = Query(None, pattern="^(Freguesia|Concelho|Distrito)$"),
+    name: Optional[str] = Query(None, description="Nome da área (com level)"),
+    session: Dataset = Depends(dataset_session),
+):
+    """
+    Retorna as `k` propriedades mais parecidas com a dada (características e pesos de
+    similaridade), opcionalmente restritas a um proprietário, a outros proprietários
+    ou a uma área. Usa o índice de similaridade construído uma vez por dataset.
+    """
+    store = session.store
+    if store is None:
+        raise HTTPException(400, "Dados de propriedades não carregados.")
+    pos = store.position(objectid)
+    if pos is None:
+        raise HTTPException(404, f"Propriedade com ID {objectid} não encontrada.")
+    if (level is None) != (name is None):
+        raise HTTPException(400, "'level' e 'name' devem ser dados em conjunto.")
+    allowed = np.ones(len(store), dtype=bool)
+    if owner is not None:
+        allowed[:] = False
+        allowed[store.rows("OWNER", owner)] = True
+    if other_owners:
+        owner_codes, _ = store.group_codes("OWNER")
+        allowed &= owner_codes != owner_codes[pos]
+    if level is not None:
+        in_area = np.zeros(len(store), dtype=bool)
+        in_area[store.rows(level, name)] = True
+        allowed &= in_area
+    index = await run_in_threadpool(get_similarity_index, session)
+    found, sim = await run_in_threadpool(index.similar, pos, k, allowed)
+    owners = store.df["OWNER"].to_numpy()[found]
+    return {
+        "id": objectid,
+        "similar": [
+            {
+                "id": pid,
+                "owner": str(o) if pd.notna(o) else None,
+                "similarity": value,
+            }
+            for pid, o, value in zip(store.ids[found].tolist(), owners.tolist(), sim.tolist())
+        ],
+    }
+
+
+# Tempo de importação deste módulo (inclui FastAPI, pandas e os módulos do projeto)
+startup_timings["import_s"] = time.perf_counter() - IMPORT_STARTED
@@ -0,0 +1,171 @@
+# Resumo:
+# Índice de similaridade entre parcelas ("parcelas mais parecidas com esta").
+# A similaridade de calcular_similaridade compara cada característica numérica pela
+# diferença relativa |v1 - v2| / max(|v1|, |v2|, 1), que só depende da diferença dos
+# logaritmos dos valores. Por isso cada parcela é representada por um vetor com
+# peso * sinal(v) * log(max(|v|, 1)) por característica, indexado numa cKDTree
+# (distância L1) construída uma vez por dataset. Uma parcela sem alguma característica
+# é consultada numa árvore só das dimensões que tem (a similaridade ignora as restantes).
+# 1. A árvore devolve os candidatos mais próximos em O(log n) e estes são reordenados
+#    pela similaridade exata (weighted_similarity, a mesma das sugestões de trocas).
+#    A soma ponderada das diferenças relativas não ordena as parcelas exatamente como a
+#    distância L1 dos logaritmos, por isso os resultados são aproximados: pedem-se à
+#    árvore OVERSAMPLE vezes mais candidatos do que resultados (pelo menos
+#    MIN_CANDIDATES a mais), mas uma parcela fora desses candidatos pode ficar de fora.
+# 2. Restrições (outro proprietário, área) são aplicadas aos candidatos; se restarem
+#    poucas parcelas permitidas (até BRUTE_FORCE_MAX), são todas pontuadas e o
+#    resultado é exato.
+# 3. pairs() dá, para cada parcela de um subconjunto, as k mais parecidas de outros
+#    proprietários, usadas para podar os candidatos de /suggest_trades. A árvore de
+#    cada subconjunto (área) fica guardada no índice, para as AREA_TREES mais usadas.
+
+import threading  # Acesso concorrente à cache de árvores das áreas
+from collections import OrderedDict  # Árvores das áreas por ordem de uso (LRU)
+import numpy as np  # Operações vetorizadas sobre arrays
+import pandas as pd  # Manipulação de dados em DataFrame
+from trades import feature_arrays, weighted_similarity  # Similaridade ponderada exata
+from metrics import stage  # Temporizadores por etapa
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+spatial = lazy_import("scipy.spatial")  # cKDTree: pesquisa de vizinhos mais próximos
+
+OVERSAMPLE = 8  # Candidatos pedidos à árvore por resultado (reordenados depois)
+MIN_CANDIDATES = 32  # Número mínimo de candidatos pedidos à árvore
+BRUTE_FORCE_MAX = 4096  # Até este número de parcelas permitidas, pontua todas
+AREA_TREES = 16  # Árvores de subconjuntos (áreas) guardadas por índice
+
+
+def feature_vectors(features):
+    """
+    Vetores (n, d) das características numéricas com peso > 0, na escala
+    peso * sinal(v) * log(max(|v|, 1)), e máscara (n, d) dos valores presentes.
+    Os valores em falta ficam com a mediana da característica.
+    """
+    columns, masks = [], []
+    for peso, present, is_num, num, _, _ in features:
+        numeric = present & is_num
+        if peso <= 0 or not numeric.any():
+            continue
+        values = np.where(numeric, num, 0.0)
+        scaled = np.sign(values) * np.log(np.maximum(np.abs(values), 1.0))
+        scaled[~numeric] = np.median(scaled[numeric])
+        columns.append(peso * scaled)
+        masks.append(numeric)
+    if not columns:
+        n = len(features[0][1]) if features else 0
+        return np.zeros((n, 0)), np.zeros((n, 0), dtype=bool)
+    return np.column_stack(columns), np.column_stack(masks)
+
+
+class SimilarityIndex:
+    """
+    Índice das parcelas de um DataFrame pelas características de similaridade.
+    As posições usadas (e devolvidas) são as linhas do DataFrame.
+    """
+
+    def __init__(self, df: pd.DataFrame, caracteristicas, pesos):
+        with stage("similarity_index"):
+            self.features = feature_arrays(df, caracteristicas, pesos)
+            self.vectors, self.present = feature_vectors(self.features)
+            self.tree = spatial.cKDTree(self.vectors) if self.vectors.shape[1] else None
+        self.n = len(df)
+        self.partial_trees = {}  # {dimensões presentes: cKDTree só dessas dimensões}
+        self.area_trees = OrderedDict()  # {linhas do subconjunto: cKDTree dessas linhas}
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return self.n
+
+    def _query_tree(self, pos: int):
+        """
+        Árvore e ponto de consulta da parcela `pos`. Se lhe faltarem características,
+        a similaridade ignora-as: usa uma árvore (criada no primeiro uso) só das
+        dimensões que a parcela tem.
+        """
+        dims = np.flatnonzero(self.present[pos])
+        if len(dims) in (0, self.vectors.shape[1]):
+            return self.tree, self.vectors[pos]
+        key = tuple(dims.tolist())
+        if key not in self.partial_trees:
+            self.partial_trees[key] = spatial.cKDTree(self.vectors[:, dims])
+        return self.partial_trees[key], self.vectors[pos, dims]
+
+    def _area_tree(self, rows):
+        """
+        cKDTree dos vetores das linhas dadas (ex: as parcelas de uma Freguesia),
+        criada no primeiro uso e guardada para as AREA_TREES áreas usadas mais recentemente.
+        """
+        key = rows.tobytes()
+        with self.lock:
+            tree = self.area_trees.get(key)
+            if tree is not None:
+                self.area_trees.move_to_end(key)
+                return tree
+        with stage("similarity_area_tree"):
+            tree = spatial.cKDTree(self.vectors[rows])
+        with self.lock:
+            self.area_trees[key] = tree
+            while len(self.area_trees) > AREA_TREES:
+                self.area_trees.popitem(last=False)
+        return tree
+
+    def similar(self, pos: int, k: int, allowed=None):
+        """
+        As `k` parcelas mais parecidas com a da linha `pos` (excluindo-a), por
+        similaridade decrescente e, em empate, por linha. `allowed` (máscara booleana)
+        restringe as parcelas consideradas. Retorna (linhas, similaridades).
+        Acima de BRUTE_FORCE_MAX parcelas permitidas o resultado é aproximado
+        (só os candidatos da árvore são pontuados).
+        """
+        if allowed is None:
+            allowed = np.ones(self.n, dtype=bool)
+        allowed = allowed.copy()
+        allowed[pos] = False
+        total = int(allowed.sum())
+        if self.tree is None or total <= BRUTE_FORCE_MAX:
+            candidates = np.flatnonzero(allowed)
+        else:
+            wanted = max(k * OVERSAMPLE, k + MIN_CANDIDATES)
+            kk = wanted
+            tree, point = self._query_tree(pos)
+            while True:
+                _, idx = tree.query(point, k=min(kk, self.n), p=1)
+                idx = np.atleast_1d(idx)
+                candidates = idx[allowed[idx]]
+                if len(candidates) >= wanted or kk >= self.n:
+                    break
+                # Poucas parcelas permitidas entre as mais próximas: alarga a pesquisa
+                kk *= 4
+        sim = weighted_similarity(self.features, pos, candidates)
+        order = np.lexsort((candidates, -sim))[:k]
+        return candidates[order], sim[order]
+
+    def pairs(self, rows, k: int, owners):
+        """
+        Para cada linha de `rows`, as `k` linhas de `rows` mais parecidas de outros
+        proprietários (`owners`: código do dono de cada linha de `rows`), escolhidas
+        entre os candidatos da árvore (aproximadas, como em similar).
+        Retorna os pares (left, right) em posições locais (0..len(rows)-1).
+        """
+        rows = np.asarray(rows, dtype=np.int64)
+        owners = np.asarray(owners)
+        m = len(rows)
+        empty = np.empty(0, dtype=np.int64)
+        if m < 2 or k <= 0:
+            return empty, empty
+        kk = min(m, max(k * OVERSAMPLE, k + MIN_CANDIDATES) + 1)
+        if self.tree is None or kk == m:
+            # Subconjunto pequeno: todos os pares são candidatos
+            idx = np.broadcast_to(np.arange(m), (m, m))
+        else:
+            _, idx = self._area_tree(rows).query(self.vectors[rows], k=kk, p=1)
+        local = np.arange(m)[:, None]
+        valid = (idx != local) & (owners[idx] != owners[local])
+        sim = weighted_similarity(self.features, rows[local], rows[idx])
+        sim = np.where(valid, sim, -np.inf)
+        # As k melhores de cada linha (pares inválidos ficam no fim e são descartados)
+        best = np.argsort(-sim, axis=1, kind="stable")[:, :k]
+        left = np.repeat(np.arange(m), best.shape[1])
+        right = np.take_along_axis(idx, best, axis=1).ravel()
+        keep = np.take_along_axis(valid, best, axis=1).ravel()
+        return left[keep], right[keep]
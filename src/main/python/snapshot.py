@@ -0,0 +1,92 @@
+# Resumo:
+# Snapshot colunar em disco do estado carregado, para arranques rápidos.
+# Um snapshot é uma diretoria com:
+# 1. properties.parquet: o DataFrame das propriedades.
+# 2. geometry_offsets.npy + geometry_wkb.npy: geometrias projetadas em WKB
+#    (bytes concatenados e offsets, legíveis por memory-mapping).
+# 3. graph_indptr.npy + graph_indices.npy: grafo de adjacência em formato CSR
+#    (ver graph.py), indexado pelas posições das linhas.
+# 4. meta.json: versão do formato e contagens, para validação.
+
+import json  # Metadados do snapshot
+import os  # Caminhos de ficheiros
+import shutil  # Substituição atómica de diretorias
+import numpy as np  # Arrays colunares e memory-mapping
+import pandas as pd  # Leitura/escrita Parquet
+from store import PropertyStore  # Armazenamento indexado das propriedades
+from graph import AdjacencyGraph  # Grafo de adjacência em CSR
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+SNAPSHOT_VERSION = 1
+PROPERTIES_FILE = "properties.parquet"
+META_FILE = "meta.json"
+
+shapely = lazy_import("shapely")  # Serialização WKB vetorizada
+
+
+def save_snapshot(directory: str, store, graph=None):
+    """
+    Guarda o armazenamento e o grafo (AdjacencyGraph ou None) na diretoria dada.
+    Escreve primeiro numa diretoria temporária e só depois substitui a anterior,
+    para que um snapshot incompleto nunca seja lido.
+    """
+    tmp = directory.rstrip(os.sep) + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    store.df.to_parquet(os.path.join(tmp, PROPERTIES_FILE), index=False)
+    # Geometrias em WKB: bytes concatenados + offsets (geometria em falta = 0 bytes)
+    wkb = shapely.to_wkb(store.geometries)
+    lengths = np.fromiter((len(b) if b is not None else 0 for b in wkb), dtype=np.int64, count=len(wkb))
+    offsets = np.zeros(len(wkb) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=offsets[1:])
+    data = np.frombuffer(b"".join(b for b in wkb if b is not None), dtype=np.uint8)
+    np.save(os.path.join(tmp, "geometry_offsets.npy"), offsets)
+    np.save(os.path.join(tmp, "geometry_wkb.npy"), data)
+    if graph is None:
+        graph = AdjacencyGraph.empty(len(store))
+    graph.save(tmp)
+    meta = {"version": SNAPSHOT_VERSION, "rows": len(store), "edges": graph.num_edges}
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f)
+    # Troca a diretoria antiga pela nova
+    old = directory.rstrip(os.sep) + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, old)
+    os.rename(tmp, directory)
+    shutil.rmtree(old, ignore_errors=True)
+    return meta
+
+
+def snapshot_exists(directory: str) -> bool:
+    """
+    Indica se existe um snapshot completo na diretoria dada.
+    """
+    return os.path.isfile(os.path.join(directory, META_FILE))
+
+
+def load_snapshot(directory: str, mmap: bool = True):
+    """
+    Restaura (PropertyStore, AdjacencyGraph) de um snapshot.
+    Com mmap=True os arrays são lidos por memory-mapping em vez de copiados para memória.
+    Lança ValueError se o snapshot for de outra versão ou estiver inconsistente.
+    """
+    with open(os.path.join(directory, META_FILE)) as f:
+        meta = json.load(f)
+    if meta.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Versão de snapshot não suportada: {meta.get('version')}")
+    mmap_mode = "r" if mmap else None
+    df = pd.read_parquet(os.path.join(directory, PROPERTIES_FILE), memory_map=mmap)
+    offsets = np.load(os.path.join(directory, "geometry_offsets.npy"), mmap_mode=mmap_mode)
+    data = np.load(os.path.join(directory, "geometry_wkb.npy"), mmap_mode=mmap_mode)
+    if len(df) != meta["rows"] or len(offsets) != len(df) + 1:
+        raise ValueError("Snapshot inconsistente: número de linhas diferente.")
+    wkb = np.empty(len(df), dtype=object)
+    for k in range(len(df)):
+        start, end = offsets[k], offsets[k + 1]
+        wkb[k] = data[start:end].tobytes() if end > start else None
+    store = PropertyStore(df, shapely.from_wkb(wkb))
+    graph = AdjacencyGraph.load(directory, mmap=mmap)
+    if len(graph) != len(df):
+        raise ValueError("Snapshot inconsistente: grafo com número de nós diferente.")
+    return store, graph
@@ -0,0 +1,165 @@
+# Resumo:
+# Armazenamento indexado em memória das propriedades carregadas.
+# Mantém o DataFrame original acompanhado de:
+# 1. Índice hash OBJECTID -> posição da linha (consulta O(1)).
+# 2. Colunas Freguesia/Concelho/Distrito/OWNER codificadas como categorias,
+#    com os índices de linhas de cada grupo pré-calculados.
+# 3. Array das geometrias projetadas (calculado uma única vez, sob pedido)
+#    e a STRtree sobre elas, para consultas por área (bounding box).
+
+import numpy as np  # Arrays de índices e códigos
+import pandas as pd  # Manipulação de dados em DataFrame
+from projection import project_geometries_cached  # Re-projeção com cache LRU
+from lazy import lazy_import  # Importação no primeiro uso (arranque rápido)
+
+# Colunas com índice de grupos pré-calculado
+GROUP_COLUMNS = ["Freguesia", "Concelho", "Distrito", "OWNER"]
+PROJECT_BLOCK = 50_000  # Linhas projetadas por bloco
+
+shapely = lazy_import("shapely")  # Índice espacial das geometrias projetadas
+
+
+class PropertyStore:
+    """
+    Propriedades carregadas de um CSV, com índices para consultas rápidas.
+    As posições devolvidas referem-se às linhas de `df` (índice 0..n-1).
+    """
+
+    def __init__(self, df: pd.DataFrame, geometries=None):
+        self.df = df.reset_index(drop=True)
+        self.ids = self.df["OBJECTID"].astype(str).to_numpy()
+        # Índice OBJECTID -> posição; em duplicados prevalece a primeira ocorrência
+        n = len(self.ids)
+        self.id_index = dict(zip(self.ids[::-1].tolist(), range(n - 1, -1, -1)))
+        # Codificação categórica e índices de grupo: {coluna: {valor: posições}}
+        self.codes = {}
+        self.categories = {}
+        self.group_index = {}
+        for col in GROUP_COLUMNS:
+            if col in self.df.columns:
+                self._index_column(col)
+        # Geometrias já projetadas (ex: restauradas de um snapshot) ou None
+        self._geometries = geometries
+        self._tree = None  # STRtree das geometrias, criada no primeiro uso
+
+    @classmethod
+    def from_chunks(cls, chunks):
+        """
+        Constrói o armazenamento a partir de um iterador de DataFrames (parsing em blocos).
+        As geometrias de cada bloco são projetadas à medida que o bloco chega.
+        """
+        frames, geoms = [], []
+        for chunk in chunks:
+            frames.append(chunk)
+            if "geometry" in chunk.columns and "OBJECTID" in chunk.columns:
+                geoms.append(
+                    project_geometries_cached(
+                        chunk["OBJECTID"].to_numpy(), chunk["geometry"].to_numpy()
+                    )
+                )
+        complete = geoms and len(geoms) == len(frames)
+        return cls(
+            pd.concat(frames, ignore_index=True),
+            np.concatenate(geoms) if complete else None,
+        )
+
+    def _index_column(self, col: str):
+        """
+        Codifica a coluna como categorias (-1 para valores em falta) e guarda,
+        para cada valor, as posições das linhas por ordem crescente.
+        """
+        codes, uniques = pd.factorize(self.df[col])
+        order = np.argsort(codes, kind="stable")
+        bounds = np.searchsorted(codes[order], np.arange(len(uniques) + 1))
+        self.codes[col] = codes
+        self.categories[col] = uniques
+        self.group_index[col] = {
+            value: order[bounds[k] : bounds[k + 1]] for k, value in enumerate(uniques)
+        }
+
+    def __len__(self):
+        return len(self.df)
+
+    def position(self, objectid: str):
+        """
+        Retorna a posição da propriedade com o OBJECTID dado, ou None se não existir.
+        """
+        return self.id_index.get(str(objectid))
+
+    def value(self, pos: int, col: str):
+        """
+        Retorna o valor da coluna na linha dada, ou None se a coluna não existir.
+        """
+        if col not in self.df.columns:
+            return None
+        return self.df[col].iat[pos]
+
+    def rows(self, level: str, name: str):
+        """
+        Retorna as posições das linhas com df[level] == name (array vazio se não houver).
+        """
+        if level not in self.df.columns:
+            return np.empty(0, dtype=np.intp)
+        if level not in self.group_index:
+            self._index_column(level)
+        return self.group_index[level].get(name, np.empty(0, dtype=np.intp))
+
+    def group_codes(self, level: str):
+        """
+        Retorna (códigos por linha, categorias) da coluna, criando o índice se necessário.
+        """
+        if level not in self.codes:
+            self._index_column(level)
+        return self.codes[level], self.categories[level]
+
+    def subset(self, level: str, name: str) -> pd.DataFrame:
+        """
+        Retorna o sub-DataFrame das propriedades com df[level] == name.
+        """
+        return self.df.iloc[self.rows(level, name)]
+
+    @property
+    def geometries(self):
+        """
+        Array das geometrias projetadas (None onde o WKT é inválido ou está em falta).
+        """
+        if self._geometries is None:
+            self.project()
+        return self._geometries
+
+    def project(self, progress=None, block_rows: int = PROJECT_BLOCK):
+        """
+        Projeta as geometrias (se ainda não o foram) em blocos de `block_rows` linhas,
+        chamando progress(parcels_projected=...) após cada bloco, se dado.
+        """
+        if self._geometries is None:
+            wkts = self.df["geometry"].to_numpy()
+            blocks = []
+            for b0 in range(0, len(wkts), block_rows):
+                blocks.append(
+                    project_geometries_cached(
+                        self.ids[b0 : b0 + block_rows], wkts[b0 : b0 + block_rows]
+                    )
+                )
+                if progress is not None:
+                    progress(parcels_projected=len(blocks[-1]))
+            self._geometries = (
+                np.concatenate(blocks) if blocks else np.empty(0, dtype=object)
+            )
+        return self._geometries
+
+    @property
+    def tree(self):
+        """
+        STRtree sobre as geometrias projetadas (os índices são posições das linhas).
+        """
+        if self._tree is None:
+            self._tree = shapely.STRtree(self.geometries)
+        return self._tree
+
+    def query_area(self, area):
+        """
+        Retorna, por ordem crescente, as posições das linhas cuja geometria projetada
+        interseta a geometria `area` (no CRS projetado).
+        """
+        return np.sort(self.tree.query(area, predicate="intersects"))
@@ -0,0 +1,287 @@
+# Resumo:
+# Motor vetorizado de sugestões de trocas de propriedades.
+# Reproduz exatamente a pontuação do ciclo original de /suggest_trades
+# (ganho de área média, diferença de áreas e similaridade ponderada), mas:
+# 1. As somas de área por proprietário são calculadas uma única vez.
+# 2. Os pares de parcelas são pontuados em blocos de matrizes NumPy (memória limitada).
+# 3. Em cada bloco só os melhores candidatos são mantidos (np.partition),
+#    em vez de guardar e ordenar todas as sugestões.
+# No modo "neighbourhood" só são pontuadas as trocas em que a parcela recebida
+# confina (ou está a uma distância máxima) com outra parcela de quem a recebe;
+# no modo "similar" só os pares dados pelo índice de similaridade (similarity.py).
+
+import numpy as np  # Operações vetorizadas sobre arrays
+import pandas as pd  # Manipulação de dados em DataFrame
+from metrics import count, stage  # Temporizadores e contadores
+
+BLOCK_ELEMS = 1_000_000  # Número máximo de pares pontuados por bloco
+
+
+def feature_arrays(df: pd.DataFrame, caracteristicas, pesos):
+    """
+    Prepara, para cada característica presente no DataFrame, os arrays usados
+    na similaridade: (peso, presente, numérico, valor numérico, textual, código do texto).
+    Segue as regras de calcular_similaridade: números comparados pela diferença
+    relativa e textos pela igualdade sem distinguir maiúsculas.
+    """
+    features = []
+    for carac in caracteristicas:
+        if carac not in df.columns:
+            continue
+        values = df[carac].tolist()
+        n = len(values)
+        present = df[carac].notna().to_numpy()
+        is_num = np.fromiter(
+            (isinstance(v, (int, float)) for v in values), dtype=bool, count=n
+        )
+        is_str = np.fromiter((isinstance(v, str) for v in values), dtype=bool, count=n)
+        num = np.array([float(v) if k else np.nan for v, k in zip(values, is_num)])
+        lowered = [v.lower() if k else None for v, k in zip(values, is_str)]
+        codes = pd.factorize(pd.Series(lowered, dtype=object))[0]
+        features.append((pesos.get(carac, 0), present, is_num, num, is_str, codes))
+    return features
+
+
+def weighted_similarity(features, i, j):
+    """
+    Similaridade ponderada entre as parcelas i e j (arrays com broadcasting) a partir
+    dos arrays de feature_arrays, com o mesmo resultado numérico de calcular_similaridade.
+    """
+    shape = np.broadcast(i, j).shape
+    score = np.zeros(shape)
+    total_peso = np.zeros(shape)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        for peso, present, is_num, num, is_str, codes in features:
+            both = present[i] & present[j]
+            total_peso = total_peso + np.where(both, peso, 0.0)
+            v1, v2 = num[i], num[j]
+            diff = np.abs(v1 - v2) / np.maximum(np.maximum(np.abs(v1), np.abs(v2)), 1)
+            numeric = both & is_num[i] & is_num[j]
+            score = score + np.where(numeric, peso * (1 - diff), 0.0)
+            same_text = both & is_str[i] & is_str[j] & (codes[i] == codes[j])
+            score = score + np.where(same_text, peso * 1, 0.0)
+        return np.where(total_peso > 0, score / total_peso, 0.0)
+
+
+class TradeScorer:
+    """
+    Pontua trocas entre pares de parcelas de proprietários diferentes.
+    As parcelas são reordenadas por proprietário (ordem do groupby) e as somas
+    de área de cada proprietário são calculadas uma vez na construção.
+    """
+
+    def __init__(self, df: pd.DataFrame, caracteristicas, pesos):
+        owner_codes, self.owners = pd.factorize(df["OWNER"], sort=True)
+        # Parcelas sem proprietário ficam de fora (como no groupby)
+        valid = np.flatnonzero(owner_codes >= 0)
+        # Ordem estável por proprietário: mantém a ordem das linhas dentro de cada grupo
+        self.order = valid[np.argsort(owner_codes[valid], kind="stable")]
+        self.owner = owner_codes[self.order]
+        area_values = df["Shape_Area"].tolist()
+        area_values = [area_values[p] for p in self.order.tolist()]
+        self.area = np.array(area_values, dtype=float)
+        counts = np.bincount(self.owner, minlength=len(self.owners))
+        bounds = np.zeros(len(self.owners) + 1, dtype=np.int64)
+        np.cumsum(counts, out=bounds[1:])
+        self.owner_start = bounds[:-1]
+        self.owner_end = bounds[1:]
+        self.owner_size = counts
+        # Posição de cada linha do DataFrame na ordem por proprietário (-1 se sem dono)
+        self.position = np.full(len(df), -1, dtype=np.int64)
+        self.position[self.order] = np.arange(len(self.order))
+        # Soma de áreas por proprietário (soma sequencial, tal como sum() no ciclo original)
+        sums = [sum(area_values[bounds[k] : bounds[k + 1]]) for k in range(len(self.owners))]
+        self.owner_sum = np.array(sums, dtype=float)[self.owner]
+        self.owner_count = counts[self.owner].astype(float)
+        # Arrays das características, na mesma ordem (por proprietário) das parcelas
+        self.features = [
+            (peso,) + tuple(arr[self.order] for arr in arrays)
+            for peso, *arrays in feature_arrays(df, caracteristicas, pesos)
+        ]
+
+    def __len__(self):
+        return len(self.order)
+
+    def similarity(self, i, j):
+        """
+        Similaridade ponderada entre as parcelas i e j (ver weighted_similarity).
+        """
+        return weighted_similarity(self.features, i, j)
+
+    def score(self, i, j):
+        """
+        Pontua a troca da parcela i (do proprietário que cede i) com a parcela j.
+        Retorna (delta_avg_total, potential_score), com broadcasting entre i e j.
+        """
+        a1, a2 = self.area[i], self.area[j]
+        sum1, sum2 = self.owner_sum[i], self.owner_sum[j]
+        n1, n2 = self.owner_count[i], self.owner_count[j]
+        # Cálculo de ganho de área média
+        new_avg1 = (sum1 - a1 + a2) / n1
+        new_avg2 = (sum2 - a2 + a1) / n2
+        old_avg1 = sum1 / n1
+        old_avg2 = sum2 / n2
+        delta_avg_total = (new_avg1 + new_avg2) - (old_avg1 + old_avg2)
+        area_diff = np.abs(a1 - a2)
+        potencia = delta_avg_total / (area_diff + 1e-6)
+        return delta_avg_total, potencia * (1 + self.similarity(i, j))
+
+    def top_pairs(self, top: int, block_elems: int = BLOCK_ELEMS):
+        """
+        Retorna os `top` melhores pares (i, j, delta, score) entre parcelas de
+        proprietários diferentes, por pontuação decrescente. Empates são desfeitos
+        pela ordem do ciclo original: (dono de i, dono de j, i, j).
+        """
+        n = len(self)
+        best = [np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)]
+        block_rows = max(1, block_elems // max(n, 1))
+        for r0 in range(0, n, block_rows):
+            r1 = min(n, r0 + block_rows)
+            # Só interessam colunas de proprietários posteriores ao da primeira linha
+            c0 = int(self.owner_end[self.owner[r0]])
+            if c0 >= n:
+                break
+            rows = np.arange(r0, r1)[:, None]
+            cols = np.arange(c0, n)[None, :]
+            valid = self.owner[cols] > self.owner[rows]
+            delta, score = self.score(rows, cols)
+            valid &= ~np.isnan(score)
+            bi, bj = np.nonzero(valid)
+            count("suggestions_scored", int(len(bi)))
+            block = [bi + r0, bj + c0, delta[bi, bj], score[bi, bj]]
+            best = self._select(best, block, top)
+        return best
+
+    def neighbourhood_pairs(self, left, right):
+        """
+        Gera os pares candidatos (i, j) a partir dos contactos espaciais (left[k], right[k])
+        entre linhas do DataFrame. Uma troca i <-> j é candidata quando a parcela
+        recebida confina com outra parcela (que não a cedida) de quem a recebe.
+        Retorna pares únicos orientados como no ciclo original (dono de i < dono de j).
+        """
+        left = self.position[np.asarray(left, dtype=np.int64)]
+        right = self.position[np.asarray(right, dtype=np.int64)]
+        keep = (left >= 0) & (right >= 0)
+        # Contactos dirigidos: parcela q confina com a parcela x de outro proprietário
+        q = np.concatenate([left[keep], right[keep]])
+        x = np.concatenate([right[keep], left[keep]])
+        cross = self.owner[q] != self.owner[x]
+        q, x = q[cross], x[cross]
+        # Agrupa por (q, dono de x); se houver um único contacto, esse não pode ser cedido
+        n_owners = len(self.owners)
+        keys, first, contacts = np.unique(
+            q * n_owners + self.owner[x], return_index=True, return_counts=True
+        )
+        q_u, o_u = keys // n_owners, keys % n_owners
+        only = np.where(contacts == 1, x[first], -1)
+        # Expande cada (q, dono) para todas as parcelas desse dono
+        sizes = self.owner_size[o_u]
+        rep = np.repeat(np.arange(len(keys)), sizes)
+        offsets = np.arange(len(rep)) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+        given = self.owner_start[o_u][rep] + offsets
+        received = q_u[rep]
+        keep = given != only[rep]
+        return self._oriented(given[keep], received[keep])
+
+    def row_pairs(self, left, right):
+        """
+        Converte pares (left[k], right[k]) de linhas do DataFrame em pares candidatos
+        (i, j) de parcelas de proprietários diferentes, orientados e sem duplicados.
+        """
+        left = self.position[np.asarray(left, dtype=np.int64)]
+        right = self.position[np.asarray(right, dtype=np.int64)]
+        keep = (left >= 0) & (right >= 0)
+        left, right = left[keep], right[keep]
+        cross = self.owner[left] != self.owner[right]
+        return self._oriented(left[cross], right[cross])
+
+    def _oriented(self, a, b):
+        """
+        Orienta cada par com o proprietário de menor código primeiro e remove duplicados.
+        """
+        first_owner = self.owner[a] < self.owner[b]
+        i = np.where(first_owner, a, b)
+        j = np.where(first_owner, b, a)
+        n = max(len(self), 1)
+        pairs = np.unique(i * n + j)
+        return pairs // n, pairs % n
+
+    def top_pairs_among(self, i, j, top: int, block_elems: int = BLOCK_ELEMS):
+        """
+        Igual a top_pairs, mas pontua apenas os pares candidatos (i[k], j[k]) dados.
+        """
+        best = [np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0), np.empty(0)]
+        for k0 in range(0, len(i), block_elems):
+            bi, bj = i[k0 : k0 + block_elems], j[k0 : k0 + block_elems]
+            delta, score = self.score(bi, bj)
+            valid = ~np.isnan(score)
+            count("suggestions_scored", int(valid.sum()))
+            block = [bi[valid], bj[valid], delta[valid], score[valid]]
+            best = self._select(best, block, top)
+        return best
+
+    def _select(self, best, block, top: int):
+        """
+        Junta os candidatos do bloco aos melhores até agora e mantém os `top` primeiros.
+        """
+        i, j, delta, score = block
+        if len(score) > top:
+            # Limiar do top-N do bloco; empates no limiar são todos mantidos
+            kth = np.partition(score, len(score) - top)[len(score) - top]
+            keep = score >= kth
+            i, j, delta, score = i[keep], j[keep], delta[keep], score[keep]
+        i = np.concatenate([best[0], i])
+        j = np.concatenate([best[1], j])
+        delta = np.concatenate([best[2], delta])
+        score = np.concatenate([best[3], score])
+        order = np.lexsort((j, i, self.owner[j], self.owner[i], -score))[:top]
+        return [i[order], j[order], delta[order], score[order]]
+
+
+def suggest_trades_vectorized(
+    df: pd.DataFrame, top: int, caracteristicas, pesos, contacts=None, candidates=None
+):
+    """
+    Calcula as `top` melhores sugestões de trocas do DataFrame dado, no mesmo
+    formato (e com os mesmos valores) do ciclo original de /suggest_trades.
+    Se `contacts` = (left, right) for dado (pares de linhas do DataFrame que confinam),
+    só são consideradas as trocas do modo "neighbourhood"; se `candidates` = (left, right)
+    for dado, só são pontuados esses pares de linhas (ex: parcelas similares).
+    """
+    with stage("suggest_trades"):
+        scorer = TradeScorer(df, caracteristicas, pesos)
+        if contacts is not None:
+            i, j = scorer.neighbourhood_pairs(*contacts)
+            i, j, delta, score = scorer.top_pairs_among(i, j, top)
+        elif candidates is not None:
+            i, j = scorer.row_pairs(*candidates)
+            i, j, delta, score = scorer.top_pairs_among(i, j, top)
+        else:
+            i, j, delta, score = scorer.top_pairs(top)
+    return trade_records(df, scorer.order[i], scorer.order[j], delta, score)
+
+
+def trade_records(df: pd.DataFrame, rows1, rows2, delta, score):
+    """
+    Converte trocas (linhas do DataFrame de cada parcela, ganho e pontuação) nos
+    dicionários devolvidos por /suggest_trades.
+    """
+    owners = df["OWNER"].tolist()
+    ids = df["OBJECTID"].tolist()
+    areas = df["Shape_Area"].tolist()
+    suggestions = []
+    pairs = zip(np.asarray(rows1).tolist(), np.asarray(rows2).tolist(), delta.tolist(), score.tolist())
+    for a, b, d, s in pairs:
+        suggestions.append(
+            {
+                "owner1": owners[a],
+                "prop1": ids[a],
+                "area1": areas[a],
+                "owner2": owners[b],
+                "prop2": ids[b],
+                "area2": areas[b],
+                "delta_avg_total": d,
+                "potential_score": s,
+            }
+        )
+    return suggestions
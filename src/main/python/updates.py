@@ -0,0 +1,163 @@
+# Resumo:
+# Atualizações incrementais do dataset carregado (inserir/substituir/remover parcelas).
+# Em vez de reconstruir tudo a partir de um CSV completo:
+# 1. Só as geometrias das parcelas inseridas/substituídas são projetadas; as restantes
+#    são reaproveitadas do armazenamento atual.
+# 2. As arestas entre parcelas inalteradas são mantidas (com as posições remapeadas)
+#    e só as das parcelas alteradas são recalculadas, consultando a STRtree.
+# 3. São devolvidos os nomes de Freguesia/Concelho/Distrito afetados, para que só
+#    esses agregados sejam recalculados (ver AreaAggregates.updated).
+
+import numpy as np  # Operações vetorizadas sobre arrays
+import pandas as pd  # Manipulação de dados em DataFrame
+from store import PropertyStore  # Armazenamento indexado das propriedades
+from graph import AdjacencyGraph  # Grafo de adjacência em CSR
+from projection import project_geometries_cached  # Re-projeção com cache LRU
+from aggregates import LEVELS  # Níveis com agregados de área
+
+
+def changed_edges(tree, geoms, changed):
+    """
+    Arestas (i, j), com i < j, em que pelo menos uma das parcelas está em `changed`:
+    consulta a STRtree (de todas as geometrias) só com as geometrias alteradas.
+    """
+    changed = np.asarray(changed, dtype=np.int64)
+    if len(changed) == 0:
+        empty = np.empty(0, dtype=np.int64)
+        return empty, empty
+    local, other = tree.query(geoms[changed], predicate="intersects")
+    src = changed[local]
+    keep = src != other
+    left = np.minimum(src[keep], other[keep])
+    right = np.maximum(src[keep], other[keep])
+    # Pares entre duas parcelas alteradas aparecem duas vezes
+    n = max(len(geoms), 1)
+    keys = np.unique(left * n + right)
+    return keys // n, keys % n
+
+
+def coerce_dtypes(upserts: pd.DataFrame, dtypes: pd.Series) -> pd.DataFrame:
+    """
+    Converte as colunas de `upserts` para os tipos das colunas guardadas (`dtypes`),
+    para que o DataFrame combinado não fique com colunas de tipos mistos (ex: um
+    OBJECTID em texto numa coluna de inteiros, que o snapshot não consegue guardar).
+    Lança ValueError se um valor não puder ser convertido sem perda, incluindo valores
+    em falta numa coluna de inteiros (que passaria a float, ex: OBJECTIDs "1.0").
+    """
+    upserts = upserts.copy()
+    for col in upserts.columns.intersection(dtypes.index):
+        dtype, values = dtypes[col], upserts[col]
+        if pd.api.types.is_integer_dtype(dtype) and values.isna().any():
+            raise ValueError(f"Valores em falta na coluna de inteiros '{col}'.")
+        try:
+            if dtype == object:
+                # Colunas de texto: valores não nulos convertidos para str
+                upserts[col] = values.map(lambda v: v if pd.isna(v) else str(v))
+            elif pd.api.types.is_integer_dtype(dtype):
+                numbers = pd.to_numeric(values)
+                if (numbers % 1 != 0).any():
+                    raise ValueError(col)
+                else:
+                    upserts[col] = numbers.astype(dtype)
+            else:
+                upserts[col] = values.astype(dtype)
+        except (TypeError, ValueError):
+            raise ValueError(f"Valores inválidos na coluna '{col}' (tipo {dtype}).")
+    return upserts
+
+
+def apply_changes(store, graph, upserts: pd.DataFrame, deletes=()):
+    """
+    Aplica ao dataset as linhas de `upserts` (substituem as parcelas com o mesmo
+    OBJECTID ou são acrescentadas no fim) e remove as parcelas com os OBJECTIDs de
+    `deletes`. Retorna (novo store, novo grafo ou None, resumo), em que o resumo
+    inclui os nomes afetados de cada nível ("touched").
+    Lança ValueError se um OBJECTID estiver em upserts e em deletes ou se um valor
+    não puder ser convertido para o tipo da sua coluna.
+    """
+    n = len(store)
+    if upserts is None or len(upserts) == 0:
+        upserts = pd.DataFrame({"OBJECTID": [], "geometry": []})
+    upserts = coerce_dtypes(upserts.reset_index(drop=True), store.df.dtypes)
+    upsert_ids = upserts["OBJECTID"].astype(str)
+    # Em OBJECTIDs repetidos prevalece a última linha
+    upserts = upserts[~upsert_ids.duplicated(keep="last")].reset_index(drop=True)
+    upsert_ids = upserts["OBJECTID"].astype(str).tolist()
+    delete_ids = [str(pid) for pid in deletes]
+    both = set(upsert_ids) & set(delete_ids)
+    if both:
+        raise ValueError(f"OBJECTID em upsert e delete: {', '.join(sorted(both))}.")
+
+    # order[k]: linha de concat([df, upserts]) que fica na posição k do novo dataset
+    order = np.arange(n)
+    removed = np.zeros(n, dtype=bool)
+    not_found = []
+    for pid in delete_ids:
+        pos = store.position(pid)
+        if pos is None:
+            not_found.append(pid)
+        else:
+            removed[pos] = True
+    appended, replaced = [], []
+    for k, pid in enumerate(upsert_ids):
+        pos = store.position(pid)
+        if pos is None:
+            appended.append(n + k)
+        else:
+            order[pos] = n + k
+            replaced.append(pos)
+    order = np.concatenate([order[~removed], np.array(appended, dtype=np.int64)])
+
+    # Linhas afetadas (antigas removidas/substituídas e novas), para os agregados
+    old_rows = np.concatenate([np.flatnonzero(removed), np.array(replaced, dtype=np.int64)])
+    touched = {}
+    for level in LEVELS:
+        values = []
+        if level in store.df.columns:
+            values += store.df[level].iloc[old_rows].dropna().tolist()
+        if level in upserts.columns:
+            values += upserts[level].dropna().tolist()
+        if values:
+            touched[level] = sorted(set(values), key=str)
+
+    # Só as geometrias das linhas novas são projetadas
+    frames = [store.df, upserts] if len(upserts) else [store.df]
+    combined = pd.concat(frames, ignore_index=True)
+    geoms = np.concatenate(
+        [
+            store.geometries,
+            project_geometries_cached(
+                upserts["OBJECTID"].to_numpy(), upserts["geometry"].to_numpy()
+            ),
+        ]
+    )
+    new_store = PropertyStore(combined.iloc[order], geoms[order])
+
+    new_graph, edges_removed, edges_added = None, 0, 0
+    if graph is not None:
+        # Posição nova de cada linha antiga inalterada (-1 se removida ou substituída)
+        new_pos = np.full(n + len(upserts), -1, dtype=np.int64)
+        new_pos[order] = np.arange(len(order))
+        left, right = graph.edges()
+        left, right = new_pos[left], new_pos[right]
+        keep = (left >= 0) & (right >= 0)
+        edges_removed = int((~keep).sum())
+        changed = np.flatnonzero(order >= n)
+        add_left, add_right = changed_edges(new_store.tree, new_store.geometries, changed)
+        edges_added = int(len(add_left))
+        new_graph = AdjacencyGraph.from_edges(
+            len(new_store),
+            np.concatenate([left[keep], add_left]),
+            np.concatenate([right[keep], add_right]),
+        )
+    summary = {
+        "rows": len(new_store),
+        "inserted": len(appended),
+        "updated": len(replaced),
+        "deleted": int(removed.sum()),
+        "not_found": not_found,
+        "edges_removed": edges_removed,
+        "edges_added": edges_added,
+        "touched": touched,
+    }
+    return new_store, new_graph, summary
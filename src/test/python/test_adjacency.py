@@ -0,0 +1,101 @@
+import sys
+import os
+from shapely.geometry import box
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from adjacency import build_adjacency_edges, build_adjacency_edges_parallel, spatial_tiles
+from server import check_adjacency
+
+
+def test_build_adjacency_edges_matches_pairwise_loop():
+    """
+    Testa se o motor com STRtree produz exatamente as mesmas arestas,
+    e pela mesma ordem, que a comparação de todos os pares com check_adjacency.
+    """
+    geoms = [box(x, y, x + 1, y + 1) for x in range(5) for y in range(4)]
+    geoms[7] = None  # Geometrias inválidas são ignoradas
+    expected = [
+        (i, j)
+        for i in range(len(geoms))
+        for j in range(i + 1, len(geoms))
+        if check_adjacency(geoms[i], geoms[j])
+    ]
+    left, right = build_adjacency_edges(geoms)
+    assert list(zip(left.tolist(), right.tolist())) == expected
+
+
+def test_build_adjacency_edges_empty():
+    """
+    Testa que uma lista vazia de geometrias não gera arestas.
+    """
+    left, right = build_adjacency_edges([])
+    assert len(left) == 0 and len(right) == 0
+
+
+def test_parallel_tiles_match_sequential():
+    """
+    Testa se a construção por ladrilhos num pool de processos produz as mesmas
+    arestas que a construção sequencial, sem duplicados nas fronteiras (também
+    no progresso e na métrica de arestas emitidas).
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    import metrics
+
+    geoms = [box(x, y, x + 1, y + 1) for x in range(12) for y in range(9)]
+    geoms[20] = None
+    expected_left, expected_right = build_adjacency_edges(geoms)
+    reported = []
+
+    def progress(candidate_pairs, edges):
+        reported.append(edges)
+
+    with ProcessPoolExecutor(2, mp_context=multiprocessing.get_context("spawn")) as pool:
+        for tiles in [1, 4, 9]:
+            reported.clear()
+            emitted = metrics.snapshot()["counters"].get("edges_emitted", 0)
+            left, right = build_adjacency_edges_parallel(geoms, pool, tiles, progress=progress)
+            assert left.tolist() == expected_left.tolist()
+            assert right.tolist() == expected_right.tolist()
+            assert sum(reported) == len(left)
+            assert metrics.snapshot()["counters"]["edges_emitted"] - emitted == len(left)
+
+
+def test_spatial_tiles_cover_all_geometries():
+    """
+    Testa que todas as geometrias válidas ficam em pelo menos um ladrilho.
+    """
+    geoms = [box(x, 0, x + 1, 1) for x in range(10)] + [None]
+    tiles = spatial_tiles(geoms, 4)
+    covered = set()
+    for members in tiles:
+        covered.update(members.tolist())
+    assert covered == set(range(10))
+
+
+def test_build_adjacency_edges_progress():
+    """
+    Testa que a consulta em blocos com progresso produz as mesmas arestas
+    e reporta os pares candidatos testados e as arestas encontradas.
+    """
+    import adjacency
+
+    geoms = [box(x, y, x + 1, y + 1) for x in range(6) for y in range(5)]
+    counters = {"candidate_pairs": 0, "edges": 0}
+
+    def progress(candidate_pairs, edges):
+        counters["candidate_pairs"] += candidate_pairs
+        counters["edges"] += edges
+
+    expected_left, expected_right = build_adjacency_edges(geoms)
+    original, adjacency.QUERY_BLOCK = adjacency.QUERY_BLOCK, 7
+    try:
+        left, right = build_adjacency_edges(geoms, progress=progress)
+    finally:
+        adjacency.QUERY_BLOCK = original
+    assert left.tolist() == expected_left.tolist()
+    assert right.tolist() == expected_right.tolist()
+    assert counters["edges"] == len(left)
+    assert counters["candidate_pairs"] >= counters["edges"]
@@ -0,0 +1,31 @@
+import sys
+import os
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from components import component_areas, owner_component_labels
+
+
+def test_components_only_join_same_owner():
+    """
+    Testa que as componentes só juntam parcelas adjacentes do mesmo dono e que
+    as áreas são somadas por componente; parcelas sem dono ficam de fora.
+    """
+    # Cadeia 0-1-2-3-4 com donos A A B A -; 5 isolada do dono A
+    owners = [0, 0, 1, 0, -1, 0]
+    labels, count = owner_component_labels(owners, [0, 1, 2, 3], [1, 2, 3, 4])
+    assert count == 4
+    assert labels[0] == labels[1]
+    assert len({labels[0], labels[2], labels[3], labels[5]}) == 4
+    assert labels[4] == -1
+    areas = component_areas(labels, count, [10.0, 20.0, 30.0, 40.0, 50.0, 60.0])
+    assert sorted(areas.tolist()) == [30.0, 30.0, 40.0, 60.0]
+
+
+def test_components_without_owners():
+    """
+    Testa que sem parcelas com dono não há componentes.
+    """
+    labels, count = owner_component_labels([-1, -1], [0], [1])
+    assert count == 0 and labels.tolist() == [-1, -1]
@@ -0,0 +1,110 @@
+import sys
+import os
+import pandas as pd
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from datasets import DatasetRegistry, estimate_bytes
+from store import PropertyStore
+from graph import AdjacencyGraph
+
+df_example = pd.DataFrame(
+    {
+        "OBJECTID": [1, 2, 3],
+        "OWNER": ["João", "João", "Ana"],
+        "Freguesia": ["Santo Tirso", "Santo Tirso", "Gaia"],
+        "geometry": [
+            "POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))",
+            "POLYGON((1 0, 1 1, 2 1, 2 0, 1 0))",
+            "POLYGON((3 0, 3 1, 4 1, 4 0, 3 0))",
+        ],
+        "Shape_Area": [1000.0, 2000.0, 1500.0],
+    }
+)
+
+
+def load(registry, name):
+    """
+    Carrega o cadastro de exemplo (com grafo) na sessão dada.
+    """
+    store = PropertyStore(df_example)
+    store.project()
+    with registry.use(name, load=False) as session:
+        session.replace(store, AdjacencyGraph.from_edges(3, [0], [1]))
+        registry.touch(session)
+    return session
+
+
+def test_memory_budget_spills_least_recently_used(tmp_path):
+    """
+    Testa que, acima do orçamento de memória, a sessão menos usada é guardada em
+    disco e libertada, que volta igual quando é usada e que uma sessão em uso
+    nunca é libertada.
+    """
+    size = estimate_bytes(PropertyStore(df_example))
+    registry = DatasetRegistry(str(tmp_path), max_bytes=int(2.5 * size), max_datasets=10)
+    a = load(registry, "a")
+    assert a.bytes > size  # Inclui as geometrias projetadas e o grafo
+    b = load(registry, "b")
+    assert registry.stats()["loaded"] == 1 and a.spilled and not b.spilled
+    version = a.version
+
+    with registry.use("a") as session:
+        assert session is a and not a.spilled and b.spilled
+        assert a.version == version
+        assert a.store.ids.tolist() == ["1", "2", "3"]
+        assert a.graph.neighbours(0).tolist() == [1]
+        # "a" está em uso: carregar "b" ultrapassa o orçamento em vez de a libertar
+        with registry.use("b"):
+            assert not a.spilled and not b.spilled
+    registry.enforce()
+    assert registry.stats()["loaded"] == 1 and a.spilled  # "b" foi usada por último
+    assert (registry.spills, registry.reloads) == (3, 2)
+
+
+def test_spill_rewrites_only_changed_sessions(tmp_path):
+    """
+    Testa que uma sessão recarregada só volta a ser escrita em disco se tiver mudado,
+    e que as sessões vazias e removidas são esquecidas.
+    """
+    registry = DatasetRegistry(str(tmp_path), max_bytes=2**30, max_datasets=1)
+    a = load(registry, "a")
+    load(registry, "b")
+    written = os.path.getmtime(tmp_path / "a" / "meta.json")
+    with registry.use("a"):
+        pass
+    registry.spill(a)
+    assert a.spilled and os.path.getmtime(tmp_path / "a" / "meta.json") == written
+
+    # Um grafo novo muda a versão: a sessão volta a ser escrita
+    with registry.use("a"):
+        a.set_graph(AdjacencyGraph.empty(3))
+    registry.spill(a)
+    with registry.use("a"):
+        assert a.graph.num_edges == 0
+
+    with registry.use("vazia") as session:
+        assert session.store is None
+    assert registry.get("vazia") is None
+    assert registry.drop("a") and not (tmp_path / "a").exists()
+    assert not registry.drop("a")
+
+
+def test_spill_failure_keeps_session_loaded(tmp_path):
+    """
+    Testa que uma sessão que não pode ser guardada em disco fica em memória, sem que
+    o erro chegue a quem provocou a libertação, e que se passa à sessão seguinte.
+    """
+    registry = DatasetRegistry(str(tmp_path), max_bytes=2**30, max_datasets=1)
+    store = PropertyStore(df_example.assign(OBJECTID=[1, "2", 3]))  # Coluna de tipos mistos
+    with registry.use("a", load=False) as session:
+        session.replace(store)
+        registry.touch(session)
+    load(registry, "b")
+    a, b = registry.get("a"), registry.get("b")
+    assert a.store is not None and not a.spilled and b.store is not None
+    assert registry.spills == 0
+    # A seguir a "a" (que continua a falhar), é libertada a próxima menos usada
+    load(registry, "c")
+    assert a.store is not None and b.spilled and registry.spills == 1
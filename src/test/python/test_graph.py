@@ -0,0 +1,53 @@
+import sys
+import os
+import numpy as np
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from graph import AdjacencyGraph
+
+
+def test_from_edges_neighbours_and_edges():
+    """
+    Testa a construção do grafo CSR a partir de arestas e a consulta de vizinhos.
+    """
+    graph = AdjacencyGraph.from_edges(5, [0, 0, 1, 3], [1, 2, 2, 1])
+    assert len(graph) == 5
+    assert graph.num_edges == 4
+    assert graph.neighbours(1).tolist() == [0, 2, 3]
+    assert graph.neighbours(4).tolist() == []
+    assert graph.degrees().tolist() == [2, 3, 2, 1, 0]
+    left, right = graph.edges()
+    assert list(zip(left.tolist(), right.tolist())) == [(0, 1), (0, 2), (1, 2), (1, 3)]
+
+
+def test_save_and_load_memory_mapped(tmp_path):
+    """
+    Testa que o grafo guardado é lido por memory-mapping com o mesmo conteúdo.
+    """
+    graph = AdjacencyGraph.from_edges(3, [0], [2])
+    graph.save(str(tmp_path))
+    loaded = AdjacencyGraph.load(str(tmp_path))
+    assert isinstance(loaded.indices, np.memmap)
+    assert loaded.neighbours(2).tolist() == [0]
+
+
+def test_subgraph_neighbourhood_and_edge_pages():
+    """
+    Testa as consultas parciais: arestas de um subconjunto de nós, vizinhança
+    a k saltos e paginação das arestas por cursor.
+    """
+    graph = AdjacencyGraph.from_edges(6, [0, 1, 2, 3, 0], [1, 2, 3, 4, 5])
+    left, right = graph.subgraph_edges([2, 0, 1])
+    assert list(zip(left.tolist(), right.tolist())) == [(0, 1), (1, 2)]
+    nodes, dist = graph.neighbourhood(1, 2)
+    assert dict(zip(nodes.tolist(), dist.tolist())) == {1: 0, 0: 1, 2: 1, 5: 2, 3: 2}
+    assert len(graph.neighbourhood(1, 2, limit=3)[0]) == 3
+    pages, cursor = [], 0
+    while cursor is not None:
+        left, right, cursor = graph.edges_page(cursor, 2)
+        pages.append(list(zip(left.tolist(), right.tolist())))
+    expected_left, expected_right = graph.edges()
+    assert sum(pages, []) == list(zip(expected_left.tolist(), expected_right.tolist()))
+    assert all(len(page) <= 2 for page in pages)
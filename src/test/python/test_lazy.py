@@ -0,0 +1,25 @@
+import sys
+import os
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+import lazy
+
+
+def test_lazy_module_imports_on_first_use(monkeypatch):
+    """
+    Testa que o módulo só é importado no primeiro acesso a um atributo, que o tempo
+    da importação fica registado e que load_all() importa os módulos pendentes.
+    """
+    monkeypatch.setattr(lazy, "LAZY_IMPORTS", True)
+    for name in ("colorsys", "wave"):
+        sys.modules.pop(name, None)
+    colorsys = lazy.lazy_import("colorsys")
+    wave = lazy.lazy_import("wave")
+    assert lazy.lazy_import("colorsys") is colorsys
+    assert "colorsys" not in sys.modules and "por importar" in repr(colorsys)
+    assert colorsys.rgb_to_hsv(1.0, 0.0, 0.0) == (0.0, 1.0, 1.0)
+    assert "colorsys" in sys.modules and "colorsys" in lazy.import_timings()
+    assert "wave" not in sys.modules
+    assert "wave" in lazy.load_all() and wave.Error is sys.modules["wave"].Error
@@ -0,0 +1,65 @@
+import sys
+import os
+import shapely
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from projection import get_transformer, project_geometries
+from server import project_geometry
+
+wkts = [
+    "POLYGON((-17 32.7, -17 32.71, -16.99 32.71, -16.99 32.7, -17 32.7))",
+    "não é WKT",
+    None,
+    "POLYGON EMPTY",
+    "POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))",
+]
+
+
+def test_project_geometries_matches_single_geometry():
+    """
+    Testa se a projeção em bloco devolve as mesmas geometrias que a projeção
+    individual, com None nas posições inválidas, em falta ou vazias.
+    """
+    projected = project_geometries(wkts)
+    assert len(projected) == len(wkts)
+    assert projected[1] is None and projected[2] is None and projected[3] is None
+    for wkt, geom in zip(wkts, projected):
+        if geom is not None:
+            assert shapely.equals_exact(geom, project_geometry(wkt), 1e-9)
+            assert geom.area > 0
+
+
+def test_transformer_is_cached():
+    """
+    Testa que o Transformer é criado uma única vez por par de CRS.
+    """
+    assert get_transformer("EPSG:4326", "EPSG:32628") is get_transformer("EPSG:4326", "EPSG:32628")
+
+
+def test_project_geometries_cached_hits_and_eviction():
+    """
+    Testa a cache de geometrias projetadas: acertos para o mesmo OBJECTID e WKT,
+    falha quando o WKT muda e remoção LRU ao exceder o orçamento de memória.
+    """
+    from geocache import GeometryCache, geometry_bytes
+    from projection import project_geometries_cached
+
+    cache = GeometryCache(max_bytes=10**6)
+    first = project_geometries_cached([1, 2, 3, 4, 5], wkts, cache=cache)
+    assert cache.stats()["misses"] == 4  # Só os valores textuais são procurados
+    again = project_geometries_cached([1, 2, 3, 4, 5], wkts, cache=cache)
+    assert cache.stats()["hits"] == 4
+    assert again[0] is first[0] and again[2] is None
+    changed = [wkts[4], wkts[0]]
+    result = project_geometries_cached([1, 5], changed, cache=cache)
+    assert cache.stats()["misses"] == 6
+    assert shapely.equals_exact(result[1], first[0], 1e-9)
+
+    small = GeometryCache(max_bytes=geometry_bytes(first[0]) + 1)
+    project_geometries_cached([1, 5], [wkts[0], wkts[4]], cache=small)
+    stats = small.stats()
+    assert stats["entries"] == 1 and stats["evictions"] == 1
+    project_geometries_cached([5], [wkts[4]], cache=small)
+    assert small.stats()["hits"] == 1
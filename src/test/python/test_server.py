@@ -41,14 +41,14 @@ def test_process_properties_graph_success():
 
 def test_process_owners_graph_success():
     """
-    Testa o processamento bem-sucedido do grafo de proprietários.
+    Testa o processamento bem-sucedido do grafo de proprietários (modo clique).
     Verifica se:
     1. A resposta tem status 200
     2. Contém nós e arestas
     3. O número de nós corresponde ao CSV
     4. Existem arestas entre propriedades do mesmo proprietário
     """
-    response = client.post("/process_owners_graph?limit=10", json={"data": csv_example})
+    response = client.post("/process_owners_graph?limit=10&mode=clique", json={"data": csv_example})
     assert response.status_code == 200
     data = response.json()
     assert "nodes" in data
@@ -192,3 +192,526 @@ def test_nonexistent_area():
     assert json_response["detail"] == "Nenhuma propriedade encontrada para Freguesia='Inexistente'."
 
 
+
+def test_upload_csv_streaming():
+    """
+    Testa o carregamento em streaming (corpo em bruto e multipart).
+    Verifica se:
+    1. O separador é detetado e todas as linhas são carregadas, mesmo em vários blocos
+    2. O grafo é construído quando pedido e fica disponível em /properties/{id}
+    3. Os endpoints de área funcionam sobre os dados carregados
+    """
+    response = client.post(
+        "/upload_csv?graph=true&chunksize=2",
+        content=csv_example.encode("utf-8"),
+        headers={"Content-Type": "text/csv"},
+    )
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == 4
+    assert data["separator"] == ","
+    assert data["edges"] > 0
+    assert client.get("/properties/1").json()["adjacent_properties"] == ["2"]
+    assert client.get("/average_area?level=Freguesia&name=Santo Tirso").json()["count"] == 3
+
+    response = client.post(
+        "/upload_csv",
+        files={"file": ("dados.csv", csv_example.replace(",", "\t").encode("utf-8"), "text/csv")},
+    )
+    assert response.status_code == 200
+    assert response.json()["separator"] == "\t"
+
+
+def test_upload_csv_invalid():
+    """
+    Testa o carregamento em streaming com CSV sem separador ou sem colunas obrigatórias.
+    """
+    response = client.post("/upload_csv", content=b"apenas_uma_coluna\n1\n2")
+    assert response.status_code == 400
+    assert "error" in response.json()
+    response = client.post("/upload_csv", content=b"OBJECTID,OWNER\n1,Ana")
+    assert response.status_code == 400
+    assert "colunas" in response.json()["error"].lower()
+
+def test_snapshot_and_restore(tmp_path, monkeypatch):
+    """
+    Testa a criação de um snapshot e o restauro posterior do estado.
+    Verifica se os detalhes e vizinhos de uma propriedade sobrevivem ao restauro.
+    """
+    import server
+
+    monkeypatch.setattr(server, "SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    assert client.post("/snapshot/restore").status_code == 404
+    client.post("/process_properties_graph", json={"data": csv_example})
+    before = client.get("/properties/2").json()
+    response = client.post("/snapshot")
+    assert response.status_code == 200
+    assert response.json()["rows"] == 4
+    # Substitui os dados carregados e restaura o snapshot
+    client.post("/process_properties_graph", json={"data": csv_example.replace("João", "Rui")})
+    assert client.post("/snapshot/restore").status_code == 200
+    assert client.get("/properties/2").json() == before
+
+def test_suggest_trades_neighbourhood():
+    """
+    Testa o modo neighbourhood das sugestões de trocas.
+    Verifica se todas as sugestões também existem no modo completo e se um
+    modo inválido é rejeitado.
+    """
+    client.post("/process_properties_graph", json={"data": csv_example})
+    full = client.get("/suggest_trades?level=Freguesia&name=Santo Tirso&top=50").json()
+    response = client.get(
+        "/suggest_trades?level=Freguesia&name=Santo Tirso&top=50&mode=neighbourhood"
+    )
+    assert response.status_code == 200
+    suggestions = response.json()["suggestions"]
+    # João recebe 4 (confina com 2) e cede 1; Ana só tem a parcela 4, que confina com 2
+    assert [(s["prop1"], s["prop2"]) for s in suggestions] == [(4, 1)]
+    assert all(s in full["suggestions"] for s in suggestions)
+    response = client.get(
+        "/suggest_trades?level=Freguesia&name=Santo Tirso&mode=neighbourhood&radius=5000000"
+    )
+    assert len(response.json()["suggestions"]) == 2
+    response = client.get("/suggest_trades?level=Freguesia&name=Santo Tirso&mode=outro")
+    assert response.status_code == 422
+
+def test_average_area_grouped_components():
+    """
+    Testa a área média agrupada por componentes contíguas do mesmo dono.
+    Em Santo Tirso, as parcelas 1 e 2 (João) confinam e formam um grupo e a 4 (Ana) outro,
+    tanto com o grafo construído como sem ele (componentes calculadas pela STRtree).
+    """
+    expected = {"count": 2, "mean_area_m2": (1000 + 2000 + 2500) / 2}
+    client.post("/process_properties_graph", json={"data": csv_example})
+    data = client.get("/average_area_grouped?level=Freguesia&name=Santo Tirso").json()
+    assert {k: data[k] for k in expected} == expected
+    client.post("/upload_csv", content=csv_example.encode("utf-8"))
+    data = client.get("/average_area_grouped?level=Freguesia&name=Santo Tirso").json()
+    assert {k: data[k] for k in expected} == expected
+
+def test_average_area_all_and_cache_invalidation():
+    """
+    Testa o endpoint em bloco de áreas médias e a invalidação da cache.
+    Verifica se:
+    1. Todos os nomes do nível são devolvidos numa única resposta
+    2. Os valores coincidem com os dos endpoints individuais
+    3. Um novo CSV substitui os agregados anteriores
+    """
+    client.post("/process_properties_graph", json={"data": csv_example})
+    data = client.get("/average_area/all?level=Freguesia").json()
+    areas = {a["name"]: a for a in data["areas"]}
+    assert set(areas) == {"Santo Tirso", "Gaia"}
+    single = client.get("/average_area?level=Freguesia&name=Gaia").json()
+    assert areas["Gaia"]["mean_area_m2"] == single["mean_area_m2"] == 1500
+    grouped = client.get("/average_area/all?level=Freguesia&grouped=true").json()
+    assert {a["name"]: a["count"] for a in grouped["areas"]} == {"Santo Tirso": 2, "Gaia": 1}
+
+    client.post("/process_properties_graph", json={"data": csv_example.replace(",1500,", ",3000,")})
+    assert client.get("/average_area?level=Freguesia&name=Gaia").json()["mean_area_m2"] == 3000
+    response = client.get("/average_area/all?level=Concelho")
+    assert response.status_code == 400
+
+def wait_for_job(job_id, timeout=30):
+    """
+    Consulta /jobs/{id} até a tarefa terminar (ou falhar) e retorna o estado final.
+    """
+    import time
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "error"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Tarefa {job_id} não terminou")
+
+def test_graph_jobs():
+    """
+    Testa as tarefas de construção de grafos em segundo plano.
+    Verifica se:
+    1. O POST retorna logo o id e o resultado final coincide com o endpoint síncrono
+    2. O progresso regista parcelas projetadas, pares testados e arestas
+    3. Um pedido idêntico reutiliza a tarefa, exceto se os dados da sessão mudaram
+    4. Um CSV inválido termina em erro
+    """
+    expected = client.post("/process_properties_graph", json={"data": csv_example}).json()
+    response = client.post("/jobs/properties_graph", json={"data": csv_example})
+    assert response.status_code == 202
+    job_id = response.json()["job_id"]
+    job = wait_for_job(job_id)
+    assert job["status"] == "done"
+    assert job["result"] == expected
+    assert job["progress"]["parcels_projected"] == 4
+    assert job["progress"]["candidate_pairs"] >= job["progress"]["edges"] == len(expected["edges"])
+
+    other = client.post("/jobs/properties_graph?limit=2", json={"data": csv_example}).json()
+    assert other["job_id"] != job_id
+
+    owners = client.post("/jobs/owners_graph", json={"data": csv_example}).json()
+    assert wait_for_job(owners["job_id"])["result"] == client.post(
+        "/process_owners_graph", json={"data": csv_example}
+    ).json()
+    again = client.post("/jobs/owners_graph", json={"data": csv_example}).json()
+    assert again["job_id"] == owners["job_id"] and again["reused"] is True
+
+    # Pedidos idênticos seguidos (numa sessão nova) e depois de terminar reutilizam a tarefa
+    url = "/jobs/properties_graph?dataset=jobs"
+    first = client.post(url, json={"data": csv_example}).json()
+    assert client.post(url, json={"data": csv_example}).json()["job_id"] == first["job_id"]
+    assert wait_for_job(first["job_id"])["status"] == "done"
+    again = client.post(url, json={"data": csv_example}).json()
+    assert again["job_id"] == first["job_id"] and again["reused"] is True
+
+    # O grafo de propriedades substitui os dados da sessão: A, B e de novo A volta a carregar A
+    csv_other = csv_example.replace("João", "Rui")
+    for csv_data, owner in ((csv_other, "Rui"), (csv_example, "João")):
+        submitted = client.post(url, json={"data": csv_data}).json()
+        assert submitted["reused"] is False
+        assert wait_for_job(submitted["job_id"])["status"] == "done"
+        assert client.get("/properties/1?dataset=jobs").json()["owner"] == owner
+    client.delete("/datasets/jobs")
+
+    invalid = client.post("/jobs/properties_graph", json={"data": "apenas_uma_coluna\n1"}).json()
+    assert wait_for_job(invalid["job_id"])["status"] == "error"
+    assert client.get("/jobs/inexistente").status_code == 404
+    assert client.post("/jobs/outro", json={"data": csv_example}).status_code == 404
+
+def test_process_owners_graph_modes():
+    """
+    Testa as representações compactas do grafo de proprietários.
+    Verifica se:
+    1. No modo star (omissão) cada dono é um nó ligado a cada uma das suas parcelas
+    2. No modo groups as parcelas são agrupadas por dono, sem arestas
+    3. Um modo inválido é rejeitado
+    """
+    data = client.post("/process_owners_graph", json={"data": csv_example}).json()
+    hubs = [n["id"] for n in data["nodes"] if n.get("group") == "owner"]
+    assert hubs == ["owner:João", "owner:Ana"]
+    assert len(data["nodes"]) == 6
+    assert {(e["from"], e["to"]) for e in data["edges"]} == {
+        ("owner:João", "1"), ("owner:João", "2"), ("owner:Ana", "3"), ("owner:Ana", "4")
+    }
+    data = client.post("/process_owners_graph?mode=groups", json={"data": csv_example}).json()
+    assert data["edges"] == []
+    assert data["groups"] == [
+        {"owner": "João", "properties": ["1", "2"]},
+        {"owner": "Ana", "properties": ["3", "4"]},
+    ]
+    assert [n["group"] for n in data["nodes"]] == ["João", "João", "Ana", "Ana"]
+    data = client.post("/process_owners_graph?mode=clique", json={"data": csv_example}).json()
+    assert {(e["from"], e["to"]) for e in data["edges"]} == {("1", "2"), ("3", "4")}
+    response = client.post("/process_owners_graph?mode=outro", json={"data": csv_example})
+    assert response.status_code == 422
+
+def test_graph_columnar_format_and_gzip():
+    """
+    Testa o formato colunar dos grafos e a compressão negociada.
+    Verifica se:
+    1. O formato colunar descreve os mesmos nós e arestas que o formato de objetos
+    2. As respostas grandes são comprimidas com gzip quando o cliente o aceita
+    """
+    objects = client.post("/process_properties_graph", json={"data": csv_example}).json()
+    response = client.post(
+        "/process_properties_graph?format=columnar", json={"data": csv_example}
+    )
+    assert response.status_code == 200
+    columnar = response.json()
+    ids = columnar["nodes"]["id"]
+    assert ids == [n["id"] for n in objects["nodes"]]
+    edges = zip(columnar["edges"]["from"], columnar["edges"]["to"])
+    assert [{"from": ids[a], "to": ids[b]} for a, b in edges] == objects["edges"]
+
+    star = client.post("/process_owners_graph?format=columnar", json={"data": csv_example}).json()
+    ids = star["nodes"]["id"]
+    assert star["nodes"]["group"] == [None] * 4 + ["owner", "owner"]
+    assert {(ids[a], ids[b]) for a, b in zip(star["edges"]["from"], star["edges"]["to"])} == {
+        ("owner:João", "1"), ("owner:João", "2"), ("owner:Ana", "3"), ("owner:Ana", "4")
+    }
+    assert client.post("/process_owners_graph?format=outro", json={"data": csv_example}).status_code == 422
+
+    big = "OBJECTID,OWNER,Freguesia,geometry\n" + "".join(
+        f'{k},Dono {k % 7},F,"POLYGON(({k / 1000} 0, {k / 1000} 0.001, '
+        f'{(k + 1) / 1000} 0.001, {(k + 1) / 1000} 0, {k / 1000} 0))"\n'
+        for k in range(200)
+    )
+    response = client.post(
+        "/process_properties_graph", json={"data": big}, headers={"Accept-Encoding": "gzip"}
+    )
+    assert response.headers["content-encoding"] == "gzip"
+    assert len(response.json()["edges"]) == 199
+
+def test_graph_queries():
+    """
+    Testa as consultas ao grafo guardado.
+    Verifica se:
+    1. A consulta por caixa devolve as parcelas que a intersetam e as arestas entre elas
+    2. A vizinhança a k saltos inclui a distância de cada parcela
+    3. A paginação por cursor percorre todas as arestas exatamente uma vez
+    """
+    client.post("/process_properties_graph", json={"data": csv_example})
+    data = client.get("/graph/bbox?minx=0.1&miny=0.1&maxx=1.5&maxy=0.9").json()
+    assert [n["id"] for n in data["nodes"]] == ["1", "2"]
+    assert data["edges"] == [{"from": "1", "to": "2"}]
+    assert data["truncated"] is False
+    data = client.get("/graph/bbox?minx=0.1&miny=0.1&maxx=3.5&maxy=0.9&limit=1").json()
+    assert len(data["nodes"]) == 1 and data["truncated"] is True
+    assert client.get("/graph/bbox?minx=1&miny=0&maxx=0&maxy=1").status_code == 400
+
+    data = client.get("/graph/neighbourhood/1?hops=2").json()
+    assert {n["id"]: n["hops"] for n in data["nodes"]} == {"1": 0, "2": 1, "4": 2}
+    assert len(data["edges"]) == 2 and data["truncated"] is False
+    # Exatamente `limit` nós não é truncado; um a menos já é
+    assert client.get("/graph/neighbourhood/1?hops=2&limit=3").json()["truncated"] is False
+    data = client.get("/graph/neighbourhood/1?hops=2&limit=2").json()
+    assert [n["id"] for n in data["nodes"]] == ["1", "2"] and data["truncated"] is True
+    columnar = client.get("/graph/neighbourhood/1?hops=1&format=columnar").json()
+    assert columnar["nodes"] == {"id": ["1", "2"], "hops": [0, 1]}
+    assert client.get("/graph/neighbourhood/999").status_code == 404
+
+    full = client.post("/process_properties_graph", json={"data": csv_example}).json()["edges"]
+    edges, cursor = [], 0
+    while cursor is not None:
+        page = client.get(f"/graph/edges?cursor={cursor}&limit=1").json()
+        assert len(page["edges"]) <= 1 and page["total"] == len(full)
+        edges += page["edges"]
+        cursor = page["next_cursor"]
+    assert edges == full
+
+def test_incremental_updates():
+    """
+    Testa as atualizações incrementais de parcelas.
+    Verifica se:
+    1. Inserir, substituir e remover parcelas atualiza vizinhos e contagens
+    2. O grafo resultante coincide com o de uma reconstrução completa
+    3. Os agregados dos nomes não afetados são reaproveitados
+    """
+    import server
+
+    client.post("/process_properties_graph", json={"data": csv_example})
+    client.get("/average_area/all?level=Freguesia&grouped=true")
+    session = server.datasets.get("default")
+    gaia_simple = session.area_cache.simple["Freguesia"]["Gaia"]
+    new_parcel = {
+        "OBJECTID": 5, "OWNER": "Rui", "Freguesia": "Santo Tirso", "Shape_Area": 500,
+        "geometry": "POLYGON((0 1, 0 2, 1 2, 1 1, 0 1))",
+    }
+    response = client.post("/properties/batch", json={"upsert": [new_parcel], "delete": [2, 99]})
+    assert response.status_code == 200
+    summary = response.json()
+    assert (summary["inserted"], summary["deleted"], summary["not_found"]) == (1, 1, ["99"])
+    assert summary["touched"] == {"Freguesia": ["Santo Tirso"]}
+    assert client.get("/properties/1").json()["adjacent_properties"] == ["5"]
+    assert client.get("/properties/2").status_code == 404
+    assert session.area_cache.simple["Freguesia"]["Gaia"] is gaia_simple
+    data = client.get("/average_area?level=Freguesia&name=Santo Tirso").json()
+    assert (data["count"], data["mean_area_m2"]) == (3, (1000 + 2500 + 500) / 3)
+    grouped = client.get("/average_area_grouped?level=Freguesia&name=Santo Tirso").json()
+    assert grouped["count"] == 3
+
+    # Move a parcela 4 para junto da 1 e compara com uma reconstrução completa
+    moved = {"OWNER": "Ana", "Freguesia": "Gaia", "Shape_Area": 2500,
+             "geometry": "POLYGON((1 0, 1 1, 2 1, 2 0, 1 0))"}
+    assert client.put("/properties/4", json=moved).json()["updated"] == 1
+    assert client.get("/properties/4").json()["adjacent_properties"] == ["1", "5"]
+    assert client.get("/average_area?level=Freguesia&name=Gaia").json()["count"] == 2
+    incremental = session.graph.edges()
+    server.build_property_graph(session)
+    rebuilt = session.graph.edges()
+    assert [a.tolist() for a in incremental] == [a.tolist() for a in rebuilt]
+
+    assert client.delete("/properties/5").status_code == 200
+    assert client.delete("/properties/5").status_code == 404
+    response = client.post("/properties/batch", json={"upsert": [{"OBJECTID": 7}]})
+    assert response.status_code == 400
+
+def test_upsert_keeps_column_types_for_snapshot(tmp_path, monkeypatch):
+    """
+    Testa que os valores inseridos são convertidos para os tipos das colunas guardadas:
+    um OBJECTID em texto não impede o snapshot e valores inválidos dão erro 400.
+    """
+    import server
+
+    monkeypatch.setattr(server, "SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    client.post("/process_properties_graph", json={"data": csv_example})
+    parcel = {"OWNER": "Rui", "Freguesia": "Gaia", "Shape_Area": "500",
+              "geometry": "POLYGON((9 9, 9 10, 10 10, 10 9, 9 9))"}
+    assert client.put("/properties/9", json=parcel).json()["inserted"] == 1
+    df = server.datasets.get("default").store.df
+    assert df["OBJECTID"].dtype == "int64" and df["Shape_Area"].dtype == "int64"
+    assert client.post("/snapshot").status_code == 200
+    assert client.post("/snapshot/restore").status_code == 200
+    assert client.get("/properties/9").json()["owner"] == "Rui"
+    response = client.put("/properties/x", json=parcel)
+    assert response.status_code == 400
+    assert "OBJECTID" in response.json()["detail"]
+    assert client.put("/properties/10", json={**parcel, "Shape_Area": 2.5}).status_code == 400
+
+def test_upsert_rejects_missing_or_invalid_objectid():
+    """
+    Testa que parcelas com OBJECTID (ou outra coluna essencial) vazio ou não inteiro
+    são rejeitadas com erro 400, sem alterar os dados nem o tipo da coluna.
+    """
+    import server
+
+    client.post("/process_properties_graph", json={"data": csv_example})
+    parcel = {"OWNER": "Rui", "Freguesia": "Gaia",
+              "geometry": "POLYGON((9 9, 9 10, 10 10, 10 9, 9 9))"}
+    for objectid in (None, "", 5.5, True, "abc"):
+        response = client.post("/properties/batch", json={"upsert": [{**parcel, "OBJECTID": objectid}]})
+        assert response.status_code == 400
+    response = client.post("/properties/batch", json={"upsert": [{**parcel, "OBJECTID": 9, "OWNER": None}]})
+    assert response.status_code == 400 and "OWNER" in response.json()["detail"]
+    # Um valor em falta numa coluna de inteiros não a converte para float
+    response = client.post("/properties/batch", json={"upsert": [{**parcel, "OBJECTID": 9, "Shape_Area": None}]})
+    assert response.status_code == 400
+    store = server.datasets.get("default").store
+    assert store.df["OBJECTID"].dtype == "int64" and store.ids.tolist() == ["1", "2", "3", "4"]
+    assert client.get("/properties/1").status_code == 200
+
+def test_geometry_cache_stats():
+    """
+    Testa que voltar a enviar o mesmo CSV reutiliza as geometrias em cache
+    e que os contadores são expostos e podem ser repostos.
+    """
+    assert client.delete("/cache/geometries").json()["entries"] == 0
+    client.post("/process_properties_graph", json={"data": csv_example})
+    stats = client.get("/cache/geometries").json()
+    assert (stats["misses"], stats["hits"], stats["entries"]) == (4, 0, 4)
+    client.post("/process_properties_graph", json={"data": csv_example})
+    assert client.get("/cache/geometries").json()["hits"] == 4
+
+def test_metrics_and_request_profile():
+    """
+    Testa o endpoint de métricas (formato Prometheus) e o profiling por pedido:
+    com ?profile=1 a resposta inclui o resultado original e as etapas medidas.
+    """
+    client.delete("/cache/geometries")  # Garante que as geometrias são projetadas
+    response = client.post("/process_properties_graph?profile=1", json={"data": csv_example})
+    assert response.status_code == 200
+    body = response.json()
+    assert len(body["result"]["nodes"]) == 4
+    stages = {s["stage"] for s in body["profile"]["stages"]}
+    assert {"parse_csv", "project_geometries", "adjacency", "json_encode"} <= stages
+    assert body["profile"]["counters"]["rows_parsed"] == 4
+    assert "adjacency;dur=" in response.headers["server-timing"]
+    # Sem a flag a resposta mantém-se inalterada
+    assert "nodes" in client.post("/process_properties_graph", json={"data": csv_example}).json()
+
+    response = client.get("/average_area?level=Freguesia&name=Gaia", headers={"X-Profile": "cprofile"})
+    assert response.json()["result"]["count"] == 1
+    assert "profile" in response.json()
+
+    # As respostas que não são JSON mantêm o corpo e o Content-Type
+    response = client.get("/metrics?profile=1")
+    assert response.headers["content-type"].startswith("text/plain")
+    assert "total;dur=" in response.headers["server-timing"]
+    assert "cadastre_rows_parsed_total" in response.text
+
+    text = client.get("/metrics").text
+    assert 'cadastre_stage_seconds_total{stage="adjacency"}' in text
+    assert "cadastre_rows_parsed_total" in text
+    assert "cadastre_edges_emitted_total" in text
+    assert "cadastre_parcels_loaded 4" in text
+
+def test_similar_properties_and_similar_trades():
+    """
+    Testa a pesquisa de parcelas similares (com restrições de dono e área)
+    e o modo "similar" das sugestões de trocas.
+    """
+    client.post("/process_properties_graph", json={"data": csv_example})
+    data = client.get("/similar/1?k=2").json()
+    # A parcela 3 (1500 m²) é a mais parecida com a 1 (1000 m²), depois a 2 (2000 m²)
+    assert [p["id"] for p in data["similar"]] == ["3", "2"]
+    assert data["similar"][0]["similarity"] > data["similar"][1]["similarity"]
+    data = client.get("/similar/1?other_owners=true&level=Freguesia&name=Santo Tirso").json()
+    assert [p["id"] for p in data["similar"]] == ["4"]
+    data = client.get("/similar/1?owner=João").json()
+    assert [p["id"] for p in data["similar"]] == ["2"]
+    assert client.get("/similar/99").status_code == 404
+    assert client.get("/similar/1?level=Freguesia").status_code == 400
+
+    everything = client.get("/suggest_trades?level=Freguesia&name=Santo Tirso&top=5").json()
+    similar = client.get(
+        "/suggest_trades?level=Freguesia&name=Santo Tirso&top=5&mode=similar&candidates=5"
+    ).json()
+    # Com candidatos suficientes, o modo similar considera todos os pares
+    assert similar["suggestions"] == everything["suggestions"]
+
+def test_consolidation():
+    """
+    Testa o plano de emparcelamento (síncrono e como tarefa em segundo plano).
+    """
+    # O João tem também uma parcela de 4000 m² (5), vizinha da única parcela da Ana (4)
+    csv_data = csv_example + '5,João,Santo Tirso,"POLYGON((2 1, 2 2, 3 2, 3 1, 2 1))",4000,400000,400,200\n'
+    client.post("/process_properties_graph", json={"data": csv_data})
+    response = client.post("/consolidation?level=Freguesia&name=Santo Tirso&time_budget=0")
+    assert response.status_code == 200
+    data = response.json()
+    # A única troca útil dá a parcela 5 à Ana e a 4 ao João: (4000 - 2500) * (1 - 1/3)
+    assert data["parcels"] == 4
+    assert data["trades_total"] == 1
+    trade = data["trades"][0]
+    assert {trade["prop1"], trade["prop2"]} == {4, 5}
+    assert data["objective"] == data["initial_objective"] == pytest.approx(1000)
+    for mode in ("neighbourhood", "similar"):
+        response = client.post(f"/consolidation?level=Freguesia&name=Santo Tirso&time_budget=0&mode={mode}")
+        assert response.json()["objective"] == data["objective"]
+    assert client.post("/consolidation?level=Freguesia&name=Porto").status_code == 404
+
+    response = client.post("/consolidation?level=Freguesia&name=Santo Tirso&time_budget=0&background=true")
+    assert response.status_code == 202
+    job = wait_for_job(response.json()["job_id"])
+    assert job["status"] == "done"
+    assert job["result"]["objective"] == data["objective"]
+
+def test_dataset_sessions(tmp_path, monkeypatch):
+    """
+    Testa as sessões de dados com nome: dados independentes por sessão, libertação
+    da sessão menos usada para disco acima do orçamento e recarregamento a pedido.
+    """
+    import server
+
+    monkeypatch.setattr(server.datasets, "spill_dir", str(tmp_path))
+    monkeypatch.setattr(server.datasets, "max_datasets", 1)
+    client.post("/process_properties_graph?dataset=norte", json={"data": csv_example})
+    client.post("/process_properties_graph?dataset=sul", json={"data": csv_example.replace("João", "Rui")})
+    sessions = {d["name"]: d for d in client.get("/datasets").json()["datasets"]}
+    # Só cabe uma sessão em memória: a menos usada ("norte") foi guardada em disco
+    assert sessions["norte"]["spilled"] and not sessions["norte"]["in_memory"]
+    assert sessions["sul"]["in_memory"] and sessions["sul"]["rows"] == 4
+    assert client.get("/properties/2?dataset=sul").json()["owner"] == "Rui"
+    details = client.get("/properties/2?dataset=norte").json()
+    assert (details["owner"], details["adjacent_properties"]) == ("João", ["1", "4"])
+    sessions = {d["name"]: d for d in client.get("/datasets").json()["datasets"]}
+    assert sessions["norte"]["in_memory"] and sessions["sul"]["spilled"]
+    data = client.get("/average_area?level=Freguesia&name=Santo Tirso&dataset=sul").json()
+    assert data["count"] == 3
+
+    assert client.delete("/datasets/norte").status_code == 200
+    assert client.get("/properties/2?dataset=norte").status_code == 400
+    assert client.delete("/datasets/norte").status_code == 404
+    assert client.get("/properties/2?dataset=../x").status_code == 422
+    assert "norte" not in {d["name"] for d in client.get("/datasets").json()["datasets"]}
+    client.delete("/datasets/sul")
+
+def test_prewarm_and_startup(tmp_path, monkeypatch):
+    """
+    Testa o pré-aquecimento (usado antes do fork dos workers do gunicorn): restaura o
+    snapshot com a STRtree e o índice de similaridade já construídos, e os tempos do
+    arranque ficam disponíveis em GET /startup.
+    """
+    import server
+
+    monkeypatch.setattr(server, "SNAPSHOT_DIR", str(tmp_path / "snapshot"))
+    client.post("/process_properties_graph", json={"data": csv_example})
+    assert client.post("/snapshot").status_code == 200
+    client.post("/process_properties_graph", json={"data": csv_example.replace("João", "Rui")})
+    timings = server.prewarm()
+    assert {"imports_s", "transformers_s", "restore_s", "indexes_s", "total_s"} <= set(timings)
+    session = server.datasets.get("default")
+    assert session.store._tree is not None and session.similarity_index is not None
+    assert client.get("/properties/2").json()["owner"] == "João"
+    startup = client.get("/startup").json()
+    assert startup["import_s"] > 0 and startup["prewarm"] == timings
+    assert not startup["preloaded"]
+    assert {"shapely", "pyproj", "scipy.spatial"} <= set(startup["lazy_import_s"])
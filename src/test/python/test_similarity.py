@@ -0,0 +1,103 @@
+import sys
+import os
+import numpy as np
+import pandas as pd
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+import similarity
+from server import CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE, calcular_similaridade
+from similarity import SimilarityIndex
+
+
+def random_parcels(n, seed):
+    """
+    Gera parcelas aleatórias com as características de similaridade e valores em falta.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "OBJECTID": np.arange(n),
+            "OWNER": rng.choice(["Ana", "João", "Rui", "Eva"], size=n),
+            "Shape_Area": rng.lognormal(7.5, 0.5, size=n).round(1),
+            "Valor_Estimado": rng.lognormal(11.5, 0.6, size=n).round(0),
+            "Distancia_Vias": rng.exponential(150, size=n).round(1),
+            "Distancia_Urbana": rng.exponential(800, size=n).round(1),
+        }
+    )
+    df.loc[rng.random(n) < 0.1, "Valor_Estimado"] = np.nan
+    return df
+
+
+def brute_force(df, pos, k, allowed):
+    """
+    As k parcelas mais parecidas calculadas com calcular_similaridade (referência).
+    """
+    records = df.to_dict("records")
+    scores = [
+        (-calcular_similaridade(records[pos], records[q], CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE), q)
+        for q in range(len(df))
+        if q != pos and allowed[q]
+    ]
+    return [q for _, q in sorted(scores)[:k]]
+
+
+def test_similar_matches_brute_force(monkeypatch):
+    """
+    Testa que a pesquisa (por varrimento e pela cKDTree) devolve as mesmas parcelas
+    que a similaridade original, com e sem restrições.
+    """
+    df = random_parcels(300, seed=1)
+    index = SimilarityIndex(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    other = (df["OWNER"] != df["OWNER"][7]).to_numpy()
+    for allowed in (np.ones(len(df), dtype=bool), other):
+        expected = brute_force(df, 7, 5, allowed)
+        rows, sim = index.similar(7, 5, allowed)
+        assert rows.tolist() == expected
+        assert np.all(np.diff(sim) <= 0)
+        # Pela árvore, com candidatos suficientes para cobrir as parcelas permitidas
+        monkeypatch.setattr(similarity, "BRUTE_FORCE_MAX", 0)
+        monkeypatch.setattr(similarity, "MIN_CANDIDATES", 100)
+        assert index.similar(7, 5, allowed)[0].tolist() == expected
+        monkeypatch.undo()
+
+
+def test_similar_tree_recall():
+    """
+    Testa que os candidatos da cKDTree contêm quase sempre as parcelas mais parecidas.
+    """
+    df = random_parcels(20000, seed=2)
+    index = SimilarityIndex(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    everything = np.arange(len(df))
+    found = 0
+    for pos in range(0, 20000, 1000):
+        rows, _ = index.similar(pos, 10)
+        others = everything[everything != pos]
+        sim = similarity.weighted_similarity(index.features, pos, others)
+        best = others[np.lexsort((others, -sim))[:10]]
+        found += len(set(rows.tolist()) & set(best.tolist()))
+    assert found >= 0.95 * 200
+
+
+def test_pairs_are_most_similar_other_owners():
+    """
+    Testa que pairs() liga cada parcela às k mais parecidas de outros proprietários,
+    reutilizando a árvore da área entre chamadas.
+    """
+    df = random_parcels(60, seed=3)
+    index = SimilarityIndex(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    rows = np.arange(10, 50)
+    owners = pd.factorize(df["OWNER"])[0][rows]
+    left, right = index.pairs(rows, 3, owners)
+    assert np.all(owners[left] != owners[right])
+    assert np.all(np.bincount(left, minlength=len(rows)) == 3)
+    sub = df.iloc[rows].reset_index(drop=True)
+    for p in range(len(rows)):
+        expected = brute_force(sub, p, 3, owners != owners[p])
+        assert sorted(right[left == p].tolist()) == sorted(expected)
+    # A árvore da área é criada uma vez e reutilizada nas chamadas seguintes
+    tree = index.area_trees[rows.tobytes()]
+    again = index.pairs(rows, 3, owners)
+    assert index.area_trees[rows.tobytes()] is tree and len(index.area_trees) == 1
+    assert again[0].tolist() == left.tolist() and again[1].tolist() == right.tolist()
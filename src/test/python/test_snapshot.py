@@ -0,0 +1,50 @@
+import sys
+import os
+import pandas as pd
+import shapely
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from snapshot import load_snapshot, save_snapshot, snapshot_exists
+from store import PropertyStore
+from graph import AdjacencyGraph
+
+df_example = pd.DataFrame(
+    {
+        "OBJECTID": [1, 2, 3],
+        "OWNER": ["João", "João", "Ana"],
+        "Freguesia": ["Santo Tirso", "Santo Tirso", "Gaia"],
+        "geometry": [
+            "POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))",
+            "POLYGON((1 0, 1 1, 2 1, 2 0, 1 0))",
+            "inválido",
+        ],
+        "Shape_Area": [1000.0, 2000.0, 1500.0],
+    }
+)
+
+
+def test_snapshot_roundtrip(tmp_path):
+    """
+    Testa se um snapshot guardado e restaurado reproduz propriedades, geometrias e grafo.
+    """
+    store = PropertyStore(df_example)
+    graph = AdjacencyGraph.from_edges(3, [0], [1])
+    directory = str(tmp_path / "snapshot")
+    assert not snapshot_exists(directory)
+    meta = save_snapshot(directory, store, graph)
+    assert meta["rows"] == 3 and meta["edges"] == 1
+    assert snapshot_exists(directory)
+
+    restored, restored_graph = load_snapshot(directory)
+    pd.testing.assert_frame_equal(restored.df, store.df)
+    assert restored.position("2") == 1
+    assert restored_graph.neighbours(1).tolist() == [0]
+    assert restored_graph.indptr.tolist() == graph.indptr.tolist()
+    assert restored.geometries[2] is None
+    assert shapely.equals_exact(restored.geometries[0], store.geometries[0], 0)
+
+    # Guardar de novo substitui o snapshot anterior
+    save_snapshot(directory, store, None)
+    assert load_snapshot(directory, mmap=False)[1].num_edges == 0
@@ -0,0 +1,57 @@
+import sys
+import os
+import pandas as pd
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from store import PropertyStore
+
+df_example = pd.DataFrame(
+    {
+        "OBJECTID": [10, 11, 12, 11],
+        "OWNER": ["João", "Ana", "João", "Rui"],
+        "Freguesia": ["Santo Tirso", "Gaia", "Santo Tirso", None],
+        "geometry": [
+            "POLYGON((0 0, 0 1, 1 1, 1 0, 0 0))",
+            "POLYGON((1 0, 1 1, 2 1, 2 0, 1 0))",
+            "inválido",
+            "POLYGON((2 0, 2 1, 3 1, 3 0, 2 0))",
+        ],
+    }
+)
+
+
+def test_position_lookup():
+    """
+    Testa a consulta por OBJECTID: devolve a primeira ocorrência ou None.
+    """
+    store = PropertyStore(df_example)
+    assert store.position("10") == 0
+    assert store.position("11") == 1  # Duplicado: prevalece a primeira linha
+    assert store.position("99") is None
+    assert store.value(0, "OWNER") == "João"
+    assert store.value(0, "Concelho") is None
+
+
+def test_group_rows_match_boolean_filter():
+    """
+    Testa se os índices de grupo coincidem com o filtro df[level] == name.
+    """
+    store = PropertyStore(df_example)
+    for level in ["OWNER", "Freguesia"]:
+        for name in df_example[level].dropna().unique():
+            expected = df_example.index[df_example[level] == name].tolist()
+            assert store.rows(level, name).tolist() == expected
+    assert len(store.rows("Freguesia", "Inexistente")) == 0
+    assert len(store.rows("Concelho", "Porto")) == 0
+
+
+def test_geometries_are_projected_once():
+    """
+    Testa que o array de geometrias é calculado uma vez e reutilizado.
+    """
+    store = PropertyStore(df_example)
+    geoms = store.geometries
+    assert geoms is store.geometries
+    assert geoms[2] is None and geoms[0].area > 0
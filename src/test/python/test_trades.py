@@ -0,0 +1,125 @@
+import sys
+import os
+from itertools import combinations
+import numpy as np
+import pandas as pd
+
+# Adiciona o caminho src/main/python ao sys.path para permitir a importação dos módulos
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), "../../../main/python")))
+
+from server import CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE, calcular_similaridade
+from trades import TradeScorer, suggest_trades_vectorized
+
+
+def suggest_trades_reference(df, top):
+    """
+    Ciclo original de /suggest_trades, usado como referência dos resultados.
+    """
+    owners = {o: g.to_dict("records") for o, g in df.groupby("OWNER")}
+    suggestions = []
+    for o1, o2 in combinations(owners, 2):
+        for p1 in owners[o1]:
+            for p2 in owners[o2]:
+                a1, a2 = p1["Shape_Area"], p2["Shape_Area"]
+                sum1, sum2 = len(owners[o1]), len(owners[o2])
+                new_avg1 = (sum(p["Shape_Area"] for p in owners[o1]) - a1 + a2) / sum1
+                new_avg2 = (sum(p["Shape_Area"] for p in owners[o2]) - a2 + a1) / sum2
+                old_avg1 = sum(p["Shape_Area"] for p in owners[o1]) / sum1
+                old_avg2 = sum(p["Shape_Area"] for p in owners[o2]) / sum2
+                delta_avg_total = (new_avg1 + new_avg2) - (old_avg1 + old_avg2)
+                area_diff = abs(a1 - a2)
+                potencia = delta_avg_total / (area_diff + 1e-6)
+                sim = calcular_similaridade(
+                    p1, p2, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE
+                )
+                score = potencia * (1 + sim)
+                suggestions.append(
+                    {
+                        "owner1": o1,
+                        "prop1": p1["OBJECTID"],
+                        "area1": a1,
+                        "owner2": o2,
+                        "prop2": p2["OBJECTID"],
+                        "area2": a2,
+                        "delta_avg_total": delta_avg_total,
+                        "potential_score": score,
+                    }
+                )
+    return sorted(suggestions, key=lambda x: x["potential_score"], reverse=True)[:top]
+
+
+def random_properties(n, seed):
+    """
+    Gera propriedades aleatórias com áreas repetidas (empates), valores em falta
+    e uma característica textual.
+    """
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame(
+        {
+            "OBJECTID": np.arange(n) + 100,
+            "OWNER": rng.choice(["Ana", "João", "Rui", "Eva", None], size=n),
+            "Shape_Area": rng.choice([500, 1000, 1500, 2000, 3250], size=n),
+            "Valor_Estimado": rng.normal(1e5, 3e4, size=n).round(2),
+            "Distancia_Vias": rng.choice(["Perto", "perto", "Longe"], size=n),
+        }
+    )
+    df.loc[rng.random(n) < 0.2, "Valor_Estimado"] = np.nan
+    return df
+
+
+def test_vectorized_matches_reference():
+    """
+    Testa se o motor vetorizado devolve exatamente as mesmas sugestões, pela
+    mesma ordem, que o ciclo original, incluindo empates e blocos pequenos.
+    """
+    for seed in range(3):
+        df = random_properties(60, seed)
+        for top in [1, 7, 50, 5000]:
+            expected = suggest_trades_reference(df, top)
+            result = suggest_trades_vectorized(
+                df, top, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE
+            )
+            assert result == expected
+
+
+def test_blocks_do_not_change_results():
+    """
+    Testa que o tamanho dos blocos não altera o top-N.
+    """
+    df = random_properties(80, 42)
+    scorer = TradeScorer(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    full = scorer.top_pairs(20)
+    small = scorer.top_pairs(20, block_elems=50)
+    for a, b in zip(full, small):
+        assert a.tolist() == b.tolist()
+
+
+def test_neighbourhood_pairs_require_contact():
+    """
+    Testa o modo neighbourhood: só são candidatas as trocas em que a parcela
+    recebida confina com outra parcela de quem a recebe.
+    """
+    # Linha de parcelas: 0(Ana) 1(Ana) 2(Rui) 3(Eva) ; 4(Rui) isolada
+    df = pd.DataFrame(
+        {
+            "OBJECTID": [1, 2, 3, 4, 5],
+            "OWNER": ["Ana", "Ana", "Rui", "Eva", "Rui"],
+            "Shape_Area": [100, 200, 300, 400, 500],
+        }
+    )
+    scorer = TradeScorer(df, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    i, j = scorer.neighbourhood_pairs([0, 1, 2], [1, 2, 3])
+    pairs = {
+        tuple(sorted((df["OBJECTID"].iat[a], df["OBJECTID"].iat[b])))
+        for a, b in zip(scorer.order[i], scorer.order[j])
+    }
+    # Ana recebe 3 (confina com 2) e cede 1; Rui recebe 2 (confina com 3) e cede 5;
+    # Rui recebe 4 (confina com 3) e cede 5; Eva não tem outra parcela para ceder
+    assert pairs == {(1, 3), (2, 5), (4, 5)}
+
+    result = suggest_trades_vectorized(
+        df, 10, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE, ([0, 1, 2], [1, 2, 3])
+    )
+    full = suggest_trades_vectorized(df, 100, CARACTERISTICAS_SIMILARIDADE, PESOS_SIMILARIDADE)
+    assert len(result) == 3
+    assert all(s in full for s in result)